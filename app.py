@@ -1,10 +1,33 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session, make_response, g, has_request_context, url_for
 import os
 import json
-import sqlite3
-from datetime import datetime, timedelta
+import bisect
+import collections
+import contextlib
+import cProfile
+import email.utils
+import hashlib
+import heapq
+import io
+import itertools
+import marshal
+import pstats
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import functools
 from functools import wraps
 import re
+import zlib
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from assets import AssetManifest, compress_body, negotiate_encoding
+from jobs import JobError, JobQueue
+import maintenance
+from planner import SCIPY_AVAILABLE, MealPlanner, PlanError
+from recommend import LIMITED_NUTRIENTS as RECOMMENDER_LIMITED, NutrientRecommender
+from storage import ROLLUP_PERCENTILES, MealRepository, next_rollup_start, open_backend, rollup_start
 
 # anthropicはオプショナル（AIマッチング機能を使う場合のみ必要）
 try:
@@ -14,12 +37,51 @@ except ImportError:
     ANTHROPIC_AVAILABLE = False
     print("警告: anthropicモジュールが見つかりません。AI検索機能は無効です。")
 
+# numpyはオプショナル（ベクトル検索によるマッチング・食品の提案を使う場合のみ必要）
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("警告: numpyモジュールが見つかりません。ベクトル検索・食品の提案は無効です。")
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')
 
 # 環境変数から設定を取得
 CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY', '')
+# AI APIの接続先（負荷試験では fake_ai.py のスタブを指定する）
+DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com').rstrip('/')
+CLAUDE_BASE_URL = os.environ.get('CLAUDE_BASE_URL') or None
 APP_PASSWORD = os.environ.get('APP_PASSWORD', 'admin123')
+# 初回起動時に作成する管理ユーザー（パスワードはAPP_PASSWORD）
+DEFAULT_USERNAME = os.environ.get('DEFAULT_USERNAME', 'admin')
+
+# SQLiteデータベースのパス（DATABASE_URL=postgresql://... を指定するとPostgreSQLを使用）
+DB_PATH = os.environ.get('NUTRITION_DB', 'nutrition.db')
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+STORAGE = MealRepository(open_backend(DATABASE_URL or DB_PATH,
+                                      min_connections=int(os.environ.get('DB_POOL_MIN', '1')),
+                                      max_connections=int(os.environ.get('DB_POOL_MAX', '10'))))
+
+# バックグラウンドジョブ（ASYNC_MATCHING=1 でAIマッチングが必要な食事をジョブとして後から記録）
+ASYNC_MATCHING = os.environ.get('ASYNC_MATCHING', '0') == '1'
+# アプリのプロセス内で起動するワーカー数（0なら python worker.py を別プロセスで実行する）
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '0'))
+JOB_QUEUE = JobQueue(STORAGE)
+
+# マッチング結果ログの出力先（既定は空 = 記録しない。match_report.py で集計するときに指定する）
+MATCH_LOG_PATH = os.environ.get('MATCH_LOG_PATH', '')
+_match_log_lock = threading.Lock()
+_match_log_file = None
+
+# 静的ファイル（CSS・JS）はハッシュ付きの名前で配信し、HTML・JSONは圧縮して返す
+# （リバースプロキシで圧縮する場合は COMPRESS_RESPONSES=0）
+ASSETS = AssetManifest(os.path.join(app.root_path, 'static'))
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', '1') == '1'
+
+# 計測を有効にするか（METRICS_ENABLED=1 で /metrics と Server-Timing ヘッダーを出力）
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
 
 # 目標摂取量の定義
 DAILY_TARGETS = {
@@ -57,65 +119,9 @@ DAILY_TARGETS = {
 
 # データベース初期化
 def init_db():
-    """データベースを初期化"""
-    conn = sqlite3.connect('nutrition.db')
-    c = conn.cursor()
-    
-    # 食事テーブル
-    c.execute('''CREATE TABLE IF NOT EXISTS meals
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  person_name TEXT NOT NULL,
-                  meal_date DATE NOT NULL,
-                  meal_time TIME NOT NULL,
-                  raw_input TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # 食事項目テーブル
-    c.execute('''CREATE TABLE IF NOT EXISTS meal_items
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  meal_id INTEGER NOT NULL,
-                  food_name TEXT NOT NULL,
-                  weight REAL NOT NULL,
-                  matched_food_name TEXT NOT NULL,
-                  FOREIGN KEY (meal_id) REFERENCES meals (id))''')
-    
-    # 栄養素データテーブル
-    c.execute('''CREATE TABLE IF NOT EXISTS meal_nutrients
-                 (meal_id INTEGER PRIMARY KEY,
-                  energy REAL,
-                  protein REAL,
-                  fat REAL,
-                  fiber REAL,
-                  potassium REAL,
-                  calcium REAL,
-                  magnesium REAL,
-                  phosphorus REAL,
-                  iron REAL,
-                  zinc REAL,
-                  copper REAL,
-                  manganese REAL,
-                  iodine REAL,
-                  selenium REAL,
-                  chromium REAL,
-                  molybdenum REAL,
-                  vitamin_a REAL,
-                  vitamin_d REAL,
-                  vitamin_e REAL,
-                  vitamin_k REAL,
-                  vitamin_b1 REAL,
-                  vitamin_b2 REAL,
-                  niacin REAL,
-                  vitamin_b6 REAL,
-                  vitamin_b12 REAL,
-                  folate REAL,
-                  pantothenic_acid REAL,
-                  biotin REAL,
-                  vitamin_c REAL,
-                  salt REAL,
-                  FOREIGN KEY (meal_id) REFERENCES meals (id))''')
-    
-    conn.commit()
-    conn.close()
+    """データベースを初期化（テーブル作成・旧形式からの移行・管理ユーザーの作成・食品の栄養素の同期）"""
+    STORAGE.init_schema(DEFAULT_USERNAME, lambda: generate_password_hash(APP_PASSWORD))
+    STORAGE.sync_foods(FOOD_DATA.nutrient_vectors)
 
 # 食品データベースをロード
 def load_food_database():
@@ -123,59 +129,409 @@ def load_food_database():
     with open('food_database.json', 'r', encoding='utf-8') as f:
         return json.load(f)
 
-# データベースとデータを初期化
-init_db()
-FOOD_DATABASE = load_food_database()
+# 読み辞書をロード（build_readings.py で成分表から生成される）
+def load_food_readings(path='food_readings.json'):
+    """読み辞書（漢字語 → 読み、成分表の別名 → 食品名）をロード"""
+    if not os.path.exists(path):
+        return {'words': {}, 'aliases': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# 読み辞書の漢字語の読み（fold_reading で使う）は起動時だけ読み込む。
+# 食品データ・別名は FoodData として再読み込みできる
+FOOD_READINGS = load_food_readings()
+
+# レイテンシ計測
+# 処理段階ごとの所要時間をPrometheus形式のヒストグラムに集計する
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram:
+    """所要時間（秒）のヒストグラム"""
+    def __init__(self):
+        self.counts = [0] * len(METRIC_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, seconds):
+        index = bisect.bisect_left(METRIC_BUCKETS, seconds)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+
+_metrics_lock = threading.Lock()
+_stage_histograms = {}
+_request_histograms = {}
+
+def observe_duration(histograms, label, seconds):
+    """ヒストグラムに所要時間を記録"""
+    with _metrics_lock:
+        histogram = histograms.get(label)
+        if histogram is None:
+            histogram = histograms[label] = Histogram()
+        histogram.observe(seconds)
+
+def record_stage(stage, seconds):
+    """処理段階の所要時間を記録（リクエスト中ならServer-Timing用にも保持）"""
+    observe_duration(_stage_histograms, stage, seconds)
+    if has_request_context():
+        timings = g.setdefault('stage_timings', {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+class _StageTimer:
+    __slots__ = ('stage', 'start')
+    
+    def __init__(self, stage):
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+_NULL_TIMER = contextlib.nullcontext()
+
+def timed(stage):
+    """処理段階を計測するコンテキストマネージャー（無効時は何もしない）"""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(stage)
+
+def render_metrics():
+    """ヒストグラムをPrometheusのテキスト形式に変換"""
+    lines = []
+    families = [
+        ('nutrition_stage_duration_seconds', '処理段階ごとの所要時間', 'stage', _stage_histograms),
+        ('nutrition_request_duration_seconds', 'エンドポイントごとのリクエスト処理時間', 'endpoint', _request_histograms),
+    ]
+    with _metrics_lock:
+        for name, help_text, label, histograms in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for value, histogram in sorted(histograms.items()):
+                value = value.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bucket, count in zip(METRIC_BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="{bucket}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_start = time.perf_counter()
 
-# パスワード認証デコレーター
+@app.after_request
+def add_server_timing(response):
+    """リクエスト処理時間を記録し、Server-Timingヘッダーを付与"""
+    if not METRICS_ENABLED or 'request_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    observe_duration(_request_histograms, request.endpoint or 'unknown', elapsed)
+    
+    timings = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in g.get('stage_timings', {}).items()]
+    timings.append(f'total;dur={elapsed * 1000:.2f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+# ログイン認証デコレーター
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get('authenticated'):
+        if not session.get('user_id'):
             return jsonify({'error': 'Authentication required'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    """管理ユーザーのみ許可（プロファイリングなどの運用向けAPI）"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get('user_id'):
+            return jsonify({'error': 'Authentication required'}), 401
+        if not session.get('is_admin'):
+            return jsonify({'error': 'Admin privileges required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# 人物IDの解決
+# 人物はログイン中のユーザーごとに管理し、(ユーザーID, 人物名) → 人物ID をプロセス内に保持する
+_person_ids = {}
+
+def get_person_id(person_name, create=False):
+    """ログイン中のユーザーの人物IDを返す（create=Trueなら無ければ作成、それ以外は無ければNone）"""
+    key = (session['user_id'], person_name)
+    person_id = _person_ids.get(key)
+    if person_id is None:
+        person_id = STORAGE.get_person_id(*key, create=create)
+        if person_id is not None:
+            with _cache_lock:
+                _person_ids[key] = person_id
+    return person_id
+
+# レスポンスキャッシュ
+# 保存先は書き込みごとに人物のバージョン（persons.version）を進める。サマリー・履歴のレスポンスを
+# そのバージョン単位でキャッシュするので、別ノード・worker.py・recompute_nutrients.py などの
+# 他のプロセスによる書き込みでも無効になる（バージョンの取得は主キー1件の参照）
+_cache_lock = threading.Lock()
+_response_cache = {}
+_CACHE_EPOCH = format(int(time.time()), 'x')
+
+def cached_person_response(kind):
+    """人物ごとのレスポンスをキャッシュし、ETag/If-None-Matchに対応するデコレーター"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(person_name):
+            person_id = get_person_id(person_name)
+            version = STORAGE.person_version(person_id) if person_id is not None else 0
+            # 集計期間は日付で変わるため、当日の日付もキーに含める
+            today = datetime.now().strftime('%Y-%m-%d')
+            variant = f'{kind}:compact' if wants_compact() else kind
+            key = f'{variant}:{session["user_id"]}:{person_name}:{person_id}:{version}:{today}'
+            etag = f'{_CACHE_EPOCH}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]}'
+            
+            # 圧縮したレスポンスのETagは弱いETagになるため、弱い比較で照合する
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                cached = _response_cache.get((variant, session['user_id'], person_name))
+                if cached and cached[0] == etag:
+                    response = make_response(cached[1], cached[2])
+                    response.mimetype = 'application/json'
+                else:
+                    response = make_response(f(person_name))
+                    # エラー時はキャッシュしない（データなしの404はキャッシュ可）
+                    if response.status_code in (200, 404):
+                        with _cache_lock:
+                            _response_cache[(variant, session['user_id'], person_name)] = (
+                                etag, response.get_data(), response.status_code)
+            
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Accept')
+            return response
+        return decorated_function
+    return decorator
+
+# ライブ更新（Server-Sent Events）
+# 食事の追加・更新・削除を、人物ごとに購読中のストリームへ食事の行と日ごとの増減として送る。
+# 購読はプロセス内のキューで管理するため、gunicornはスレッドワーカー（gthread）で動かす
+STREAM_KEEPALIVE = 15
+STREAM_MAX_SECONDS = int(os.environ.get('STREAM_MAX_SECONDS', '600'))
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', '16'))
+_stream_lock = threading.Lock()
+_stream_subscribers = {}
+
+def has_stream_subscribers(person_id):
+    return bool(_stream_subscribers.get(person_id))
+
+def publish_meal_change(person_id, action, meal, removed=None, added=None):
+    """購読中のストリームに食事の変更を送る
+    
+    removed / added は (日付, 栄養素の合計のリストまたはdict)。日ごとの栄養素と食事数の増減に変換して送る。
+    """
+    with _stream_lock:
+        subscribers = list(_stream_subscribers.get(person_id, ()))
+    if not subscribers:
+        return
+    
+    days = {}
+    for sign, change in ((-1, removed), (1, added)):
+        if change:
+            meal_date, nutrients = change
+            if isinstance(nutrients, dict):
+                nutrients = nutrient_values(nutrients)
+            meals, totals = days.get(meal_date, (0, [0.0] * len(NUTRIENT_NAMES)))
+            days[meal_date] = (meals + sign, [total + sign * value for total, value in zip(totals, nutrients)])
+    
+    days = {meal_date: {'meals': meals, 'nutrients': nutrient_dict(totals)}
+            for meal_date, (meals, totals) in days.items()}
+    event = json.dumps({'action': action, 'meal': meal, 'days': days}, ensure_ascii=False)
+    for subscriber in subscribers:
+        subscriber.put(('meal', event))
+
+def stream_person_events(person_id):
+    """1人分の変更イベントを送り続けるジェネレーター（STREAM_MAX_SECONDSで切断し、ブラウザが再接続する）"""
+    subscriber = queue.Queue()
+    with _stream_lock:
+        _stream_subscribers.setdefault(person_id, set()).add(subscriber)
+    # 他のプロセス（別ノード・worker.py・再計算スクリプトなど）の書き込みはDBのバージョンで検知して再取得を促す
+    version = STORAGE.person_version(person_id)
+    try:
+        yield 'retry: 3000\n\n'
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                name, data = subscriber.get(timeout=STREAM_KEEPALIVE)
+                yield f'event: {name}\ndata: {data}\n\n'
+                received = 1
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                received = 0
+            # このプロセスの書き込みはイベント1件につきバージョンが1つ進む。それより進んでいれば再取得
+            latest = STORAGE.person_version(person_id)
+            if latest > version + received:
+                yield 'event: refresh\ndata: {}\n\n'
+            version = latest
+    finally:
+        with _stream_lock:
+            subscribers = _stream_subscribers.get(person_id)
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del _stream_subscribers[person_id]
+
+# リクエスト単位のプロファイリング
+# ログイン済みのリクエストで X-Profile: 1 ヘッダーを付けるか、管理者トグルを有効にすると
+# cProfileで計測し、直近の結果をメモリに保持する（/api/admin/profiles から取得）
+PROFILE_KEEP = 20
+_profiling_enabled = False
+_profiles = collections.deque(maxlen=PROFILE_KEEP)
+_profile_ids = itertools.count(1)
+_profiler_lock = threading.Lock()
+
+@app.before_request
+def start_profiler():
+    if not _profiling_enabled and 'X-Profile' not in request.headers:
+        return
+    if request.headers.get('X-Profile', '1') != '1' or not session.get('is_admin'):
+        return
+    if request.path.startswith('/api/admin/'):
+        return
+    # cProfileは同時に1つしか有効にできないため、計測中のリクエストがあればスキップ
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+@app.after_request
+def save_profile(response):
+    """計測結果を保存し、X-Profile-Idヘッダーで通知"""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    _profiler_lock.release()
+    
+    stats = pstats.Stats(profiler)
+    profile_id = next(_profile_ids)
+    _profiles.append({
+        'id': profile_id,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'duration_ms': round(stats.total_tt * 1000, 2),
+        'data': marshal.dumps(stats.stats),
+    })
+    response.headers['X-Profile-Id'] = str(profile_id)
+    return response
+
+@app.teardown_request
+def discard_profiler(exc):
+    # 例外でafter_requestが呼ばれなかった場合の後始末
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+
+@app.after_request
+def compress_response(response):
+    """HTML・JSONのレスポンスを Accept-Encoding に応じて brotli / gzip で圧縮"""
+    if COMPRESS_RESPONSES:
+        compress_body(response, request.accept_encodings)
+    return response
+
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': lambda name: url_for('static_asset', filename=ASSETS.url_name(name))}
+
+# トップページは描画結果を保持し、ETagで再検証させる（静的ファイルの名前が変わるため、キャッシュはしない）
+_index_page = None
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    global _index_page
+    if _index_page is None:
+        html = render_template('index.html').encode('utf-8')
+        _index_page = (html, hashlib.sha1(html).hexdigest()[:16])
+    html, etag = _index_page
+    
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    """ハッシュ付きの名前の静的ファイル（内容が変わると名前も変わるため1年間キャッシュさせる）"""
+    asset = ASSETS.get(filename, negotiate_encoding(request.accept_encodings))
+    if asset is None:
+        return jsonify({'error': 'ファイルが見つかりません'}), 404
+    
+    data, mimetype, encoding = asset
+    response = make_response(data)
+    response.mimetype = mimetype
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus形式の計測データ"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @app.route('/api/login', methods=['POST'])
 def login():
     """パスワード認証"""
     data = request.json
+    # ユーザー名を省略した場合は従来どおり管理ユーザーとしてログイン
+    username = (data.get('username') or '').strip() or DEFAULT_USERNAME
     password = data.get('password', '')
     
-    if password == APP_PASSWORD:
-        session['authenticated'] = True
-        return jsonify({'success': True})
+    user = STORAGE.find_user(username)
+    
+    if user and check_password_hash(user[1], password):
+        session.clear()
+        session['user_id'] = user[0]
+        session['username'] = username
+        session['is_admin'] = bool(user[2])
+        return jsonify({'success': True, 'username': username})
     else:
-        return jsonify({'success': False, 'error': 'パスワードが正しくありません'}), 401
+        return jsonify({'success': False, 'error': 'ユーザー名またはパスワードが正しくありません'}), 401
 
 @app.route('/api/logout', methods=['POST'])
 def logout():
     """ログアウト"""
-    session.pop('authenticated', None)
+    session.clear()
     return jsonify({'success': True})
 
 @app.route('/api/check-auth', methods=['GET'])
 def check_auth():
     """認証状態をチェック"""
-    return jsonify({'authenticated': session.get('authenticated', False)})
+    return jsonify({
+        'authenticated': bool(session.get('user_id')),
+        'username': session.get('username')
+    })
 
 @app.route('/api/persons', methods=['GET'])
 @login_required
 def get_persons():
-    """データベースに記録されている人物のリストを取得"""
+    """ログイン中のユーザーの、食事が記録されている人物のリストを取得"""
     try:
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
-        
-        c.execute('''SELECT DISTINCT person_name FROM meals ORDER BY person_name''')
-        rows = c.fetchall()
-        conn.close()
-        
-        persons = [row[0] for row in rows]
+        persons = STORAGE.list_person_names(session['user_id'])
         
         return jsonify({
             'success': True,
@@ -210,6 +566,46 @@ def parse_numeric_value(value):
     except:
         return 0.0
 
+# 栄養素の並び（compact形式の配列・栄養素ベクトルの順。NUTRIENT_COLUMNSと同じ順）
+NUTRIENT_NAMES = list(DAILY_TARGETS)
+TARGET_VALUES = list(DAILY_TARGETS.values())
+
+def nutrient_dict(values):
+    """栄養素のリスト → {栄養素名: 値}"""
+    return dict(zip(NUTRIENT_NAMES, values))
+
+def nutrient_values(nutrients):
+    """{栄養素名: 値} → 栄養素のリスト"""
+    return [nutrients.get(name) or 0 for name in NUTRIENT_NAMES]
+
+# compact形式（?format=compact または Accept: application/vnd.nutrition.compact+json）
+# 栄養素名の一覧を1回だけ送り、栄養素は食品・日・合計ごとに数値の配列で返す
+COMPACT_MIMETYPE = 'application/vnd.nutrition.compact+json'
+
+def wants_compact():
+    return (request.args.get('format') == 'compact'
+            or request.accept_mimetypes.best == COMPACT_MIMETYPE)
+
+def meal_payload(meal_id, matched_items, total_nutrients, unparsed, compact=False):
+    """食事の計算結果のレスポンス（栄養素はNUTRIENT_NAMESの順のリストで受け取る）"""
+    if compact:
+        return {
+            'success': True,
+            'format': 'compact',
+            'meal_id': meal_id,
+            'nutrients': NUTRIENT_NAMES,
+            'matched_items': matched_items,
+            'total_nutrients': total_nutrients,
+            'unparsed': unparsed
+        }
+    return {
+        'success': True,
+        'meal_id': meal_id,
+        'matched_items': [{**item, 'nutrients': nutrient_dict(item['nutrients'])} for item in matched_items],
+        'total_nutrients': nutrient_dict(total_nutrients),
+        'unparsed': unparsed
+    }
+
 def get_food_suggestions(food_input, available_foods, max_suggestions=5):
     """入力に対して候補を提案"""
     from difflib import SequenceMatcher
@@ -239,119 +635,312 @@ def normalize_text(text):
     text = ' '.join(text.split())
     return text.strip()
 
-def fuzzy_match_food(food_input, available_foods, use_ai=False):
+# 読みの正規化
+# ひらがな・カタカナ（さんま/サンマ）、漢字・かな（大根/だいこん）、長音（ブロッコリー/ブロッコリ）の
+# 表記ゆれを吸収したキーを作る。漢字語の読みは food_readings.json から読み込む。
+# 長音記号を除くのは完全一致で引くキー（reading_key）だけ。部分一致に使うと「こら」が
+# 「るっこら」に含まれるように、別の語に当たりやすくなる
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+_TOKEN_SEPARATOR = re.compile(r'[\s\[\]()<>・、]+')
+
+def fold_kana(text):
+    """カタカナをひらがなに変換"""
+    return text.translate(_KATAKANA_TO_HIRAGANA)
+
+def search_key(text):
+    """検索用のキー（正規化 + ひらがな化 + 小文字化）"""
+    return fold_kana(normalize_text(text)).lower()
+
+READING_WORDS = {word: fold_kana(reading) for word, reading in FOOD_READINGS['words'].items()}
+_READING_PATTERN = re.compile('|'.join(map(re.escape, sorted(READING_WORDS, key=len, reverse=True)))) if READING_WORDS else None
+
+def fold_reading(text):
+    """漢字語を読みに置き換えた検索用キー（区切り・長音記号は残す）"""
+    text = search_key(text)
+    if _READING_PATTERN:
+        text = _READING_PATTERN.sub(lambda match: READING_WORDS[match.group()], text)
+    return text
+
+def reading_key(text):
+    """読みで食品を引くためのキー（区切り・括弧・長音記号を除く）"""
+    return ''.join(_TOKEN_SEPARATOR.split(fold_reading(text))).replace('ー', '')
+
+# キーワードマッピング（一般的な呼び方 → データベースの表記）
+KEYWORD_MAPPINGS = {
+    # 穀類
+    '納豆': '糸引き納豆',
+    'ご飯': 'めし　精白米　うるち米',
+    '白米': 'めし　精白米　うるち米',
+    '玄米': 'めし　玄米',
+    'パン': '食パン',
+    
+    # 卵類（鶏卵を優先）
+    '生卵': '鶏卵　全卵　生',
+    '卵': '鶏卵　全卵',
+    'ゆで卵': '鶏卵　全卵　ゆで',
+    '目玉焼き': '鶏卵　全卵　目玉焼き',
+    
+    # 肉類
+    '鶏肉': 'にわとり　若どり',
+    '鶏もも': 'にわとり　若どり　もも',
+    '鶏もも肉': 'にわとり　若どり　もも',
+    '鶏むね': 'にわとり　若どり　むね',
+    '鶏むね肉': 'にわとり　若どり　むね',
+    'ささみ': 'にわとり　ささみ',
+    '豚肉': 'ぶた　大型種肉',
+    '豚バラ': 'ぶた　大型種肉　ばら',
+    '牛肉': 'うし　和牛肉',
+    
+    # 魚介類
+    'さんま': 'さんま　皮つき',
+    '鮭': 'しろさけ',
+    'さば': 'まさば',
+    'まぐろ': 'まぐろ',
+    
+    # 野菜
+    'ほうれん草': 'ほうれんそう',
+    'ほうれんそう': 'ほうれんそう　葉',
+    'キャベツ': 'キャベツ　結球葉',
+    'レタス': 'レタス　土耕栽培　結球葉',
+    '大根': 'だいこん　根',
+    'にんじん': 'にんじん　根',
+    'トマト': 'トマト　果実',
+    'きゅうり': 'きゅうり　果実',
+    'ブロッコリー': 'ブロッコリー　花序',
+    
+    # 豆腐・大豆製品
+    '豆腐': '木綿豆腐',
+    '絹豆腐': '絹ごし豆腐',
+    '厚揚げ': '生揚げ',
+    
+    # 調味料
+    '味噌': 'みそ　淡色辛みそ',
+    '醤油': 'こいくちしょうゆ',
+    'つゆ': 'めんつゆ',
+    'みりん': 'みりん　本みりん',
+    '砂糖': '砂糖　上白糖',
+    '塩': '食塩',
+    '酢': '米酢',
+    '油': '調合油',
+}
+
+def resolve_keywords(keywords, food_names):
+    """キーワードマッピングの表記（キーワードの並び）を食品名にする
+    
+    すべてのキーワードを含む食品名のうち、キーワードがトークンとして丸ごと現れる数が多いもの、
+    次に短いもの、次に先に並ぶものを選ぶ（「にんじん　根」は「つるにんじん　根　生」ではなく
+    「（にんじん類）　にんじん　根　皮つき　生」）。見つからなければ None
+    """
+    keywords = [search_key(keyword) for keyword in keywords]
+    best, best_rank = None, None
+    for position, name in enumerate(food_names):
+        key = search_key(name)
+        if not all(keyword in key for keyword in keywords):
+            continue
+        tokens = set(_TOKEN_SEPARATOR.split(key))
+        rank = (-sum(keyword in tokens for keyword in keywords), position)
+        if best_rank is None or rank < best_rank:
+            best, best_rank = name, rank
+    return best
+
+def build_reading_index(food_names, aliases, reading_aliases):
+    """読みの索引（読みキー → 食品名）。食品名、別名辞書、キーワードマッピング、成分表の別名の順に登録"""
+    index = {}
+    for name in food_names:
+        index.setdefault(reading_key(name), name)
+    for alias, name in aliases.items():
+        index.setdefault(reading_key(alias), name)
+    # 手作業で調整したキーワードマッピングを成分表の別名より優先する。
+    # 漢字・かなのどちらで入力しても同じ食品になるよう、読みキーでも引けるようにする（大根/だいこん）
+    for keyword, target in KEYWORD_MAPPINGS.items():
+        name = resolve_keywords(target.split(), food_names)
+        if name:
+            index.setdefault(reading_key(keyword), name)
+    for alias, name in reading_aliases.items():
+        if name in food_names:
+            index.setdefault(reading_key(alias), name)
+    return index
+
+# ベクトル検索（レベル5）
+# 読みを正規化した食品名と別名の文字n-gram（1〜3文字）をハッシュで固定次元に落とし、
+# IDFで重み付けしてL2正規化したfloat32行列を起動時に作る。
+# 検索は行列とクエリベクトルの内積（コサイン類似度）の上位K件。ネットワーク不要
+EMBEDDING_DIM = 1024
+# これ未満の近傍は採用せず、AI（レベル6）かマッチなしにする。
+# 0.45 では「オムライス」→「カレーライス」（0.55）のように共通する数文字だけの一致まで拾っていた
+EMBEDDING_MIN_SCORE = 0.6
+
+@functools.lru_cache(maxsize=None)
+def _ngram_bucket(gram):
+    # hash()は起動ごとに値が変わるため、安定したcrc32を使う
+    return zlib.crc32(gram.encode('utf-8')) % EMBEDDING_DIM
+
+def _embedding_features(text):
+    """トークンごとに境界記号を付けた文字1〜3-gramのハッシュ値"""
+    features = []
+    for token in _TOKEN_SEPARATOR.split(fold_reading(text).replace('ー', '')):
+        if not token:
+            continue
+        token = f'^{token}$'
+        for n in (1, 2, 3):
+            for i in range(len(token) - n + 1):
+                gram = token[i:i + n]
+                if gram not in ('^', '$'):
+                    features.append(_ngram_bucket(gram))
+    return features
+
+class FoodEmbeddingIndex:
+    """食品名の文字n-gramベクトルによる近傍検索"""
+    
+    def __init__(self, foods, aliases=None, dim=EMBEDDING_DIM):
+        self.names = [food['食品名'] for food in foods]
+        self.dim = dim
+        rows_by_name = {name: row for row, name in enumerate(self.names)}
+        
+        # 食品名に加えて、別名のn-gramも同じ行に足し込む
+        documents = [(row, name) for row, name in enumerate(self.names)]
+        for alias, name in (aliases or {}).items():
+            if name in rows_by_name:
+                documents.append((rows_by_name[name], alias))
+        rows, columns = [], []
+        for row, text in documents:
+            features = _embedding_features(text)
+            rows.extend([row] * len(features))
+            columns.extend(features)
+        flat = np.asarray(rows, dtype=np.int64) * dim + np.asarray(columns, dtype=np.int64)
+        counts = np.bincount(flat, minlength=len(self.names) * dim).reshape(len(self.names), dim).astype(np.float32)
+        
+        # 多くの食品名に出てくるn-gram（「生」「ゆで」など）ほど重みを下げる
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = np.log((1 + len(self.names)) / (1 + document_frequency)).astype(np.float32) + 1
+        self.matrix = self._normalize(np.log1p(counts) * self.idf)
+    
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+    
+    def embed(self, text):
+        vector = np.bincount(_embedding_features(text), minlength=self.dim).astype(np.float32)
+        return self._normalize(np.log1p(vector) * self.idf)
+    
+    def search(self, text, k=5):
+        """コサイン類似度の上位k件を [(食品名, スコア), ...] で返す"""
+        vector = self.embed(text)
+        if not vector.any():
+            return []
+        scores = self.matrix @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.names[i], float(scores[i])) for i in top]
+
+def fuzzy_match_food(food_input, available_foods, use_ai=False, data=None):
     """食品名をあいまい検索でマッチング
     
     レベル1: 完全一致
     レベル2: 正規化後の完全一致
     レベル3: 部分一致（キーワードベース）
     レベル4: 類似度マッチング
-    レベル5 (オプション): Claude AIによるマッチング
+    レベル5: 文字n-gramベクトルによる近傍検索（numpyがある場合）
+    レベル6 (オプション): DeepSeek / Claude AIによるマッチング
+    
+    data は別名・索引を引く食品データのスナップショット（省略時は現在の FOOD_DATA）。
+    """
+    return fuzzy_match_food_with_level(food_input, available_foods, use_ai, data)[0]
+
+def fuzzy_match_food_with_level(food_input, available_foods, use_ai=False, data=None):
+    """食品名をマッチングし、(食品名, マッチしたレベル) を返す
+    
+    マッチしなかった場合は (None, None)。所要時間はマッチしたレベルごとに計測する。
     """
+    start = time.perf_counter()
+    matched, level = _match_food_levels(food_input, available_foods, use_ai, data or FOOD_DATA)
+    elapsed = time.perf_counter() - start
+    if METRICS_ENABLED:
+        record_stage(f'match_l{level}' if level else 'match_none', elapsed)
+    log_match_outcome(food_input, level, matched, elapsed)
+    return matched, level
+
+def log_match_outcome(food_input, level, matched, seconds):
+    """マッチング結果を追記専用ログに1行で記録
     
+    形式: 時刻(UNIX秒) TAB レベル(0=マッチなし) TAB 所要時間(ms) TAB 入力 TAB マッチした食品名
+    """
+    global _match_log_file
+    if not MATCH_LOG_PATH:
+        return
+    fields = [str(int(time.time())), str(level or 0), f'{seconds * 1000:.2f}', food_input, matched or '']
+    line = '\t'.join(f.replace('\t', ' ').replace('\n', ' ') for f in fields) + '\n'
+    try:
+        with _match_log_lock:
+            if _match_log_file is None:
+                _match_log_file = open(MATCH_LOG_PATH, 'a', encoding='utf-8', buffering=1)
+            _match_log_file.write(line)
+    except OSError as e:
+        app.logger.warning('マッチングログの書き込みに失敗しました: %s', e)
+
+def _match_food_levels(food_input, available_foods, use_ai, data):
     input_normalized = normalize_text(food_input)
     
-    # レベル1: 完全一致
+    # レベル1: 完全一致（別名辞書を含む）
+    alias = data.aliases.get(input_normalized)
+    if alias:
+        return alias, 1
+    
     for food in available_foods:
         if food['食品名'] == food_input:
-            return food['食品名']
+            return food['食品名'], 1
     
-    # レベル2: 正規化後の完全一致
-    for food in available_foods:
-        if normalize_text(food['食品名']) == input_normalized:
-            return food['食品名']
+    # レベル2: 読みを正規化したキーの完全一致（食品名・別名の索引を引く）
+    reading_match = data.reading_index.get(reading_key(food_input))
+    if reading_match:
+        return reading_match, 2
     
     # レベル3: キーワードベースのマッチング
     # 入力からキーワードを抽出
     keywords = [w for w in input_normalized.replace('　', ' ').split() if len(w) > 0]
     
-    # キーワードマッピング（一般的な呼び方 → データベースの表記）
-    keyword_mappings = {
-        # 穀類
-        '納豆': '糸引き納豆',
-        'ご飯': 'めし　精白米　うるち米',
-        '白米': 'めし　精白米　うるち米',
-        '玄米': 'めし　玄米',
-        'パン': '食パン',
-        
-        # 卵類（鶏卵を優先）
-        '生卵': '鶏卵　全卵　生',
-        '卵': '鶏卵　全卵',
-        'ゆで卵': '鶏卵　全卵　ゆで',
-        '目玉焼き': '鶏卵　全卵　目玉焼き',
-        
-        # 肉類
-        '鶏肉': 'にわとり　若どり',
-        '鶏もも': 'にわとり　若どり　もも',
-        '鶏もも肉': 'にわとり　若どり　もも',
-        '鶏むね': 'にわとり　若どり　むね',
-        '鶏むね肉': 'にわとり　若どり　むね',
-        'ささみ': 'にわとり　ささみ',
-        '豚肉': '豚　大型種肉',
-        '豚バラ': '豚　大型種肉　ばら',
-        '牛肉': '牛　和牛肉',
-        
-        # 魚介類
-        'さんま': 'さんま　皮つき',
-        '鮭': 'しろさけ',
-        'さば': 'まさば',
-        'まぐろ': 'まぐろ',
-        
-        # 野菜
-        'ほうれん草': 'ほうれんそう',
-        'ほうれんそう': 'ほうれんそう　葉',
-        'キャベツ': 'キャベツ　結球葉',
-        'レタス': 'レタス　土耕栽培　結球葉',
-        '大根': 'だいこん　根',
-        'にんじん': 'にんじん　根',
-        'トマト': 'トマト　果実',
-        'きゅうり': 'きゅうり　果実',
-        'ブロッコリー': 'ブロッコリー　花序',
-        
-        # 豆腐・大豆製品
-        '豆腐': '木綿豆腐',
-        '絹豆腐': '絹ごし豆腐',
-        '厚揚げ': '生揚げ',
-        
-        # 調味料
-        '味噌': 'みそ　淡色辛みそ',
-        '醤油': 'しょうゆ　濃口',
-        'つゆ': 'めんつゆ',
-        'みりん': 'みりん　本みりん',
-        '砂糖': '砂糖　上白糖',
-        '塩': '食塩',
-        '酢': '米酢',
-        '油': 'サラダ油',
-    }
-    
     # キーワードマッピングを適用
     expanded_keywords = []
     for kw in keywords:
         expanded_keywords.append(kw)
-        if kw in keyword_mappings:
-            expanded_keywords.extend(keyword_mappings[kw].split())
+        if kw in KEYWORD_MAPPINGS:
+            expanded_keywords.extend(KEYWORD_MAPPINGS[kw].split())
+    
+    # 表記ゆれを吸収した読みでも照合する（サンマ → さんま、大根 → だいこん）
+    keyword_pairs = [(kw, fold_reading(kw)) for kw in expanded_keywords]
     
     # スコアリング: すべてのキーワードを含む食品を探す
+    # スコアは (含むキーワードの数, そのうち表記そのままで含む数)。読みだけの一致は同数のときに負ける
+    # （「鶏」は読みの「とり」を含む「とりがい」より、表記の「鶏」を含む「鶏卵」）
     best_match = None
-    best_score = 0
+    best_score = (0, 0)
     
     for food in available_foods:
         food_name = food['食品名']
-        score = 0
+        food_reading = data.reading_keys.get(food_name)
+        if food_reading is None:
+            food_reading = fold_reading(food_name)
+        matched = surface = 0
         
         # 各キーワードが含まれているかチェック
-        for kw in expanded_keywords:
+        for kw, reading in keyword_pairs:
             if kw in food_name:
-                score += 1
+                matched += 1
+                surface += 1
+            elif reading in food_reading:
+                matched += 1
         
         # より多くのキーワードを含む食品を優先
-        if score > best_score:
-            best_score = score
+        if (matched, surface) > best_score:
+            best_score = (matched, surface)
             best_match = food_name
     
     # 少なくとも1つのキーワードがマッチした場合
-    if best_score > 0:
-        return best_match
+    if best_score[0] > 0:
+        return best_match, 3
     
     # レベル4: 類似度マッチング（difflib使用）
     from difflib import SequenceMatcher
@@ -367,28 +956,69 @@ def fuzzy_match_food(food_input, available_foods, use_ai=False):
     
     # 類似度が60%以上ならマッチとみなす
     if best_ratio >= 0.6:
-        return best_match
+        return best_match, 4
+    
+    # レベル5: ベクトル検索（オフラインで動く意味的な近傍検索）
+    if data.embedding_index is not None and available_foods is data.foods:
+        nearest = data.embedding_index.search(food_input, k=1)
+        if nearest and nearest[0][1] >= EMBEDDING_MIN_SCORE:
+            return nearest[0][0], 5
     
-    # レベル5: Claude AIによるマッチング（オプション）
+    # レベル6: DeepSeek / Claude AIによるマッチング（オプション）
     if use_ai and CLAUDE_API_KEY:
         try:
-            ai_match = match_food_with_ai_fallback(food_input, available_foods)
+            with timed('ai'):
+                ai_match = match_food_with_ai_fallback(food_input, available_foods)
             if ai_match:
-                return ai_match
+                return ai_match, 6
+        except AIProviderError:
+            # 一時的な失敗は呼び出し元に伝える（ジョブなら再実行される）
+            raise
         except Exception as e:
-            print(f"AI検索エラー（続行します）: {e}")
+            app.logger.warning('AI検索エラー（続行します）: %s', e)
     
-    return None
+    return None, None
+
+class AIProviderError(Exception):
+    """AI APIの一時的な失敗（タイムアウト・接続エラー・429・5xx）。時間をおけば成功しうる
+    
+    retry_after は応答の Retry-After ヘッダー（秒）。ジョブはそれより早くは再実行しない。
+    """
+    
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def retry_after_seconds(headers):
+    """Retry-After ヘッダー（秒数またはHTTP日付）を秒数にする。無い・読めなければNone"""
+    value = (headers or {}).get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (email.utils.parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
 
 def match_food_with_deepseek(food_input, available_foods):
-    """DeepSeek APIを使った高度なマッチング"""
+    """DeepSeek APIを使った高度なマッチング
+    
+    一時的な失敗は AIProviderError を送出し、それ以外の失敗や候補にない回答は None を返す。
+    """
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
     if not DEEPSEEK_API_KEY:
         return None
     
     try:
         import requests
-        
+    except ImportError:
+        app.logger.warning('requestsモジュールが利用できません')
+        return None
+    
+    try:
         # 候補をいくつか絞り込む
         candidates = []
         for food in available_foods:
@@ -406,7 +1036,7 @@ def match_food_with_deepseek(food_input, available_foods):
 選んだ食品名のみを回答してください（他の説明は不要）。"""
         
         response = requests.post(
-            'https://api.deepseek.com/v1/chat/completions',
+            f'{DEEPSEEK_BASE_URL}/v1/chat/completions',
             headers={
                 'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
                 'Content-Type': 'application/json'
@@ -419,6 +1049,9 @@ def match_food_with_deepseek(food_input, available_foods):
             timeout=30
         )
         
+        if response.status_code == 429 or response.status_code >= 500:
+            raise AIProviderError(f'DeepSeek API: HTTP {response.status_code}',
+                                  retry_after_seconds(response.headers))
         if response.status_code == 200:
             result = response.json()
             matched = result['choices'][0]['message']['content'].strip()
@@ -429,24 +1062,38 @@ def match_food_with_deepseek(food_input, available_foods):
                     return food['食品名']
         
         return None
+    except AIProviderError:
+        raise
+    except (requests.Timeout, requests.ConnectionError) as e:
+        raise AIProviderError(f'DeepSeek API: {e}') from e
     except Exception as e:
-        print(f"DeepSeek API検索エラー: {e}")
+        app.logger.warning('DeepSeek API検索エラー: %s', e)
         return None
 
 def match_food_with_ai_fallback(food_input, available_foods):
-    """AIを使った高度なマッチング（フォールバック用）"""
+    """AIを使った高度なマッチング（フォールバック用）
+    
+    どのAPIからも回答を得られず、一時的な失敗があった場合は AIProviderError を送出する。
+    """
     # まずDeepSeekを試す
-    result = match_food_with_deepseek(food_input, available_foods)
+    transient = None
+    try:
+        result = match_food_with_deepseek(food_input, available_foods)
+    except AIProviderError as e:
+        app.logger.warning('DeepSeek APIの一時的なエラー: %s', e)
+        transient, result = e, None
     if result:
         return result
     
     # DeepSeekが使えない場合はClaudeを試す
     if not ANTHROPIC_AVAILABLE:
-        print("AIモジュールが利用できません")
+        app.logger.warning('AIモジュールが利用できません')
+        if transient:
+            raise transient
         return None
     
     try:
-        client = anthropic.Anthropic(api_key=CLAUDE_API_KEY, max_retries=2)
+        client = anthropic.Anthropic(api_key=CLAUDE_API_KEY, base_url=CLAUDE_BASE_URL, max_retries=2)
         
         # 候補をいくつか絞り込む
         candidates = []
@@ -478,9 +1125,547 @@ def match_food_with_ai_fallback(food_input, available_foods):
                 return food['食品名']
         
         return None
+    except (anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError) as e:
+        response = getattr(e, 'response', None)
+        raise AIProviderError(f'Claude API: {e}',
+                              retry_after_seconds(response.headers if response is not None else None)) from e
+    except Exception as e:
+        app.logger.warning('AI検索エラー: %s', e)
+        if transient:
+            raise transient
+        return None
+
+# 食品名検索インデックス（入力補完用）
+# 正規化・カタカナ→ひらがな変換したキーで、トークンの前方一致（ソート済み配列＋二分探索）と
+# 部分一致（文字bigram）を引く
+class FoodSearchIndex:
+    """食品名・別名の前方一致／部分一致インデックス"""
+    
+    def __init__(self, foods, aliases=None, keyword_mappings=None):
+        self.names = [food['食品名'] for food in foods]
+        # 表記そのままのキーと読みを正規化したキーの両方で引けるようにする
+        self.keys = [(search_key(name).replace(' ', ''), reading_key(name)) for name in self.names]
+        ids_by_name = {name: food_id for food_id, name in enumerate(self.names)}
+        
+        # (キー, 優先度, 食品ID)。優先度は別名 > 食品名のトークン
+        entries = set()
+        for food_id, name in enumerate(self.names):
+            for text in (search_key(name), fold_reading(name)):
+                for token in _TOKEN_SEPARATOR.split(text):
+                    if token:
+                        entries.add((token, 1, food_id))
+        for alias, name in (aliases or {}).items():
+            if name in ids_by_name:
+                entries.add((reading_key(alias), 0, ids_by_name[name]))
+        for alias, keywords in (keyword_mappings or {}).items():
+            food_id = self._resolve_keywords(keywords.split())
+            if food_id is not None:
+                entries.add((reading_key(alias), 0, food_id))
+        self.prefix_entries = sorted(entries)
+        
+        self.ngrams = collections.defaultdict(set)
+        for food_id, keys in enumerate(self.keys):
+            for key in keys:
+                for i in range(len(key)):
+                    self.ngrams[key[i]].add(food_id)
+                    if i + 1 < len(key):
+                        self.ngrams[key[i:i + 2]].add(food_id)
+    
+    def _resolve_keywords(self, keywords):
+        """キーワードマッピングの表記に当たる食品名のIDを返す（resolve_keywords と同じ選び方）"""
+        name = resolve_keywords(keywords, self.names)
+        return None if name is None else self.names.index(name)
+    
+    def _substring_candidates(self, query):
+        grams = [query] if len(query) == 1 else [query[i:i + 2] for i in range(len(query) - 1)]
+        sets = sorted((self.ngrams.get(gram, set()) for gram in grams), key=len)
+        candidates = set(sets[0])
+        for other in sets[1:]:
+            candidates &= other
+            if not candidates:
+                break
+        return candidates
+    
+    def search(self, query, limit=10):
+        """食品名を検索（完全一致 > 前方一致 > 部分一致、同順位は短い名前を優先）"""
+        queries = {search_key(query).replace(' ', ''), reading_key(query)} - {''}
+        
+        scores = {}
+        for query in queries:
+            start = bisect.bisect_left(self.prefix_entries, (query,))
+            for token, priority, food_id in itertools.islice(self.prefix_entries, start, None):
+                if not token.startswith(query):
+                    break
+                score = (4 if token == query else 2) - priority
+                if score > scores.get(food_id, 0):
+                    scores[food_id] = score
+        
+        for query in queries:
+            for food_id in self._substring_candidates(query):
+                if food_id not in scores and any(query in key for key in self.keys[food_id]):
+                    scores[food_id] = 1
+        
+        ranked = sorted(scores, key=lambda food_id: (-scores[food_id], len(self.names[food_id]), food_id))
+        return [self.names[food_id] for food_id in ranked[:limit]]
+
+# 食品データのスナップショット
+# 食品データベース・別名辞書・成分表の別名・料理と、それから作る索引・行列・キャッシュをまとめて持つ。
+# 再読み込みでは新しいスナップショットをバックグラウンドで丸ごと作ってから FOOD_DATA を差し替える。
+# 参照の代入は不可分なので、リクエスト側はロックを取らずに FOOD_DATA を1回読み、そのリクエストの間使い続ける
+FOOD_DATA_FILES = {'foods': 'food_database.json', 'aliases': 'food_aliases.json', 'readings': 'food_readings.json',
+                   'recipes': 'food_recipes.json'}
+# ファイルの変更を確認する間隔（秒）。0なら監視しない（POST /api/admin/food-data/reload で再読み込み）
+FOOD_DATA_WATCH_INTERVAL = float(os.environ.get('FOOD_DATA_WATCH_INTERVAL', '0'))
+
+def _resolve_ingredients(ingredients, vectors, aliases):
+    """材料を {食品名: 重さg} にする。見つからない材料・正しくない重さがあれば (None, エラーメッセージ)"""
+    resolved = {}
+    for ingredient, grams in ingredients.items():
+        name = ingredient if ingredient in vectors else aliases.get(normalize_text(ingredient))
+        if name not in vectors:
+            return None, f'材料「{ingredient}」が見つかりません'
+        if not isinstance(grams, (int, float)) or grams <= 0:
+            return None, f'材料「{ingredient}」の重さが正しくありません'
+        resolved[name] = resolved.get(name, 0) + grams
+    if not resolved:
+        return None, '材料がありません'
+    return resolved, None
+
+def expand_recipes(recipes, foods, aliases):
+    """料理（料理名 → {'ingredients': {材料: 重さg}, 'weight': 出来上がりの重さg, 'aliases': [...]}) を食品の行にする
+    
+    材料には食品名・別名・先に定義した料理を使える。料理の行は材料の栄養素の合計を
+    出来上がりの重さ（省略時は材料の重さの合計。水・煮詰まりの分を含める）の100gあたりに
+    換算した値を持つ（'材料' に材料と重さ）。出来上がりの重さが1人前になる。
+    (料理の行のリスト, {料理名: 1人前の重さg}, {料理の別名: 料理名}, エラーメッセージのリスト) を返す。
+    """
+    vectors = {food['食品名']: [parse_numeric_value(food.get(name, 0)) for name in NUTRIENT_NAMES] for food in foods}
+    rows, weights, recipe_aliases, errors = [], {}, {}, []
+    for recipe_name, recipe in recipes.items():
+        if recipe_name in vectors:
+            errors.append(f'料理「{recipe_name}」: 同じ名前の食品があります')
+            continue
+        resolved, error = _resolve_ingredients(recipe.get('ingredients') or {}, vectors, aliases)
+        if error:
+            errors.append(f'料理「{recipe_name}」: {error}')
+            continue
+        
+        total = [0.0] * len(NUTRIENT_NAMES)
+        for name, grams in resolved.items():
+            total = [value + food_value * grams / 100.0 for value, food_value in zip(total, vectors[name])]
+        weight = recipe.get('weight') or sum(resolved.values())
+        if not isinstance(weight, (int, float)) or weight <= 0:
+            errors.append(f'料理「{recipe_name}」: 出来上がりの重さが正しくありません')
+            continue
+        vectors[recipe_name] = [value / weight * 100.0 for value in total]
+        rows.append({'食品名': recipe_name, **nutrient_dict(vectors[recipe_name]), '材料': resolved})
+        weights[recipe_name] = weight
+        recipe_aliases.update({normalize_text(alias): recipe_name for alias in recipe.get('aliases', [])})
+    return rows, weights, recipe_aliases, errors
+
+class FoodData:
+    """食品データと索引のスナップショット（作成後は変更しない）"""
+    
+    def __init__(self, foods, aliases=None, reading_aliases=None, version='', recipes=None):
+        self.version = version
+        self.loaded_at = time.time()
+        aliases = aliases or {}
+        # 料理は100gあたりの栄養素を計算した食品の行として、他の食品と同じ索引に入れる
+        recipe_foods, self.recipe_weights, recipe_aliases, self.recipe_errors = expand_recipes(
+            recipes or {}, foods, aliases)
+        for error in self.recipe_errors:
+            app.logger.warning('%s', error)
+        foods = foods + recipe_foods
+        self.foods = foods
+        self.by_name = {food['食品名']: food for food in foods}
+        # 存在しない食品名を指す別名は除外（別名辞書は料理の別名より優先）
+        self.aliases = {alias: name for alias, name in {**recipe_aliases, **aliases}.items() if name in self.by_name}
+        reading_aliases = reading_aliases or {}
+        
+        self.reading_keys = {name: fold_reading(name) for name in self.by_name}
+        self.reading_index = build_reading_index(self.reading_keys, self.aliases, reading_aliases)
+        self.embedding_index = (FoodEmbeddingIndex(foods, {**reading_aliases, **self.aliases})
+                                if NUMPY_AVAILABLE else None)
+        self.search_index = FoodSearchIndex(foods, self.aliases, KEYWORD_MAPPINGS)
+        
+        # 食品ごとの100gあたりの栄養素（NUTRIENT_NAMESの順のリスト）を数値化しておく
+        self.nutrient_vectors = {food['食品名']: [parse_numeric_value(food.get(name, 0)) for name in NUTRIENT_NAMES]
+                                 for food in foods}
+        # 不足栄養素を補う食品の提案（食品 × 栄養素の行列）
+        self.recommender = (NutrientRecommender(self.nutrient_vectors, NUTRIENT_NAMES, TARGET_VALUES)
+                            if NUMPY_AVAILABLE else None)
+        # 1日の献立の最適化（線形計画法、scipyが必要）
+        self.planner = (MealPlanner(self.nutrient_vectors, NUTRIENT_NAMES, TARGET_VALUES)
+                        if SCIPY_AVAILABLE else None)
+        
+        # 入力補完の結果はスナップショットごとにキャッシュする（差し替えると古い版の分だけが捨てられる）
+        self.search = functools.lru_cache(maxsize=2048)(self._search)
+    
+    def _search(self, query, limit=10):
+        return tuple(self.search_index.search(query, limit))
+    
+    @classmethod
+    def load(cls, base_dir='.'):
+        """ファイルから作る。版は FOOD_DATA_FILES の内容のハッシュ"""
+        return cls.from_files(*read_food_data_files(base_dir))
+    
+    @classmethod
+    def from_files(cls, version, contents):
+        readings = json.loads(contents['readings']) if contents['readings'] else {}
+        return cls(json.loads(contents['foods']),
+                   json.loads(contents['aliases']) if contents['aliases'] else {},
+                   readings.get('aliases', {}),
+                   version,
+                   json.loads(contents['recipes']) if contents['recipes'] else {})
+
+def read_food_data_files(base_dir='.'):
+    """(版, {種類: ファイルの内容}) を返す（存在しないファイルはNone。食品データベースは必須）"""
+    contents = {}
+    digest = hashlib.sha256()
+    for kind, filename in FOOD_DATA_FILES.items():
+        path = os.path.join(base_dir, filename)
+        if os.path.exists(path) or kind == 'foods':
+            with open(path, 'rb') as f:
+                contents[kind] = f.read()
+        else:
+            contents[kind] = None
+        digest.update(kind.encode() + b'\0' + (contents[kind] or b'') + b'\0')
+    return digest.hexdigest()[:12], contents
+
+# 食品データを読み込み、データベースを初期化（foods テーブルを読み込んだ版に合わせる）
+FOOD_DATA = FoodData.load()
+init_db()
+
+_food_data_reload_lock = threading.Lock()
+_food_data_status = {'reloading': False, 'last_error': None, 'last_checked': None}
+_food_data_watcher = None
+_food_data_watcher_lock = threading.Lock()
+
+def reload_food_data(base_dir='.'):
+    """ファイルを読み直し、内容が変わっていればスナップショットを差し替える（差し替えたらTrue）
+    
+    索引の作り直しはこの関数を呼んだスレッドで行う。同時に呼ばれた場合は1つだけが実行する。
+    """
+    global FOOD_DATA
+    if not _food_data_reload_lock.acquire(blocking=False):
+        return False
+    try:
+        _food_data_status.update(reloading=True, last_checked=time.time(), last_error=None)
+        version, contents = read_food_data_files(base_dir)
+        if version == FOOD_DATA.version:
+            return False
+        with timed('food_data_reload'):
+            new_data = FoodData.from_files(version, contents)
+            # 食品ごとの集計（/api/contributors）が使う foods テーブルを合わせてから差し替える
+            STORAGE.sync_foods(new_data.nutrient_vectors)
+        old_version = FOOD_DATA.version
+        FOOD_DATA = new_data
+        app.logger.info('食品データを再読み込みしました: %s → %s（%d品目）', old_version, version, len(new_data.foods))
+        return True
     except Exception as e:
-        print(f"AI検索エラー: {e}")
+        # 読み込みに失敗した場合は今のスナップショットを使い続ける
+        _food_data_status['last_error'] = f'{type(e).__name__}: {e}'
+        app.logger.warning('食品データの再読み込みに失敗しました: %s', e)
+        return False
+    finally:
+        _food_data_status['reloading'] = False
+        _food_data_reload_lock.release()
+
+def start_food_data_reload():
+    """バックグラウンドのスレッドで再読み込みする"""
+    thread = threading.Thread(target=reload_food_data, name='food-data-reload', daemon=True)
+    thread.start()
+    return thread
+
+def _food_data_mtimes():
+    mtimes = []
+    for filename in FOOD_DATA_FILES.values():
+        try:
+            mtimes.append(os.stat(filename).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return mtimes
+
+def _watch_food_data(interval):
+    """ファイルの更新時刻が変わったら再読み込みする（プロセスごとに動くため、複数ワーカーでもそれぞれ反映される）"""
+    mtimes = _food_data_mtimes()
+    while True:
+        time.sleep(interval)
+        current = _food_data_mtimes()
+        if current != mtimes:
+            mtimes = current
+            reload_food_data()
+
+@app.before_request
+def start_food_data_watcher():
+    """FOOD_DATA_WATCH_INTERVAL > 0 なら最初のリクエストで監視スレッドを起動"""
+    global _food_data_watcher
+    if FOOD_DATA_WATCH_INTERVAL > 0 and _food_data_watcher is None:
+        with _food_data_watcher_lock:
+            if _food_data_watcher is None:
+                _food_data_watcher = threading.Thread(target=_watch_food_data, args=(FOOD_DATA_WATCH_INTERVAL,),
+                                                      name='food-data-watcher', daemon=True)
+                _food_data_watcher.start()
+
+def search_foods(query, limit=10):
+    """入力補完用の食品名検索（結果は食品データの版ごとにキャッシュ）"""
+    return FOOD_DATA.search(query, limit)
+
+@app.route('/api/foods/search', methods=['GET'])
+@login_required
+def search_foods_api():
+    """食品名の入力補完"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    with timed('search'):
+        foods = list(search_foods(query, limit)) if query else []
+    
+    response = jsonify({'success': True, 'query': query, 'foods': foods})
+    # キー入力ごとの再問い合わせをブラウザキャッシュで吸収
+    response.headers['Cache-Control'] = 'private, max-age=600'
+    return response
+
+# 食事入力のパーサー
+# 「納豆45g、ご飯1杯、卵2個、牛乳200ml、醤油小さじ1」のような入力を1食品ずつ分解する
+
+# 区切り文字（読点、カンマ、セミコロン、句点、改行）
+ITEM_SEPARATOR = re.compile(r'[、,，;；。\n\r]+')
+
+# 全角英数字・記号を半角へ（1文字ずつ置き換えるので食品名の位置は変わらない）
+_QUANTITY_TRANSLATION = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+_QUANTITY_TRANSLATION.update({ord('½'): '1/2', ord('¼'): '1/4', ord('¾'): '3/4', ord('⁄'): '/',
+                              ord('㎖'): 'ml', ord('㏄'): 'cc', ord('ℓ'): 'l',
+                              ord('㎏'): 'kg', ord('㎎'): 'mg', ord('㌘'): 'g'})
+
+KANJI_NUMBERS = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10, '半': 0.5}
+
+# 重量・容量の単位（容量はmlに換算後、比重を掛ける）
+WEIGHT_UNITS = {'g': 1, 'グラム': 1, 'kg': 1000, 'mg': 0.001}
+VOLUME_UNITS = {'ml': 1, 'cc': 1, 'l': 1000, '大さじ': 15, '小さじ': 5, 'カップ': 200}
+
+# 比重（g/ml）。記載がなければ1.0
+FOOD_DENSITIES = {
+    '牛乳': 1.03, '豆乳': 1.03, '醤油': 1.2, 'しょうゆ': 1.2, '味噌': 1.2, 'みそ': 1.2,
+    'みりん': 1.2, '酢': 1.0, '砂糖': 0.6, '塩': 1.2, '食塩': 1.2, '油': 0.8,
+    'マヨネーズ': 0.8, 'ケチャップ': 1.0, 'バター': 0.8, 'はちみつ': 1.4, '小麦粉': 0.6,
+}
+
+# 数える単位の標準重量（食品ごと、可食部g）
+STANDARD_WEIGHTS = {
+    'ご飯': {'杯': 150, '膳': 150, '椀': 150, '合': 330},
+    'ごはん': {'杯': 150, '膳': 150, '椀': 150, '合': 330},
+    '白米': {'杯': 150, '膳': 150, '合': 330},
+    '玄米': {'杯': 150, '膳': 150, '合': 330},
+    'おにぎり': {'個': 100},
+    'もち': {'個': 50},
+    '餅': {'個': 50},
+    '食パン': {'枚': 60},
+    'パン': {'枚': 60, '個': 40},
+    'うどん': {'玉': 230},
+    'そば': {'玉': 170},
+    '中華めん': {'玉': 120},
+    'スパゲッティ': {'人前': 100},
+    '卵': {'個': 50},
+    '鶏卵': {'個': 50},
+    '納豆': {'パック': 45, '個': 45},
+    '豆腐': {'丁': 300, 'パック': 150},
+    '油揚げ': {'枚': 30},
+    '牛乳': {'杯': 200, '本': 200, 'パック': 200},
+    'ヨーグルト': {'個': 100, 'パック': 100},
+    'チーズ': {'枚': 18, '個': 20},
+    '味噌汁': {'杯': 150, '椀': 150},
+    'みそ汁': {'杯': 150, '椀': 150},
+    '鮭': {'切れ': 80, '切': 80},
+    'さけ': {'切れ': 80, '切': 80},
+    'さば': {'切れ': 80, '切': 80},
+    'さんま': {'尾': 100, '匹': 100},
+    'あじ': {'尾': 70, '匹': 70},
+    'ウインナー': {'本': 20},
+    'ソーセージ': {'本': 20},
+    'ベーコン': {'枚': 17},
+    'ハム': {'枚': 10},
+    'バナナ': {'本': 100},
+    'りんご': {'個': 250},
+    'みかん': {'個': 80},
+    'いちご': {'個': 15, '粒': 15},
+    'トマト': {'個': 150},
+    'ミニトマト': {'個': 10},
+    'きゅうり': {'本': 100},
+    'なす': {'本': 80},
+    'にんじん': {'本': 150},
+    'たまねぎ': {'個': 200},
+    'じゃがいも': {'個': 130},
+    'ブロッコリー': {'房': 15, '株': 200},
+    'キャベツ': {'枚': 50},
+    'レタス': {'枚': 30},
+    'にんにく': {'片': 5, 'かけ': 5},
+    'しょうが': {'かけ': 15},
+    'のり': {'枚': 3},
+}
+
+# 量を表す言葉（g）
+PORTION_WORDS = {'少々': 0.5, 'ひとつまみ': 1}
+
+# 盛り・大きさを表す言葉（1人分の何倍か）。1人分は料理なら1人前、それ以外は標準重量表の最初の単位1つ
+SERVING_SIZES = {'大盛り': 1.5, '大盛': 1.5, '特盛り': 2, '特盛': 2, '小盛り': 0.7, '小盛': 0.7,
+                 '並盛り': 1, '並盛': 1, '普通盛り': 1, '半分': 0.5}
+
+# 量のあとに付けてもよい注記（量はそのまま使う）。例: 「ご飯150g 大盛り」「納豆45g（朝）」「ご飯1杯くらい」
+_ITEM_NOTE_PATTERN = (rf'(?:\s*(?:[（(][^）)]*[）)]|くらい|ぐらい|程度|ほど'
+                      rf'|{"|".join(sorted(SERVING_SIZES, key=len, reverse=True))}))*')
+
+# 料理（food_recipes.json）の1人前を表す単位。1人前は材料の重さの合計
+RECIPE_UNITS = ('人前', '皿', '食')
+
+_COUNT_UNITS = sorted({unit for weights in STANDARD_WEIGHTS.values() for unit in weights} | set(RECIPE_UNITS),
+                      key=len, reverse=True)
+_QUANTITY_PATTERN = r'(?:\d+(?:\.\d+)?(?:/\d+)?|[一二三四五六七八九十半])'
+_STANDARD_WEIGHT_KEYS = sorted(STANDARD_WEIGHTS, key=len, reverse=True)
+_DENSITY_KEYS = sorted(FOOD_DENSITIES, key=len, reverse=True)
+
+ITEM_PATTERN = re.compile(
+    r'(?P<name>.+?)\s*(?:'
+    rf'(?P<prefix_unit>大さじ|小さじ|カップ)\s*(?P<prefix_quantity>{_QUANTITY_PATTERN})'
+    rf'|(?P<quantity>{_QUANTITY_PATTERN})\s*(?P<unit>kg|mg|g|グラム|ml|cc|l|カップ|{"|".join(_COUNT_UNITS)})'
+    rf'|(?P<word>{"|".join(PORTION_WORDS)})'
+    rf'|(?P<size>{"|".join(sorted(SERVING_SIZES, key=len, reverse=True))})'
+    rf'){_ITEM_NOTE_PATTERN}\s*',
+    re.IGNORECASE)
+
+def parse_quantity(text):
+    """数量の文字列（45, 1.5, 1/2, 二, 半）を数値に変換"""
+    if text in KANJI_NUMBERS:
+        return KANJI_NUMBERS[text]
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text)
+
+def _lookup_by_keyword(food_name, table, keys):
+    for key in keys:
+        if key in food_name:
+            return table[key]
+    return None
+
+def unit_to_grams(food_name, unit):
+    """単位1つあたりの重さ（g）を返す。換算できない場合はNone"""
+    unit = unit.lower()
+    if unit in WEIGHT_UNITS:
+        return WEIGHT_UNITS[unit]
+    if unit in VOLUME_UNITS:
+        density = _lookup_by_keyword(food_name, FOOD_DENSITIES, _DENSITY_KEYS) or 1.0
+        return VOLUME_UNITS[unit] * density
+    if unit in RECIPE_UNITS:
+        data = FOOD_DATA
+        recipe_name = food_name if food_name in data.recipe_weights else data.aliases.get(normalize_text(food_name))
+        if recipe_name in data.recipe_weights:
+            return data.recipe_weights[recipe_name]
+    weights = _lookup_by_keyword(food_name, STANDARD_WEIGHTS, _STANDARD_WEIGHT_KEYS)
+    if weights:
+        return weights.get(unit)
+    return None
+
+def serving_grams(food_name):
+    """1人分の重さ（g）。料理は1人前、それ以外は標準重量表の最初の単位1つ。わからなければNone"""
+    grams = unit_to_grams(food_name, RECIPE_UNITS[0])
+    if grams is None:
+        weights = _lookup_by_keyword(food_name, STANDARD_WEIGHTS, _STANDARD_WEIGHT_KEYS)
+        grams = next(iter(weights.values())) if weights else None
+    return grams
+
+def parse_food_item(fragment):
+    """1食品分の入力をパース（例: 「ご飯1杯」→ {'food_name': 'ご飯', 'weight': 150.0}）
+    
+    量のあとの注記（「大盛り」「（朝）」「くらい」など）は読み飛ばす。
+    量の代わりに「ご飯大盛り」「りんご半分」のように書くと、1人分に倍率を掛ける。
+    """
+    text = fragment.translate(_QUANTITY_TRANSLATION)
+    match = ITEM_PATTERN.fullmatch(text)
+    if not match:
+        return None
+    
+    # 全角英数字の置き換えは1文字ずつなので、食品名は元の入力から取り出す
+    food_name = fragment[:match.end('name')].strip()
+    
+    if match.group('word'):
+        weight = PORTION_WORDS[match.group('word')]
+    elif match.group('size'):
+        grams = serving_grams(food_name)
+        if grams is None:
+            return None
+        weight = SERVING_SIZES[match.group('size')] * grams
+    else:
+        unit = match.group('unit') or match.group('prefix_unit')
+        quantity = parse_quantity(match.group('quantity') or match.group('prefix_quantity'))
+        grams = unit_to_grams(food_name, unit)
+        if grams is None:
+            return None
+        weight = quantity * grams
+    
+    if not food_name or weight <= 0:
         return None
+    return {'food_name': food_name, 'weight': round(float(weight), 2)}
+
+def parse_food_input(food_input):
+    """食事の入力をパースし、(食品リスト, パースできなかった断片のリスト) を返す"""
+    parsed_items = []
+    unparsed = []
+    for fragment in ITEM_SEPARATOR.split(food_input):
+        fragment = fragment.strip()
+        if not fragment:
+            continue
+        item = parse_food_item(fragment)
+        if item:
+            parsed_items.append(item)
+        else:
+            unparsed.append(fragment)
+    return parsed_items, unparsed
+
+def calculate_meal_items(parsed_items, use_ai=True):
+    """食品をマッチングして栄養素を計算
+    
+    (matched_items, total_nutrients, エラーメッセージ) を返す。栄養素はNUTRIENT_NAMESの順のリスト。
+    同じ食品名は1回だけマッチングする。
+    """
+    # 途中で食品データが差し替わっても、1回の計算では同じスナップショットを使う
+    data = FOOD_DATA
+    matched_items = []
+    total_nutrients = [0.0] * len(NUTRIENT_NAMES)
+    matched_names = {}
+    
+    for item in parsed_items:
+        if item['food_name'] not in matched_names:
+            matched_names[item['food_name']] = fuzzy_match_food(item['food_name'], data.foods, use_ai=use_ai,
+                                                                data=data)
+        matched_food_name = matched_names[item['food_name']]
+        
+        if not matched_food_name:
+            # 候補を提案
+            suggestions = get_food_suggestions(item['food_name'], data.foods)
+            suggestion_text = ''
+            if suggestions:
+                suggestion_text = f' もしかして: {", ".join(suggestions[:3])}'
+            return None, None, f'食品「{item["food_name"]}」が見つかりませんでした。{suggestion_text}'
+        
+        with timed('nutrients'):
+            food_vector = data.nutrient_vectors.get(matched_food_name)
+            if food_vector is None:
+                return None, None, f'食品データが見つかりません: {matched_food_name}'
+            
+            # 栄養素を計算（100gあたりの値を重さで換算）
+            weight_factor = item['weight'] / 100.0
+            item_nutrients = [value * weight_factor for value in food_vector]
+            total_nutrients = [total + value for total, value in zip(total_nutrients, item_nutrients)]
+        
+        matched_items.append({
+            'input_name': item['food_name'],
+            'matched_name': matched_food_name,
+            'weight': item['weight'],
+            'nutrients': item_nutrients
+        })
+    
+    return matched_items, total_nutrients, None
 
 @app.route('/api/calculate', methods=['POST'])
 @login_required
@@ -496,238 +1681,489 @@ def calculate_nutrition():
         if not person_name or not meal_date or not meal_time or not food_input:
             return jsonify({'error': '全ての項目を入力してください'}), 400
         
-        # 食品入力をパース（例: 「納豆45g、ご飯160g、生卵60g」）
-        items = [item.strip() for item in food_input.split('、') if item.strip()]
-        
-        parsed_items = []
-        for item in items:
-            # 重さを抽出（数字 + g）
-            match = re.search(r'([^0-9]+)([\d.]+)\s*g', item)
-            if match:
-                food_name = match.group(1).strip()
-                weight = float(match.group(2))
-                parsed_items.append({'food_name': food_name, 'weight': weight})
+        # 食品入力をパース（例: 「納豆45g、ご飯1杯、生卵1個」）
+        with timed('parse'):
+            parsed_items, unparsed = parse_food_input(food_input)
         
         if not parsed_items:
-            return jsonify({'error': '食品の形式が正しくありません（例: 納豆45g、ご飯160g）'}), 400
+            return jsonify({'error': '食品の形式が正しくありません（例: 納豆45g、ご飯1杯、卵2個）',
+                            'unparsed': unparsed}), 400
         
         # 食品名をあいまい検索でマッチング（DeepSeek AI使用）
-        matched_items = []
-        total_nutrients = {key: 0.0 for key in DAILY_TARGETS.keys()}
-        
-        for item in parsed_items:
-            # DeepSeek AIを使用してマッチング
-            matched_food_name = fuzzy_match_food(item['food_name'], FOOD_DATABASE, use_ai=True)
-            
-            if not matched_food_name:
-                # 候補を提案
-                suggestions = get_food_suggestions(item['food_name'], FOOD_DATABASE)
-                suggestion_text = ''
-                if suggestions:
-                    suggestion_text = f' もしかして: {", ".join(suggestions[:3])}'
-                return jsonify({'error': f'食品「{item["food_name"]}」が見つかりませんでした。{suggestion_text}'}), 400
-            
-            # 食品データを取得
-            food_data = None
-            for food in FOOD_DATABASE:
-                if food['食品名'] == matched_food_name:
-                    food_data = food
-                    break
-            
-            if not food_data:
-                return jsonify({'error': f'食品データが見つかりません: {matched_food_name}'}), 400
-            
-            # 栄養素を計算（100gあたりの値を重さで換算）
-            weight_factor = item['weight'] / 100.0
-            item_nutrients = {}
-            
-            for jp_name, target_value in DAILY_TARGETS.items():
-                raw_value = food_data.get(jp_name, 0)
-                numeric_value = parse_numeric_value(raw_value)
-                calculated_value = numeric_value * weight_factor
-                item_nutrients[jp_name] = calculated_value
-                total_nutrients[jp_name] += calculated_value
-            
-            matched_items.append({
-                'input_name': item['food_name'],
-                'matched_name': matched_food_name,
-                'weight': item['weight'],
-                'nutrients': item_nutrients
-            })
+        # ASYNC_MATCHING=1 ではAIを使わずに照合し、照合できない食品があればジョブとして後から記録する
+        defer_ai = ASYNC_MATCHING and bool(CLAUDE_API_KEY)
+        matched_items, total_nutrients, error = calculate_meal_items(parsed_items, use_ai=not defer_ai)
+        if error and defer_ai:
+            person_id = get_person_id(person_name, create=True)
+            job_id = JOB_QUEUE.enqueue('record_meal', {
+                'person_id': person_id,
+                'meal_date': meal_date,
+                'meal_time': meal_time,
+                'food_input': food_input
+            }, user_id=session['user_id'])
+            return jsonify({
+                'success': True,
+                'status': 'pending',
+                'job_id': job_id,
+                'unparsed': unparsed
+            }), 202
+        if error:
+            return jsonify({'error': error, 'unparsed': unparsed}), 400
         
         # データベースに保存
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
-        
-        # 食事を保存
-        c.execute('''INSERT INTO meals (person_name, meal_date, meal_time, raw_input)
-                     VALUES (?, ?, ?, ?)''',
-                  (person_name, meal_date, meal_time, food_input))
-        meal_id = c.lastrowid
-        
-        # 食事項目を保存
-        for item in matched_items:
-            c.execute('''INSERT INTO meal_items (meal_id, food_name, weight, matched_food_name)
-                         VALUES (?, ?, ?, ?)''',
-                      (meal_id, item['input_name'], item['weight'], item['matched_name']))
-        
-        # 栄養素データを保存
-        c.execute('''INSERT INTO meal_nutrients 
-                     (meal_id, energy, protein, fat, fiber, potassium, calcium, magnesium, 
-                      phosphorus, iron, zinc, copper, manganese, iodine, selenium, chromium, 
-                      molybdenum, vitamin_a, vitamin_d, vitamin_e, vitamin_k, vitamin_b1, 
-                      vitamin_b2, niacin, vitamin_b6, vitamin_b12, folate, pantothenic_acid, 
-                      biotin, vitamin_c, salt)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (meal_id,
-                   total_nutrients['エネルギー'],
-                   total_nutrients['たんぱく質'],
-                   total_nutrients['脂質'],
-                   total_nutrients['食物繊維総量'],
-                   total_nutrients['カリウム'],
-                   total_nutrients['カルシウム'],
-                   total_nutrients['マグネシウム'],
-                   total_nutrients['リン'],
-                   total_nutrients['鉄'],
-                   total_nutrients['亜鉛'],
-                   total_nutrients['銅'],
-                   total_nutrients['マンガン'],
-                   total_nutrients['ヨウ素'],
-                   total_nutrients['セレン'],
-                   total_nutrients['クロム'],
-                   total_nutrients['モリブデン'],
-                   total_nutrients['ビタミンA'],
-                   total_nutrients['ビタミンD'],
-                   total_nutrients['ビタミンE'],
-                   total_nutrients['ビタミンK'],
-                   total_nutrients['ビタミンB1'],
-                   total_nutrients['ビタミンB2'],
-                   total_nutrients['ナイアシン'],
-                   total_nutrients['ビタミンB6'],
-                   total_nutrients['ビタミンB12'],
-                   total_nutrients['葉酸'],
-                   total_nutrients['パントテン酸'],
-                   total_nutrients['ビオチン'],
-                   total_nutrients['ビタミンC'],
-                   total_nutrients['食塩相当量']))
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'meal_id': meal_id,
-            'matched_items': matched_items,
-            'total_nutrients': total_nutrients
-        })
-        
+        with timed('db_write'):
+            person_id = get_person_id(person_name, create=True)
+            meal_id = STORAGE.create_meal(person_id, meal_date, meal_time, food_input,
+                                          matched_items, nutrient_dict(total_nutrients))
+        publish_meal_change(person_id, 'added',
+                            {'id': meal_id, 'meal_date': meal_date, 'meal_time': meal_time, 'raw_input': food_input},
+                            added=(meal_date, total_nutrients))
+        
+        return jsonify(meal_payload(meal_id, matched_items, total_nutrients, unparsed, wants_compact()))
+        
+    except AIProviderError as e:
+        app.logger.warning('AI照合の一時的なエラー: %s', e)
+        return jsonify({'error': 'AIによる照合が一時的に利用できません。しばらくしてから再度お試しください'}), 503
     except Exception as e:
         return jsonify({'error': f'エラー: {str(e)}'}), 500
 
+# バックグラウンドジョブ
+@JOB_QUEUE.handler('record_meal')
+def record_meal_job(payload):
+    """AIマッチングを含めて照合し、食事を記録（/api/calculate から後回しにされた食事）"""
+    parsed_items, unparsed = parse_food_input(payload['food_input'])
+    # AI APIの一時的な失敗（AIProviderError）はそのまま送出し、キューに再実行させる
+    matched_items, total_nutrients, error = calculate_meal_items(parsed_items)
+    if error:
+        raise JobError(error)
+    
+    meal_id = STORAGE.create_meal(payload['person_id'], payload['meal_date'], payload['meal_time'],
+                                  payload['food_input'], matched_items, nutrient_dict(total_nutrients))
+    publish_meal_change(payload['person_id'], 'added',
+                        {'id': meal_id, 'meal_date': payload['meal_date'], 'meal_time': payload['meal_time'],
+                         'raw_input': payload['food_input']},
+                        added=(payload['meal_date'], total_nutrients))
+    return {
+        'meal_id': meal_id,
+        'matched_items': matched_items,
+        'total_nutrients': total_nutrients,
+        'unparsed': unparsed
+    }
+
+@app.before_request
+def start_job_workers():
+    """JOB_WORKERS > 0 なら最初のリクエストでワーカースレッドを起動"""
+    if JOB_WORKERS > 0 and not JOB_QUEUE.running:
+        JOB_QUEUE.start(JOB_WORKERS)
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """ジョブの状態を取得（完了したら結果、失敗したらエラーを含む）"""
+    row = STORAGE.get_job(job_id, session['user_id'])
+    if not row:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    kind, status, result, error, attempts = row
+    response = {
+        'success': True,
+        'job_id': job_id,
+        'kind': kind,
+        'status': status,
+        'attempts': attempts
+    }
+    if status == 'done' and kind == 'record_meal':
+        meal = json.loads(result)
+        response.update(meal_payload(meal['meal_id'], meal['matched_items'], meal['total_nutrients'],
+                                     meal['unparsed'], wants_compact()))
+    elif status == 'done':
+        response.update(json.loads(result))
+    elif status == 'failed':
+        response['error'] = error
+    return jsonify(response)
+
+def daily_nutrient_totals(rows):
+    """meal_nutrient_rows の行から、日ごとの栄養素の合計（NUTRIENT_NAMESの順のリスト）と食事数を返す"""
+    daily_totals = {}
+    meal_counts = collections.Counter()
+    for row in rows:
+        meal_date = row[0]
+        totals = daily_totals.get(meal_date)
+        if totals is None:
+            totals = [0.0] * len(NUTRIENT_NAMES)
+        daily_totals[meal_date] = [total + (value or 0) for total, value in zip(totals, row[3:])]
+        meal_counts[meal_date] += 1
+    return daily_totals, meal_counts
+
+def daily_averages(daily_totals):
+    """記録のある日の1日あたりの平均（記録がなければ全て0）"""
+    if not daily_totals:
+        return [0.0] * len(NUTRIENT_NAMES)
+    return [sum(column) / len(daily_totals) for column in zip(*daily_totals.values())]
+
 @app.route('/api/weekly-summary/<person_name>', methods=['GET'])
 @login_required
+@cached_person_response('weekly-summary')
 def get_weekly_summary(person_name):
     """過去1週間の平均摂取量と充足率を計算"""
     try:
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
-        
         # 過去7日間のデータを取得
         seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        person_id = get_person_id(person_name)
         
-        c.execute('''SELECT m.meal_date, m.meal_time, m.raw_input,
-                            n.energy, n.protein, n.fat, n.fiber, n.potassium, n.calcium,
-                            n.magnesium, n.phosphorus, n.iron, n.zinc, n.copper, n.manganese,
-                            n.iodine, n.selenium, n.chromium, n.molybdenum, n.vitamin_a,
-                            n.vitamin_d, n.vitamin_e, n.vitamin_k, n.vitamin_b1, n.vitamin_b2,
-                            n.niacin, n.vitamin_b6, n.vitamin_b12, n.folate, n.pantothenic_acid,
-                            n.biotin, n.vitamin_c, n.salt
-                     FROM meals m
-                     JOIN meal_nutrients n ON m.id = n.meal_id
-                     WHERE m.person_name = ? AND m.meal_date >= ?
-                     ORDER BY m.meal_date DESC, m.meal_time DESC''',
-                  (person_name, seven_days_ago))
-        
-        rows = c.fetchall()
-        conn.close()
+        with timed('summary_query'):
+            rows = STORAGE.meal_nutrient_rows(person_id, seven_days_ago) if person_id else []
         
         if not rows:
             return jsonify({'error': '過去1週間のデータがありません'}), 404
         
-        # 日ごとの合計を計算
-        daily_totals = {}
-        for row in rows:
-            meal_date = row[0]
-            if meal_date not in daily_totals:
-                daily_totals[meal_date] = {
-                    'エネルギー': 0, 'たんぱく質': 0, '脂質': 0, '食物繊維総量': 0,
-                    'カリウム': 0, 'カルシウム': 0, 'マグネシウム': 0, 'リン': 0,
-                    '鉄': 0, '亜鉛': 0, '銅': 0, 'マンガン': 0, 'ヨウ素': 0,
-                    'セレン': 0, 'クロム': 0, 'モリブデン': 0, 'ビタミンA': 0,
-                    'ビタミンD': 0, 'ビタミンE': 0, 'ビタミンK': 0, 'ビタミンB1': 0,
-                    'ビタミンB2': 0, 'ナイアシン': 0, 'ビタミンB6': 0, 'ビタミンB12': 0,
-                    '葉酸': 0, 'パントテン酸': 0, 'ビオチン': 0, 'ビタミンC': 0,
-                    '食塩相当量': 0
-                }
-            
-            nutrients_list = ['エネルギー', 'たんぱく質', '脂質', '食物繊維総量',
-                            'カリウム', 'カルシウム', 'マグネシウム', 'リン', '鉄',
-                            '亜鉛', '銅', 'マンガン', 'ヨウ素', 'セレン', 'クロム',
-                            'モリブデン', 'ビタミンA', 'ビタミンD', 'ビタミンE',
-                            'ビタミンK', 'ビタミンB1', 'ビタミンB2', 'ナイアシン',
-                            'ビタミンB6', 'ビタミンB12', '葉酸', 'パントテン酸',
-                            'ビオチン', 'ビタミンC', '食塩相当量']
-            
-            for i, nutrient in enumerate(nutrients_list):
-                daily_totals[meal_date][nutrient] += row[3 + i] or 0
+        daily_totals, meal_counts = daily_nutrient_totals(rows)
         
-        # 1日あたりの平均を計算
+        # 1日あたりの平均と充足率を計算
         num_days = len(daily_totals)
-        average_daily = {}
-        fulfillment_rates = {}
-        
-        for nutrient in DAILY_TARGETS.keys():
-            total = sum(day[nutrient] for day in daily_totals.values())
-            average = total / num_days if num_days > 0 else 0
-            average_daily[nutrient] = round(average, 2)
-            
-            target = DAILY_TARGETS[nutrient]
-            fulfillment = (average / target * 100) if target > 0 else 0
-            fulfillment_rates[nutrient] = round(fulfillment, 1)
+        averages = daily_averages(daily_totals)
+        average_daily = [round(average, 2) for average in averages]
+        fulfillment_rates = [round(average / target * 100, 1) if target > 0 else 0
+                             for average, target in zip(averages, TARGET_VALUES)]
         
-        return jsonify({
+        # 日ごとの合計・食事数は、ライブ更新の増減を画面側で反映するために返す
+        summary = {
             'success': True,
             'person_name': person_name,
+            'since': seven_days_ago,
+            'meal_counts': meal_counts,
             'period_days': num_days,
             'start_date': min(daily_totals.keys()),
             'end_date': max(daily_totals.keys()),
-            'average_daily': average_daily,
-            'fulfillment_rates': fulfillment_rates,
-            'daily_targets': DAILY_TARGETS
+        }
+        if wants_compact():
+            summary.update({
+                'format': 'compact',
+                'nutrients': NUTRIENT_NAMES,
+                'daily_targets': TARGET_VALUES,
+                'daily_totals': daily_totals,
+                'average_daily': average_daily,
+                'fulfillment_rates': fulfillment_rates
+            })
+        else:
+            summary.update({
+                'daily_targets': DAILY_TARGETS,
+                'daily_totals': {meal_date: nutrient_dict(totals) for meal_date, totals in daily_totals.items()},
+                'average_daily': nutrient_dict(average_daily),
+                'fulfillment_rates': nutrient_dict(fulfillment_rates)
+            })
+        return jsonify(summary)
+        
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+@app.route('/api/contributors/<person_name>', methods=['GET'])
+@login_required
+def get_contributors(person_name):
+    """栄養素ごとに、摂取量の多い食品の上位k件を返す（?nutrient= で1つの栄養素だけ）"""
+    days = max(1, min(request.args.get('days', 7, type=int), 365))
+    k = max(1, min(request.args.get('k', 5, type=int), 50))
+    nutrient = request.args.get('nutrient')
+    if nutrient is not None and nutrient not in NUTRIENT_NAMES:
+        return jsonify({'error': f'栄養素「{nutrient}」はありません'}), 400
+
+    try:
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        person_id = get_person_id(person_name)
+        with timed('summary_query'):
+            rows = STORAGE.food_contributions(person_id, since) if person_id else []
+        if not rows:
+            return jsonify({'error': f'過去{days}日間のデータがありません'}), 404
+
+        contributors = {}
+        for index, name in enumerate(NUTRIENT_NAMES):
+            if nutrient is not None and name != nutrient:
+                continue
+            column = index + 2
+            total = sum(row[column] or 0 for row in rows)
+            top = heapq.nlargest(k, (row for row in rows if (row[column] or 0) > 0), key=lambda row: row[column])
+            contributors[name] = [{
+                'food_name': row[0],
+                'weight': round(row[1], 1),
+                'amount': round(row[column], 2),
+                'share': round(row[column] / total * 100, 1)
+            } for row in top]
+
+        return jsonify({
+            'success': True,
+            'person_name': person_name,
+            'days': days,
+            'food_data_version': FOOD_DATA.version,
+            'contributors': contributors
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+# 栄養素の推移（/api/trends）
+# 日・週・月の集計（nutrient_rollups）から、期間を points 個以下の区間に分けた系列を返す。
+# 読む集計の行数は区間の数と移動平均の窓で決まり、記録の長さには依存しない
+TRENDS_DEFAULT_DAYS = 365
+TRENDS_DEFAULT_POINTS = 120
+TRENDS_MAX_POINTS = 500
+TRENDS_DEFAULT_WINDOW = 7
+TRENDS_MAX_WINDOW = 60
+
+def trend_granularity(start, end, points):
+    """[start, end] を points 個以下の区間に分ける集計の期間と、1区間にまとめる期間の数"""
+    if (end - start).days + 1 <= points:
+        return 'day', 1
+    if (rollup_start('week', end) - rollup_start('week', start)).days // 7 + 1 <= points:
+        return 'week', 1
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    return 'month', -(-months // points)
+
+def trend_buckets(period, size, start, end, lead):
+    """start〜end を含む区間（期間 size 個ずつ）の初日のリスト。移動平均用に前の lead 区間も含める"""
+    first = rollup_start(period, start)
+    for _ in range(lead * size):
+        first = rollup_start(period, first - timedelta(days=1))
+    starts = []
+    while first <= end:
+        starts.append(first)
+        first = next_rollup_start(period, first)
+    return [starts[i:i + size] for i in range(0, len(starts), size)]
+
+def _parse_date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} は YYYY-MM-DD で指定してください')
+
+@app.route('/api/trends/<person_name>', methods=['GET'])
+@login_required
+def get_trends(person_name):
+    """栄養素の1日あたりの平均・移動平均・パーセンタイルの推移
+
+    ?from=&to=（既定は過去1年）、?nutrients=エネルギー,たんぱく質（既定は全て）、
+    ?points= 区間の最大数、?window= 移動平均の区間数。
+    区間の数が points 以下になるように日・週・月（月は複数月をまとめる）の集計を選ぶ。
+    パーセンタイルは日ごとの合計のもので、複数月をまとめた区間では月ごとの値の日数による加重平均（近似）
+    """
+    points = max(1, min(request.args.get('points', TRENDS_DEFAULT_POINTS, type=int), TRENDS_MAX_POINTS))
+    window = max(1, min(request.args.get('window', TRENDS_DEFAULT_WINDOW, type=int), TRENDS_MAX_WINDOW))
+    try:
+        end = _parse_date_arg('to', datetime.now().date())
+        start = _parse_date_arg('from', end - timedelta(days=TRENDS_DEFAULT_DAYS - 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start > end:
+        return jsonify({'error': 'from は to 以前の日付にしてください'}), 400
+    names = request.args.get('nutrients')
+    names = [name.strip() for name in names.split(',') if name.strip()] if names else NUTRIENT_NAMES
+    unknown = [name for name in names if name not in NUTRIENT_NAMES]
+    if unknown:
+        return jsonify({'error': f'栄養素「{"、".join(unknown)}」はありません'}), 400
+    indexes = [NUTRIENT_NAMES.index(name) for name in names]
+
+    try:
+        person_id = get_person_id(person_name)
+        if person_id is None:
+            return jsonify({'error': '期間のデータがありません'}), 404
+        period, size = trend_granularity(start, end, points)
+        buckets = trend_buckets(period, size, start, end, window - 1)
+        with timed('summary_query'):
+            rows = STORAGE.rollups(person_id, period, buckets[0][0].isoformat(),
+                                   next_rollup_start(period, buckets[-1][-1]).isoformat())
+        by_start = {str(row[0]): row for row in rows}
+
+        # 区間ごとに日数・食事数・栄養素の合計・日数で重み付けしたパーセンタイルを集める
+        totals = []
+        for bucket in buckets:
+            bucket_rows = [by_start[day.isoformat()] for day in bucket if day.isoformat() in by_start]
+            days = sum(row[1] for row in bucket_rows)
+            sums = [sum(row[3 + index] or 0 for row in bucket_rows) for index in indexes]
+            percentiles = None
+            if period != 'day' and days:
+                weighted = [(row[1], json.loads(row[-1])) for row in bucket_rows]
+                percentiles = [[sum(weight * values[index][position] for weight, values in weighted) / days
+                                for index in indexes] for position in range(len(ROLLUP_PERCENTILES))]
+            totals.append((days, sum(row[2] for row in bucket_rows), sums, percentiles))
+
+        shown = range(window - 1, len(buckets))
+        if not any(totals[i][0] for i in shown):
+            return jsonify({'error': '期間のデータがありません'}), 404
+
+        series = {name: {'average': [], 'rolling_average': []} for name in names}
+        if period != 'day':
+            for name in names:
+                series[name].update({f'p{q}': [] for q in ROLLUP_PERCENTILES})
+        for i in shown:
+            days, _meal_count, sums, percentiles = totals[i]
+            window_totals = totals[i - window + 1:i + 1]
+            window_days = sum(total[0] for total in window_totals)
+            for column, name in enumerate(names):
+                series[name]['average'].append(round(sums[column] / days, 2) if days else None)
+                series[name]['rolling_average'].append(
+                    round(sum(total[2][column] for total in window_totals) / window_days, 2) if window_days else None)
+                if period != 'day':
+                    for position, q in enumerate(ROLLUP_PERCENTILES):
+                        series[name][f'p{q}'].append(round(percentiles[position][column], 2) if percentiles else None)
+
+        return jsonify({
+            'success': True,
+            'person_name': person_name,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'period': period,
+            'bucket_size': size,
+            'window': window,
+            'buckets': [{
+                'start': buckets[i][0].isoformat(),
+                'end': (next_rollup_start(period, buckets[i][-1]) - timedelta(days=1)).isoformat(),
+                'days': totals[i][0],
+                'meal_count': totals[i][1]
+            } for i in shown],
+            'series': series
         })
+
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+@app.route('/api/recommend/<person_name>', methods=['GET'])
+@login_required
+def recommend_foods(person_name):
+    """過去1週間の平均で不足している栄養素を補う食品を提案"""
+    recommender = FOOD_DATA.recommender
+    if recommender is None:
+        return jsonify({'error': '食品の提案にはnumpyが必要です'}), 503
+    k = max(1, min(request.args.get('k', 10, type=int), 50))
+    
+    try:
+        seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        person_id = get_person_id(person_name)
+        with timed('summary_query'):
+            rows = STORAGE.meal_nutrient_rows(person_id, seven_days_ago) if person_id else []
+        daily_totals, _meal_counts = daily_nutrient_totals(rows)
+        averages = daily_averages(daily_totals)
+        
+        with timed('recommend'):
+            deficits = recommender.deficits(averages)
+            foods = recommender.recommend(averages, k)
+        
+        recommendations = []
+        for food_name, weight, score, nutrients in foods:
+            # 不足分のうち、この食品で埋まる割合（%）
+            closes = {name: round(min(value, deficit) / deficit * 100, 1)
+                      for name, value, deficit in zip(NUTRIENT_NAMES, nutrients, deficits)
+                      if deficit > 0 and value > 0 and name not in RECOMMENDER_LIMITED}
+            recommendations.append({
+                'food_name': food_name,
+                'weight': round(weight, 1),
+                'score': round(score, 4),
+                'nutrients': nutrient_dict(round(float(value), 2) for value in nutrients),
+                'closes': dict(sorted(closes.items(), key=lambda item: -item[1])[:5])
+            })
         
+        return jsonify({
+            'success': True,
+            'person_name': person_name,
+            'period_days': len(daily_totals),
+            'deficits': nutrient_dict(round(float(value), 2) for value in deficits),
+            'recommendations': recommendations
+        })
+    
     except Exception as e:
         return jsonify({'error': f'エラー: {str(e)}'}), 500
 
+@app.route('/api/meal-plan/<person_name>', methods=['GET'])
+@login_required
+def get_meal_plan(person_name):
+    """全栄養素を目標の範囲に収める1日の献立を求める
+    
+    ?logged=1 でこの人物が記録したことのある食品だけを使い、?step=10 で量を10g単位にする。
+    """
+    planner = FOOD_DATA.planner
+    if planner is None:
+        return jsonify({'error': '献立の作成にはscipyが必要です'}), 503
+    logged_only = request.args.get('logged') == '1'
+    step = request.args.get('step', type=int)
+    if step is not None and not 1 <= step <= 100:
+        return jsonify({'error': 'stepは1〜100(g)で指定してください'}), 400
+    
+    try:
+        food_names = None
+        if logged_only:
+            person_id = get_person_id(person_name)
+            food_names = STORAGE.logged_food_names(person_id) if person_id else []
+            if not food_names:
+                return jsonify({'error': '記録された食品がありません'}), 404
+        
+        with timed('meal_plan'):
+            (foods, totals, deviation), cached = planner.plan(food_names, step)
+        
+        total_nutrients = [round(float(value), 2) for value in totals]
+        fulfillment_rates = [round(float(value) / target * 100, 1) for value, target in zip(totals, TARGET_VALUES)]
+        plan = {
+            'success': True,
+            'person_name': person_name,
+            'logged_only': logged_only,
+            'step': step,
+            'foods': [{'food_name': food_name, 'weight': weight} for food_name, weight in foods],
+            'deviation': round(deviation, 4),
+            'cached': cached
+        }
+        if wants_compact():
+            plan.update({
+                'format': 'compact',
+                'nutrients': NUTRIENT_NAMES,
+                'total_nutrients': total_nutrients,
+                'fulfillment_rates': fulfillment_rates
+            })
+        else:
+            plan.update({
+                'total_nutrients': nutrient_dict(total_nutrients),
+                'fulfillment_rates': nutrient_dict(fulfillment_rates)
+            })
+        return jsonify(plan)
+    
+    except PlanError as e:
+        return jsonify({'error': str(e)}), 422
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+@app.route('/api/stream/<person_name>', methods=['GET'])
+@login_required
+def stream_person(person_name):
+    """人物の食事の追加・更新・削除をServer-Sent Eventsで送る
+    
+    event: meal    {"action": "added"|"updated"|"deleted", "meal": {...}, "days": {日付: {"meals": 増減, "nutrients": {...}}}}
+    event: refresh 他のプロセスで変更があった（サマリーを取得し直す）
+    """
+    with _stream_lock:
+        open_streams = sum(len(subscribers) for subscribers in _stream_subscribers.values())
+    if open_streams >= STREAM_MAX_CLIENTS:
+        return jsonify({'error': 'ライブ更新の接続数が上限に達しています'}), 503
+    
+    # 購読だけで人物を作らない（食事を記録すると作られる）
+    person_id = get_person_id(person_name)
+    if not person_id:
+        return jsonify({'error': '人物が見つかりません'}), 404
+    response = Response(stream_person_events(person_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/meal-history/<person_name>', methods=['GET'])
 @login_required
+@cached_person_response('meal-history')
 def get_meal_history(person_name):
     """食事履歴を取得"""
     try:
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
-        
         # 過去30日間のデータを取得
         thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        person_id = get_person_id(person_name)
         
-        c.execute('''SELECT m.id, m.meal_date, m.meal_time, m.raw_input, m.created_at
-                     FROM meals m
-                     WHERE m.person_name = ? AND m.meal_date >= ?
-                     ORDER BY m.meal_date DESC, m.meal_time DESC''',
-                  (person_name, thirty_days_ago))
-        
-        rows = c.fetchall()
-        conn.close()
+        with timed('summary_query'):
+            rows = STORAGE.meal_history(person_id, thirty_days_ago) if person_id else []
         
         meals = []
         for row in rows:
@@ -741,6 +2177,7 @@ def get_meal_history(person_name):
         
         return jsonify({
             'success': True,
+            'since': thirty_days_ago,
             'meals': meals
         })
         
@@ -752,16 +2189,17 @@ def get_meal_history(person_name):
 def delete_meal(meal_id):
     """食事を削除"""
     try:
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
+        owner = STORAGE.get_owned_meal(session['user_id'], meal_id)
+        if not owner:
+            return jsonify({'error': '食事が見つかりません'}), 404
         
-        # 関連データを削除
-        c.execute('DELETE FROM meal_nutrients WHERE meal_id = ?', (meal_id,))
-        c.execute('DELETE FROM meal_items WHERE meal_id = ?', (meal_id,))
-        c.execute('DELETE FROM meals WHERE id = ?', (meal_id,))
+        # ライブ更新を購読中なら、日ごとの増減を送るため削除前の栄養素を読む
+        previous = STORAGE.load_meal_items(meal_id)[1] if has_stream_subscribers(owner[0]) else None
         
-        conn.commit()
-        conn.close()
+        # 関連データを削除
+        STORAGE.delete_meal(meal_id, owner[0])
+        if previous:
+            publish_meal_change(owner[0], 'deleted', {'id': meal_id}, removed=(owner[2], previous))
         
         return jsonify({
             'success': True,
@@ -776,29 +2214,19 @@ def delete_meal(meal_id):
 def get_meal(meal_id):
     """食事の詳細を取得"""
     try:
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
-        
-        c.execute('''SELECT m.id, m.person_name, m.meal_date, m.meal_time, m.raw_input
-                     FROM meals m
-                     WHERE m.id = ?''', (meal_id,))
-        
-        row = c.fetchone()
+        row = STORAGE.get_owned_meal(session['user_id'], meal_id)
         
         if not row:
-            conn.close()
             return jsonify({'error': '食事が見つかりません'}), 404
         
         meal = {
-            'id': row[0],
+            'id': meal_id,
             'person_name': row[1],
             'meal_date': row[2],
             'meal_time': row[3],
             'raw_input': row[4]
         }
         
-        conn.close()
-        
         return jsonify({
             'success': True,
             'meal': meal
@@ -821,142 +2249,364 @@ def update_meal(meal_id):
         if not person_name or not meal_date or not meal_time or not food_input:
             return jsonify({'error': '全ての項目を入力してください'}), 400
         
-        # 既存の食事を削除
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
+        # 先に再計算し、成功した場合のみ既存の食事を置き換える
+        with timed('parse'):
+            parsed_items, unparsed = parse_food_input(food_input)
         
-        c.execute('DELETE FROM meal_nutrients WHERE meal_id = ?', (meal_id,))
-        c.execute('DELETE FROM meal_items WHERE meal_id = ?', (meal_id,))
-        c.execute('DELETE FROM meals WHERE id = ?', (meal_id,))
+        if not parsed_items:
+            return jsonify({'error': '食品の形式が正しくありません（例: 納豆45g、ご飯1杯、卵2個）',
+                            'unparsed': unparsed}), 400
+        
+        matched_items, total_nutrients, error = calculate_meal_items(parsed_items)
+        if error:
+            return jsonify({'error': error, 'unparsed': unparsed}), 400
+        
+        # データベースに保存（同じIDで置き換え）
+        with timed('db_write'):
+            owner = STORAGE.get_owned_meal(session['user_id'], meal_id)
+            if not owner:
+                return jsonify({'error': '食事が見つかりません'}), 404
+            
+            person_id = get_person_id(person_name, create=True)
+            previous = STORAGE.load_meal_items(meal_id)[1] if has_stream_subscribers(owner[0]) else None
+            STORAGE.replace_meal(meal_id, owner[0], person_id, meal_date, meal_time, food_input,
+                                 matched_items, nutrient_dict(total_nutrients))
+        meal = {'id': meal_id, 'meal_date': meal_date, 'meal_time': meal_time, 'raw_input': food_input}
+        if owner[0] == person_id:
+            publish_meal_change(person_id, 'updated', meal,
+                                removed=previous and (owner[2], previous), added=(meal_date, total_nutrients))
+        else:
+            if previous:
+                publish_meal_change(owner[0], 'deleted', {'id': meal_id}, removed=(owner[2], previous))
+            publish_meal_change(person_id, 'added', meal, added=(meal_date, total_nutrients))
+        
+        return jsonify(meal_payload(meal_id, matched_items, total_nutrients, unparsed, wants_compact()))
+        
+    except AIProviderError as e:
+        app.logger.warning('AI照合の一時的なエラー: %s', e)
+        return jsonify({'error': 'AIによる照合が一時的に利用できません。しばらくしてから再度お試しください'}), 503
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+# 食事テンプレートと最近の食事
+# 照合済みの食品・重量・栄養素の合計を再利用し、パース・マッチング・栄養計算なしで記録する
+RECENT_MEALS_LIMIT = 10
+
+@app.route('/api/meal-shortcuts/<person_name>', methods=['GET'])
+@login_required
+@cached_person_response('meal-shortcuts')
+def get_meal_shortcuts(person_name):
+    """人物の食事テンプレートと最近の食事（同じ入力は1件にまとめる）を取得"""
+    try:
+        person_id = get_person_id(person_name)
+        templates = [{
+            'id': row[0],
+            'name': row[1],
+            'raw_input': row[2],
+            'energy': round(json.loads(row[3]).get('エネルギー', 0), 1)
+        } for row in (STORAGE.list_templates(person_id) if person_id else [])]
+        
+        with timed('summary_query'):
+            recent = [{
+                'meal_id': row[0],
+                'raw_input': row[1],
+                'count': row[2],
+                'last_date': row[3]
+            } for row in (STORAGE.recent_meals(person_id, RECENT_MEALS_LIMIT) if person_id else [])]
         
-        conn.commit()
-        conn.close()
+        return jsonify({
+            'success': True,
+            'templates': templates,
+            'recent': recent
+        })
         
-        # 新しい食事として再計算・保存
-        # 食品入力をパース
-        items = [item.strip() for item in food_input.split('、') if item.strip()]
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+@app.route('/api/templates', methods=['POST'])
+@login_required
+def create_template():
+    """保存済みの食事（meal_id）からテンプレートを作成"""
+    try:
+        data = request.json
+        person_name = data.get('person_name', '').strip()
+        name = data.get('name', '').strip()
+        meal_id = data.get('meal_id')
         
-        parsed_items = []
-        for item in items:
-            match = re.search(r'([^0-9]+)([\d.]+)\s*g', item)
-            if match:
-                food_name = match.group(1).strip()
-                weight = float(match.group(2))
-                parsed_items.append({'food_name': food_name, 'weight': weight})
+        if not person_name or not name or not meal_id:
+            return jsonify({'error': '人物名・テンプレート名・食事IDを指定してください'}), 400
         
-        if not parsed_items:
-            return jsonify({'error': '食品の形式が正しくありません（例: 納豆45g、ご飯160g）'}), 400
+        owner = STORAGE.get_owned_meal(session['user_id'], meal_id)
+        matched_items, total_nutrients = STORAGE.load_meal_items(meal_id) if owner else (None, None)
+        if matched_items is None:
+            return jsonify({'error': '食事が見つかりません'}), 404
         
-        # 食品名をマッチング
-        matched_items = []
-        total_nutrients = {key: 0.0 for key in DAILY_TARGETS.keys()}
+        person_id = get_person_id(person_name, create=True)
+        template_id = STORAGE.create_template(person_id, name, owner[4],
+                                              json.dumps(matched_items, ensure_ascii=False),
+                                              json.dumps(total_nutrients, ensure_ascii=False))
         
-        for item in parsed_items:
-            matched_food_name = fuzzy_match_food(item['food_name'], FOOD_DATABASE, use_ai=True)
-            
-            if not matched_food_name:
-                suggestions = get_food_suggestions(item['food_name'], FOOD_DATABASE)
-                suggestion_text = ''
-                if suggestions:
-                    suggestion_text = f' もしかして: {", ".join(suggestions[:3])}'
-                return jsonify({'error': f'食品「{item["food_name"]}」が見つかりませんでした。{suggestion_text}'}), 400
-            
-            # 食品データを取得
-            food_data = None
-            for food in FOOD_DATABASE:
-                if food['食品名'] == matched_food_name:
-                    food_data = food
-                    break
-            
-            if not food_data:
-                return jsonify({'error': f'食品データが見つかりません: {matched_food_name}'}), 400
-            
-            # 栄養素を計算
-            weight_factor = item['weight'] / 100.0
-            item_nutrients = {}
-            
-            for jp_name, target_value in DAILY_TARGETS.items():
-                raw_value = food_data.get(jp_name, 0)
-                numeric_value = parse_numeric_value(raw_value)
-                calculated_value = numeric_value * weight_factor
-                item_nutrients[jp_name] = calculated_value
-                total_nutrients[jp_name] += calculated_value
-            
-            matched_items.append({
-                'input_name': item['food_name'],
-                'matched_name': matched_food_name,
-                'weight': item['weight'],
-                'nutrients': item_nutrients
-            })
+        return jsonify({
+            'success': True,
+            'template_id': template_id
+        })
         
-        # データベースに保存
-        conn = sqlite3.connect('nutrition.db')
-        c = conn.cursor()
-        
-        # 食事を保存（同じIDで）
-        c.execute('''INSERT INTO meals (id, person_name, meal_date, meal_time, raw_input)
-                     VALUES (?, ?, ?, ?, ?)''',
-                  (meal_id, person_name, meal_date, meal_time, food_input))
-        
-        # 食事項目を保存
-        for item in matched_items:
-            c.execute('''INSERT INTO meal_items (meal_id, food_name, weight, matched_food_name)
-                         VALUES (?, ?, ?, ?)''',
-                      (meal_id, item['input_name'], item['weight'], item['matched_name']))
-        
-        # 栄養素データを保存
-        c.execute('''INSERT INTO meal_nutrients 
-                     (meal_id, energy, protein, fat, fiber, potassium, calcium, magnesium, 
-                      phosphorus, iron, zinc, copper, manganese, iodine, selenium, chromium, 
-                      molybdenum, vitamin_a, vitamin_d, vitamin_e, vitamin_k, vitamin_b1, 
-                      vitamin_b2, niacin, vitamin_b6, vitamin_b12, folate, pantothenic_acid, 
-                      biotin, vitamin_c, salt)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (meal_id,
-                   total_nutrients['エネルギー'],
-                   total_nutrients['たんぱく質'],
-                   total_nutrients['脂質'],
-                   total_nutrients['食物繊維総量'],
-                   total_nutrients['カリウム'],
-                   total_nutrients['カルシウム'],
-                   total_nutrients['マグネシウム'],
-                   total_nutrients['リン'],
-                   total_nutrients['鉄'],
-                   total_nutrients['亜鉛'],
-                   total_nutrients['銅'],
-                   total_nutrients['マンガン'],
-                   total_nutrients['ヨウ素'],
-                   total_nutrients['セレン'],
-                   total_nutrients['クロム'],
-                   total_nutrients['モリブデン'],
-                   total_nutrients['ビタミンA'],
-                   total_nutrients['ビタミンD'],
-                   total_nutrients['ビタミンE'],
-                   total_nutrients['ビタミンK'],
-                   total_nutrients['ビタミンB1'],
-                   total_nutrients['ビタミンB2'],
-                   total_nutrients['ナイアシン'],
-                   total_nutrients['ビタミンB6'],
-                   total_nutrients['ビタミンB12'],
-                   total_nutrients['葉酸'],
-                   total_nutrients['パントテン酸'],
-                   total_nutrients['ビオチン'],
-                   total_nutrients['ビタミンC'],
-                   total_nutrients['食塩相当量']))
-        
-        conn.commit()
-        conn.close()
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+@app.route('/api/templates/<int:template_id>', methods=['DELETE'])
+@login_required
+def delete_template(template_id):
+    """テンプレートを削除"""
+    try:
+        template = STORAGE.get_owned_template(session['user_id'], template_id)
+        if not template:
+            return jsonify({'error': 'テンプレートが見つかりません'}), 404
+        STORAGE.delete_template(template_id, template[0])
         
         return jsonify({
             'success': True,
-            'meal_id': meal_id,
-            'matched_items': matched_items,
-            'total_nutrients': total_nutrients
+            'message': 'テンプレートを削除しました'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'エラー: {str(e)}'}), 500
+
+@app.route('/api/quick-log', methods=['POST'])
+@login_required
+def quick_log_meal():
+    """テンプレート（template_id）または最近の食事（meal_id）をそのまま記録"""
+    try:
+        data = request.json
+        person_name = data.get('person_name', '').strip()
+        meal_date = data.get('meal_date', '')
+        meal_time = data.get('meal_time', '')
+        template_id = data.get('template_id')
+        source_meal_id = data.get('meal_id')
+        
+        if not person_name or not meal_date or not meal_time or not (template_id or source_meal_id):
+            return jsonify({'error': '全ての項目を入力してください'}), 400
+        
+        with timed('db_write'):
+            meal_id = None
+            if template_id:
+                template = STORAGE.get_owned_template(session['user_id'], template_id)
+                if template:
+                    person_id = get_person_id(person_name, create=True)
+                    raw_input, nutrients = template[1], json.loads(template[3])
+                    meal_id = STORAGE.create_meal(person_id, meal_date, meal_time, raw_input,
+                                                  json.loads(template[2]), nutrients)
+            else:
+                source = STORAGE.get_owned_meal(session['user_id'], source_meal_id)
+                if source:
+                    person_id = get_person_id(person_name, create=True)
+                    raw_input, nutrients = source[4], None
+                    meal_id = STORAGE.copy_meal(source_meal_id, person_id, meal_date, meal_time)
+            
+            if meal_id is None:
+                return jsonify({'error': 'テンプレートまたは食事が見つかりません'}), 404
+        if has_stream_subscribers(person_id):
+            if nutrients is None:
+                nutrients = STORAGE.load_meal_items(meal_id)[1]
+            publish_meal_change(person_id, 'added',
+                                {'id': meal_id, 'meal_date': meal_date, 'meal_time': meal_time, 'raw_input': raw_input},
+                                added=(meal_date, nutrients))
+        
+        return jsonify({
+            'success': True,
+            'meal_id': meal_id
         })
         
     except Exception as e:
         return jsonify({'error': f'エラー: {str(e)}'}), 500
 
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@admin_required
+def profiling_toggle():
+    """全リクエストのプロファイリングを有効/無効にする"""
+    global _profiling_enabled
+    if request.method == 'POST':
+        data = request.json or {}
+        _profiling_enabled = bool(data.get('enabled', False))
+    return jsonify({'success': True, 'enabled': _profiling_enabled})
+
+@app.route('/api/admin/food-data', methods=['GET'])
+@admin_required
+def food_data_status():
+    """使用中の食品データの版と再読み込みの状態"""
+    data = FOOD_DATA
+    last_checked = _food_data_status['last_checked']
+    return jsonify({
+        'success': True,
+        'version': data.version,
+        'loaded_at': datetime.fromtimestamp(data.loaded_at).isoformat(timespec='seconds'),
+        'foods': len(data.foods),
+        'aliases': len(data.aliases),
+        'recipes': len(data.recipe_weights),
+        'recipe_errors': data.recipe_errors,
+        'watch_interval': FOOD_DATA_WATCH_INTERVAL,
+        'reloading': _food_data_status['reloading'],
+        'last_checked': datetime.fromtimestamp(last_checked).isoformat(timespec='seconds') if last_checked else None,
+        'last_error': _food_data_status['last_error']
+    })
+
+@app.route('/api/admin/food-data/reload', methods=['POST'])
+@admin_required
+def food_data_reload():
+    """食品データ・別名辞書を読み直す（内容が変わっていなければ何もしない）
+    
+    既定ではバックグラウンドで索引を作り直して202を返す。wait=1 なら差し替えまで待つ。
+    """
+    if request.args.get('wait') == '1':
+        reloaded = reload_food_data()
+        if _food_data_status['last_error']:
+            return jsonify({'error': _food_data_status['last_error'], 'version': FOOD_DATA.version}), 500
+        return jsonify({'success': True, 'reloaded': reloaded, 'version': FOOD_DATA.version})
+    start_food_data_reload()
+    return jsonify({'success': True, 'status': 'reloading', 'version': FOOD_DATA.version}), 202
+
+# バックアップ・アーカイブ・圧縮（maintenance.py）
+# MAINTENANCE_INTERVAL 時間ごとにアプリ内で実行する（0なら POST /api/admin/maintenance か maintenance.py で実行）。
+# アーカイブは ARCHIVE_RETENTION_DAYS（またはリクエストの retention_days）を指定したときだけ行う
+BACKUP_DIR = os.environ.get('BACKUP_DIR', maintenance.BACKUP_DIR)
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', str(maintenance.BACKUP_KEEP)))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', maintenance.ARCHIVE_DIR)
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '0'))
+MAINTENANCE_INTERVAL = float(os.environ.get('MAINTENANCE_INTERVAL', '0'))
+# 1回の圧縮で返す空きページ数の上限（書き込みを長く止めない）
+COMPACT_PAGES = int(os.environ.get('COMPACT_PAGES', '2000'))
+
+_maintenance_lock = threading.Lock()
+_maintenance_status = {'running': False, 'last_run': None, 'last_report': None, 'last_error': None}
+_maintenance_scheduler = None
+_maintenance_scheduler_lock = threading.Lock()
+
+def run_maintenance(tasks=maintenance.TASKS, retention_days=None):
+    """バックアップ・アーカイブ・圧縮を実行する（他のスレッドが実行中なら何もせずFalse）
+
+    結果とエラーは _maintenance_status に残す
+    """
+    if not _maintenance_lock.acquire(blocking=False):
+        return False
+    try:
+        _maintenance_status.update(running=True, last_run=time.time(), last_error=None)
+        with timed('maintenance'):
+            report = maintenance.run_maintenance(STORAGE, tasks, BACKUP_DIR, BACKUP_KEEP, ARCHIVE_DIR,
+                                                 retention_days or ARCHIVE_RETENTION_DAYS, COMPACT_PAGES)
+        if 'archive' in report:
+            report['archive'].pop('person_ids')
+        _maintenance_status['last_report'] = report
+        app.logger.info('メンテナンスを実行しました: %s', ', '.join(report))
+        return True
+    except Exception as e:
+        _maintenance_status['last_error'] = f'{type(e).__name__}: {e}'
+        app.logger.warning('メンテナンスに失敗しました: %s', e)
+        return True
+    finally:
+        _maintenance_status['running'] = False
+        _maintenance_lock.release()
+
+def _schedule_maintenance(interval):
+    while True:
+        time.sleep(interval * 3600)
+        run_maintenance()
+
+@app.before_request
+def start_maintenance_scheduler():
+    """MAINTENANCE_INTERVAL > 0 なら最初のリクエストで定期実行のスレッドを起動"""
+    global _maintenance_scheduler
+    if MAINTENANCE_INTERVAL > 0 and _maintenance_scheduler is None:
+        with _maintenance_scheduler_lock:
+            if _maintenance_scheduler is None:
+                _maintenance_scheduler = threading.Thread(target=_schedule_maintenance, args=(MAINTENANCE_INTERVAL,),
+                                                          name='maintenance', daemon=True)
+                _maintenance_scheduler.start()
+
+@app.route('/api/admin/maintenance', methods=['GET'])
+@admin_required
+def maintenance_status():
+    """バックアップの一覧と、最後のメンテナンスの結果"""
+    last_run = _maintenance_status['last_run']
+    return jsonify({
+        'success': True,
+        'backend': STORAGE.backend.name,
+        'backups': [{'name': name, 'size': size} for name, size in maintenance.list_backups(BACKUP_DIR)],
+        'interval': MAINTENANCE_INTERVAL,
+        'retention_days': ARCHIVE_RETENTION_DAYS,
+        'running': _maintenance_status['running'],
+        'last_run': datetime.fromtimestamp(last_run).isoformat(timespec='seconds') if last_run else None,
+        'last_report': _maintenance_status['last_report'],
+        'last_error': _maintenance_status['last_error']
+    })
+
+@app.route('/api/admin/maintenance', methods=['POST'])
+@admin_required
+def maintenance_run():
+    """バックアップ・アーカイブ・圧縮を実行する
+
+    {"tasks": ["backup", "archive", "compact"], "retention_days": 730}（省略時は全て・ARCHIVE_RETENTION_DAYS）。
+    既定ではバックグラウンドで実行して202を返す。wait=1 なら終わるまで待って結果を返す。
+    """
+    data = request.json or {}
+    tasks = data.get('tasks') or list(maintenance.TASKS)
+    unknown = [task for task in tasks if task not in maintenance.TASKS]
+    if unknown:
+        return jsonify({'error': f'不明な処理です: {", ".join(map(str, unknown))}'}), 400
+    retention_days = data.get('retention_days')
+    if retention_days is not None and (not isinstance(retention_days, int)
+                                       or retention_days < maintenance.MIN_RETENTION_DAYS):
+        return jsonify({'error': f'retention_days は{maintenance.MIN_RETENTION_DAYS}以上の整数にしてください'}), 400
+    if _maintenance_status['running']:
+        return jsonify({'error': 'メンテナンスを実行中です'}), 409
+
+    if request.args.get('wait') == '1':
+        if not run_maintenance(tasks, retention_days):
+            return jsonify({'error': 'メンテナンスを実行中です'}), 409
+        if _maintenance_status['last_error']:
+            return jsonify({'error': _maintenance_status['last_error']}), 500
+        return jsonify({'success': True, 'report': _maintenance_status['last_report']})
+    threading.Thread(target=run_maintenance, args=(tasks, retention_days), name='maintenance-run', daemon=True).start()
+    return jsonify({'success': True, 'status': 'running'}), 202
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """保存されているプロファイルの一覧"""
+    profiles = [{key: value for key, value in profile.items() if key != 'data'}
+                for profile in reversed(_profiles)]
+    return jsonify({'success': True, 'profiles': profiles})
+
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """プロファイルを取得
+    
+    format=text（既定）: pstatsの集計結果（sort, limitで指定）
+    format=pstats: snakeviz / flameprof 等で読み込めるpstats形式のバイナリ
+    """
+    profile = next((p for p in _profiles if p['id'] == profile_id), None)
+    if profile is None:
+        return jsonify({'error': 'プロファイルが見つかりません'}), 404
+    
+    if request.args.get('format') == 'pstats':
+        response = make_response(profile['data'])
+        response.mimetype = 'application/octet-stream'
+        response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.prof'
+        return response
+    
+    sort = request.args.get('sort', 'cumulative')
+    limit = request.args.get('limit', 40, type=int)
+    
+    output = io.StringIO()
+    stats = pstats.Stats(stream=output)
+    stats.stats = marshal.loads(profile['data'])
+    stats.get_top_level_stats()
+    try:
+        stats.sort_stats(sort).print_stats(limit)
+    except KeyError:
+        return jsonify({'error': f'不正なsortです: {sort}'}), 400
+    return output.getvalue(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,150 @@
+"""
+静的ファイルの配信と圧縮
+
+static/ のCSS・JSを内容のハッシュ付きの名前（app.3f2a1b9c0d.js）で配信し、
+名前が内容ごとに変わるため1年間の immutable キャッシュを付けられるようにします。
+
+- AssetManifest: 起動時に static/ を走査し、論理名 → ハッシュ付きの名前の対応を作る
+- build_assets.py で static/dist/ に作った圧縮済みファイル（.br / .gz）があればそれを返し、
+  なければ初回に圧縮してメモリに保持する
+- compress_body: HTML・JSONのレスポンスを Accept-Encoding に応じて brotli / gzip で圧縮
+
+brotliモジュールが無い環境ではgzipのみを使います。
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+# brotliはオプショナル（無ければgzipのみ）
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# これより小さいレスポンスは圧縮しない（ヘッダーの方が大きくなる）
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript',
+                      'text/javascript', 'image/svg+xml')
+EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+def negotiate_encoding(accept_encodings):
+    """Accept-Encoding（werkzeugのMIMEAccept）から使う圧縮方式を選ぶ（なければNone）"""
+    if BROTLI_AVAILABLE and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress(data, encoding, best=False):
+    """bestはビルド時の最大圧縮（リクエスト中は速度を優先した圧縮率を使う）"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+def compress_body(response, accept_encodings):
+    """圧縮できるレスポンスの本文をその場で圧縮する（ETagは弱いETagに変える）"""
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    encoding = negotiate_encoding(accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def asset_digest(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+def hashed_name(name, digest):
+    """app.js → app.<digest>.js"""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest}{ext}'
+
+class AssetManifest:
+    """static/ のファイルとハッシュ付きの名前の対応"""
+
+    def __init__(self, static_dir, dist_dir=None):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir or os.path.join(static_dir, 'dist')
+        self.assets = {}
+        self._lock = threading.Lock()
+        self._compressed = {}
+        self.reload()
+
+    def reload(self):
+        assets = {}
+        if os.path.isdir(self.static_dir):
+            for name in sorted(os.listdir(self.static_dir)):
+                path = os.path.join(self.static_dir, name)
+                if not os.path.isfile(path):
+                    continue
+                with open(path, 'rb') as f:
+                    data = f.read()
+                assets[hashed_name(name, asset_digest(data))] = (name, data)
+        self.urls = {name: hashed for hashed, (name, _data) in assets.items()}
+        with self._lock:
+            self.assets = assets
+            self._compressed = {}
+
+    def url_name(self, name):
+        """論理名（app.js）からハッシュ付きの名前を返す"""
+        return self.urls[name]
+
+    def get(self, hashed, encoding=None):
+        """(本文, MIMEタイプ, 使った圧縮方式) を返す。古いハッシュや存在しない名前ならNone"""
+        asset = self.assets.get(hashed)
+        if asset is None:
+            return None
+        name, data = asset
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if encoding is None or mimetype not in COMPRESSIBLE_TYPES:
+            return data, mimetype, None
+        return self._get_compressed(hashed, data, encoding), mimetype, encoding
+
+    def _get_compressed(self, hashed, data, encoding):
+        key = (hashed, encoding)
+        compressed = self._compressed.get(key)
+        if compressed is None:
+            # build_assets.py の圧縮済みファイルがあればそれを使う（名前にハッシュを含むので古いものは使われない）
+            path = os.path.join(self.dist_dir, hashed + EXTENSIONS[encoding])
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    compressed = f.read()
+            else:
+                compressed = compress(data, encoding)
+            with self._lock:
+                self._compressed[key] = compressed
+        return compressed
+
+    def build(self):
+        """static/dist/ に最大圧縮のファイルを書き出し、古いものを削除する。書き出したファイル名の一覧を返す"""
+        os.makedirs(self.dist_dir, exist_ok=True)
+        encodings = ['gzip'] + (['br'] if BROTLI_AVAILABLE else [])
+        written = set()
+        for hashed, (name, data) in self.assets.items():
+            if mimetypes.guess_type(name)[0] not in COMPRESSIBLE_TYPES:
+                continue
+            for encoding in encodings:
+                filename = hashed + EXTENSIONS[encoding]
+                with open(os.path.join(self.dist_dir, filename), 'wb') as f:
+                    f.write(compress(data, encoding, best=True))
+                written.add(filename)
+        for filename in os.listdir(self.dist_dir):
+            if filename not in written:
+                os.remove(os.path.join(self.dist_dir, filename))
+        with self._lock:
+            self._compressed = {}
+        return sorted(written)
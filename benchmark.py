@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+パフォーマンスベンチマーク
+
+食品データベースのロード、あいまい検索（ヒット/ミス）、ベクトル検索、候補提案、食品の提案、献立の最適化、
+/api/calculate、週間サマリー集計（1万/10万/100万食のDB）、レスポンスの
+通常形式とcompact形式（サイズと生成時間）を計測し、
+結果をJSONに保存します。ベースラインを指定すると比較して、
+閾値を超えて遅くなった項目があれば終了コード1で終了します。
+
+使い方:
+    python benchmark.py                                   # 計測して bench_results.json に保存
+    python benchmark.py --sizes 10000,100000              # 週間サマリーのDBサイズを指定
+    python benchmark.py --baseline bench_baseline.json    # ベースラインと比較
+    python benchmark.py --output bench_baseline.json      # ベースラインを更新
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'nutrition_bench')
+os.makedirs(BENCH_DIR, exist_ok=True)
+
+# アプリのDB・ログ・計測をベンチマーク用に切り替えてからインポート
+os.environ['NUTRITION_DB'] = os.path.join(BENCH_DIR, 'app.db')
+os.environ.pop('DATABASE_URL', None)
+os.environ['MATCH_LOG_PATH'] = ''
+os.environ['METRICS_ENABLED'] = '0'
+
+import app as nutrition_app  # noqa: E402
+from storage import MealRepository, SQLiteBackend  # noqa: E402
+
+HIT_CORPUS = [
+    '鶏卵　全卵　生',
+    'だいず　［納豆類］　糸引き納豆',
+    '納豆', 'ご飯', '白米', '生卵', '卵', 'ゆで卵',
+    '豆腐', '味噌', '醤油', '鶏もも肉', 'ブロッコリー', 'ほうれん草', 'さんま',
+]
+
+MISS_CORPUS = [
+    'ぶろっこりー', 'とりむね', 'カレーライス', 'xyzzy', 'みそしる',
+]
+
+SAMPLE_MEAL = '納豆45g、ご飯160g、生卵60g、ほうれん草80g、鶏もも肉100g'
+
+def measure(func, repeat, warmup=1):
+    """funcを繰り返し実行し、所要時間（ms）の統計を返す"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(samples), 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.mean(samples), 4),
+    }
+
+def use_database(path):
+    """アプリの保存先を指定したSQLiteファイルに切り替える"""
+    nutrition_app.STORAGE = MealRepository(SQLiteBackend(path))
+    nutrition_app._person_ids.clear()
+    # 旧形式（person_name列）で作ったDBは人物IDの形式に移行される
+    nutrition_app.init_db()
+
+def seed_meals_db(path, num_meals, num_persons=20):
+    """ダミーの食事データを持つDBを作成（既にあれば再利用）"""
+    if os.path.exists(path):
+        return
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    use_database(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    c = conn.cursor()
+    today = datetime.now()
+    times = ['07:30', '12:00', '19:00']
+
+    # 人物はすべて管理ユーザー（ID 1）の人物として作成
+    c.executemany('INSERT INTO persons (id, user_id, name) VALUES (?, 1, ?)',
+                  [(index + 1, f'person{index:02d}') for index in range(num_persons)])
+
+    batch_size = 10000
+    for batch_start in range(1, num_meals + 1, batch_size):
+        meals = []
+        nutrients = []
+        for meal_id in range(batch_start, min(batch_start + batch_size, num_meals + 1)):
+            index = meal_id - 1
+            person_id = index % num_persons + 1
+            per_person = index // num_persons
+            meal_date = (today - timedelta(days=per_person // 3)).strftime('%Y-%m-%d')
+            meals.append((meal_id, person_id, meal_date, times[per_person % 3], SAMPLE_MEAL))
+            nutrients.append((meal_id,) + tuple(float((meal_id + i) % 100) for i in range(30)))
+        c.executemany('''INSERT INTO meals (id, person_id, meal_date, meal_time, raw_input)
+                         VALUES (?, ?, ?, ?, ?)''', meals)
+        c.executemany(f'''INSERT INTO meal_nutrients VALUES ({', '.join('?' * 31)})''', nutrients)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+def bench_startup(results, repeat):
+    results['startup.load_food_database'] = measure(nutrition_app.load_food_database, repeat)
+    # 再読み込み時にバックグラウンドで行う、スナップショット（索引・行列）の作成
+    results['startup.build_food_data'] = measure(nutrition_app.FoodData.load, max(1, repeat // 5))
+
+    def import_app():
+        subprocess.run([sys.executable, '-c', 'import app'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                       env=os.environ.copy(), check=True, capture_output=True)
+    results['startup.import_app'] = measure(import_app, max(1, repeat // 5))
+
+def bench_matching(results, repeat):
+    data = nutrition_app.FOOD_DATA
+    foods = data.foods
+
+    def run_corpus(corpus):
+        return lambda: [nutrition_app.fuzzy_match_food(text, foods) for text in corpus]
+
+    results['match.hit_corpus'] = measure(run_corpus(HIT_CORPUS), repeat)
+    results['match.miss_corpus'] = measure(run_corpus(MISS_CORPUS), max(1, repeat // 5))
+    if data.embedding_index is not None:
+        index = data.embedding_index
+        results['match.embedding_search'] = measure(lambda: [index.search(text, k=5) for text in MISS_CORPUS], repeat)
+    results['suggestions'] = measure(
+        lambda: [nutrition_app.get_food_suggestions(text, foods) for text in HIT_CORPUS + MISS_CORPUS], repeat)
+    if data.recommender is not None:
+        # 半分だけ摂れている人への提案（全食品の採点と上位10件の選択）
+        intake = [target / 2 for target in nutrition_app.TARGET_VALUES]
+        results['recommend'] = measure(lambda: data.recommender.recommend(intake, k=10), repeat)
+    if data.planner is not None:
+        # 全食品の線形計画（キャッシュを使わない）
+        planner = data.planner
+
+        def plan():
+            planner._cache.clear()
+            planner.plan()
+        results['meal_plan'] = measure(plan, max(1, repeat // 5))
+
+def bench_calculate(results, repeat):
+    client = nutrition_app.app.test_client()
+    client.post('/api/login', json={'password': nutrition_app.APP_PASSWORD})
+    payload = {
+        'person_name': 'ベンチマーク',
+        'meal_date': datetime.now().strftime('%Y-%m-%d'),
+        'meal_time': '12:00',
+        'food_input': SAMPLE_MEAL,
+    }
+
+    def calculate():
+        response = client.post('/api/calculate', json=payload)
+        assert response.status_code == 200, response.get_json()
+
+    results['api.calculate'] = measure(calculate, repeat)
+
+def bench_payloads(results, repeat):
+    """食事の計算結果を通常形式とcompact形式でJSONにする時間とサイズ"""
+    parsed_items, _unparsed = nutrition_app.parse_food_input(SAMPLE_MEAL)
+    matched_items, total_nutrients, _error = nutrition_app.calculate_meal_items(parsed_items, use_ai=False)
+
+    for variant, compact in (('full', False), ('compact', True)):
+        def encode():
+            return nutrition_app.app.json.dumps(
+                nutrition_app.meal_payload(1, matched_items, total_nutrients, [], compact))
+        results[f'payload.meal.{variant}'] = measure(encode, repeat * 10)
+        results[f'payload.meal.{variant}']['bytes'] = len(encode().encode('utf-8'))
+
+def bench_weekly_summary(results, repeat, sizes, reseed=False):
+    # キャッシュを通さない集計処理そのものを計測
+    summary = nutrition_app.get_weekly_summary.__wrapped__.__wrapped__
+    original_storage = nutrition_app.STORAGE
+
+    for size in sizes:
+        path = os.path.join(BENCH_DIR, f'meals_{size}.db')
+        if reseed and os.path.exists(path):
+            os.remove(path)
+        print(f"  {size:,}食のDBを準備中...", flush=True)
+        seed_meals_db(path, size)
+        use_database(path)
+
+        for suffix, query in (('', ''), ('.compact', '?format=compact')):
+            def run_summary():
+                with nutrition_app.app.test_request_context('/' + query):
+                    nutrition_app.session['user_id'] = 1
+                    response = summary('person00')
+                    assert not isinstance(response, tuple), response
+                    return response
+            results[f'weekly_summary.{size}{suffix}'] = measure(run_summary, repeat)
+            results[f'weekly_summary.{size}{suffix}']['bytes'] = len(run_summary().get_data())
+
+    nutrition_app.STORAGE = original_storage
+    nutrition_app._person_ids.clear()
+
+def compare(results, baseline, threshold):
+    """ベースラインと比較し、遅くなった項目の一覧を返す"""
+    regressions = []
+    print("\n" + "=" * 70)
+    print(f"ベースラインとの比較（閾値: +{threshold:.0%}）")
+    print("=" * 70)
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            print(f"  {name:32s} {current['median_ms']:10.3f}ms  (新規)")
+            continue
+        ratio = current['median_ms'] / base['median_ms'] if base['median_ms'] else 1.0
+        mark = '✗' if ratio > 1 + threshold else '✓'
+        print(f"  {mark} {name:30s} {current['median_ms']:10.3f}ms  (基準 {base['median_ms']:.3f}ms, {ratio:.2f}x)")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='パフォーマンスベンチマーク')
+    parser.add_argument('--repeat', type=int, default=20, help='各項目の繰り返し回数')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='週間サマリー用DBの食事数（カンマ区切り）')
+    parser.add_argument('--reseed', action='store_true', help='週間サマリー用DBを作り直す（スキーマ変更後など）')
+    parser.add_argument('--output', default='bench_results.json', help='結果の保存先')
+    parser.add_argument('--baseline', help='比較するベースラインのJSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='回帰とみなす遅延の割合')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = {}
+
+    print("起動・ロード...", flush=True)
+    bench_startup(results, args.repeat)
+    print("あいまい検索...", flush=True)
+    bench_matching(results, args.repeat)
+    print("/api/calculate...", flush=True)
+    bench_calculate(results, args.repeat)
+    print("レスポンス形式...", flush=True)
+    bench_payloads(results, args.repeat)
+    print("週間サマリー...", flush=True)
+    bench_weekly_summary(results, args.repeat, sizes, args.reseed)
+
+    output = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+
+    print("\n" + "=" * 70)
+    print("結果（中央値）")
+    print("=" * 70)
+    for name, result in results.items():
+        size = f"  {result['bytes']:,} bytes" if 'bytes' in result else ''
+        print(f"  {name:32s} {result['median_ms']:10.3f}ms{size}")
+    print(f"\n✓ {args.output} に保存しました")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)}項目で性能が低下しました: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ 性能低下なし")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+静的ファイルの圧縮済みファイルを生成するスクリプト
+
+static/ のCSS・JSを最大の圧縮率で brotli（brotliモジュールがある場合）と gzip に圧縮し、
+ハッシュ付きの名前で static/dist/ に書き出します。アプリは圧縮済みファイルがあればそれを返し、
+なければ初回のリクエスト時に圧縮します。デプロイ時のビルドで実行してください。
+
+使い方:
+    python build_assets.py
+"""
+
+import os
+
+from assets import BROTLI_AVAILABLE, AssetManifest
+
+def main():
+    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = AssetManifest(static_dir)
+    for filename in manifest.build():
+        size = os.path.getsize(os.path.join(manifest.dist_dir, filename))
+        print(f"  {filename:40s} {size:8,d} bytes")
+    if not BROTLI_AVAILABLE:
+        print("警告: brotliモジュールが見つかりません。gzipのみ生成しました。")
+    print(f"✓ {manifest.dist_dir} に書き出しました")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+読み辞書の生成スクリプト
+
+文部科学省「日本食品標準成分表」のExcel（備考欄の「別名」）と、
+よく使われる漢字表記の読み一覧から food_readings.json を生成します。
+app.py は起動時にこのファイルを読み込み、かな・漢字の表記ゆれを
+正規化したキーで食品を引けるようにします。
+
+使い方:
+    python build_readings.py
+    python build_readings.py --xlsx 20230428-mxt_kagsei-mext_00001_012.xlsx --output food_readings.json
+"""
+
+import argparse
+import json
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+# 成分表ではかな書きだが、漢字で入力されやすい食品名の読み
+# 「梨（なし）」「桃（もも）」「柿（かき）」のように他の語と衝突する読みや、
+# 「牛（ぎゅう／うし）」のように語によって変わる読みは含めない
+COMMON_READINGS = {
+    # 野菜
+    '大根': 'だいこん', '人参': 'にんじん', '玉葱': 'たまねぎ', '玉ねぎ': 'たまねぎ',
+    '長葱': 'ねぎ', '長ねぎ': 'ねぎ', '葱': 'ねぎ', '白菜': 'はくさい', '胡瓜': 'きゅうり',
+    '茄子': 'なす', '南瓜': 'かぼちゃ', '牛蒡': 'ごぼう', '蓮根': 'れんこん', '生姜': 'しょうが',
+    '大蒜': 'にんにく', '小松菜': 'こまつな', '水菜': 'みずな', '春菊': 'しゅんぎく',
+    'ほうれん草': 'ほうれんそう', '菠薐草': 'ほうれんそう', '青梗菜': 'ちんげんさい',
+    '枝豆': 'えだまめ', '大豆': 'だいず', '小豆': 'あずき', '蒟蒻': 'こんにゃく',
+    '里芋': 'さといも', '薩摩芋': 'さつまいも', 'さつま芋': 'さつまいも', '馬鈴薯': 'じゃがいも',
+    '椎茸': 'しいたけ', '舞茸': 'まいたけ', '占地': 'しめじ', '榎茸': 'えのきたけ',
+    # 果物
+    '林檎': 'りんご', '蜜柑': 'みかん', '苺': 'いちご', '葡萄': 'ぶどう', '檸檬': 'レモン',
+    # 魚介・海藻
+    '秋刀魚': 'さんま', '鮭': 'さけ', '鯖': 'さば', '鯵': 'あじ', '鰯': 'いわし', '鮪': 'まぐろ',
+    '鰤': 'ぶり', '鯛': 'たい', '鱈': 'たら', '烏賊': 'いか', '蛸': 'たこ', '海老': 'えび',
+    '蟹': 'かに', '牡蠣': 'かき', '帆立': 'ほたて', '鰻': 'うなぎ', '鰹': 'かつお',
+    '浅蜊': 'あさり', '蜆': 'しじみ', '若布': 'わかめ', '昆布': 'こんぶ', '海苔': 'のり',
+    '鹿尾菜': 'ひじき',
+    # 肉
+    '鶏': 'とり', '豚': 'ぶた',
+    # 調味料
+    '醤油': 'しょうゆ', '味噌': 'みそ', '味醂': 'みりん',
+}
+
+KANA_ONLY = re.compile(r'^[ぁ-んァ-ヶー]+$')
+HAS_KANJI = re.compile(r'[一-龯々]')
+ALIAS_LINE = re.compile(r'別名\s*[:：]\s*(.+)')
+WITH_READING = re.compile(r'^(.+?)（(.+?)）$')
+
+# 「和名（…）」「関西（…）」のような注記を読みと取り違えないための除外語
+NOT_WORDS = ('名', '関西', '関東', '地方', '小型', '大型', '基準')
+
+def is_reading_pair(word, reading):
+    """漢字2〜4文字の語とかな2文字以上の読みの組か"""
+    return (2 <= len(word) <= 4 and HAS_KANJI.search(word) and len(reading) >= 2
+            and KANA_ONLY.match(reading) and not any(part in word for part in NOT_WORDS))
+
+def load_shared_strings(workbook):
+    root = ET.fromstring(workbook.read('xl/sharedStrings.xml'))
+    strings = []
+    for item in root.findall(SHEET_NS + 'si'):
+        # ふりがな（rPh）を除いた本文のみを連結
+        parts = []
+        for element in item:
+            if element.tag == SHEET_NS + 't':
+                parts.append(element.text or '')
+            elif element.tag == SHEET_NS + 'r':
+                parts.append(''.join(t.text or '' for t in element.iter(SHEET_NS + 't')))
+        strings.append(''.join(parts))
+    return strings
+
+def read_sheet_rows(workbook, strings, sheet='xl/worksheets/sheet1.xml'):
+    root = ET.fromstring(workbook.read(sheet))
+    for row in root.iter(SHEET_NS + 'row'):
+        cells = {}
+        for cell in row.findall(SHEET_NS + 'c'):
+            value = cell.find(SHEET_NS + 'v')
+            if value is None:
+                continue
+            column = re.match(r'[A-Z]+', cell.get('r')).group()
+            cells[column] = strings[int(value.text)] if cell.get('t') == 's' else value.text
+        yield cells
+
+def find_columns(rows):
+    """見出し行から食品名・備考の列を探す"""
+    name_column = remarks_column = None
+    for cells in rows[:20]:
+        for column, value in cells.items():
+            label = re.sub(r'\s', '', value)
+            if label == '食品名':
+                name_column = column
+            elif label == '備考':
+                remarks_column = column
+    return name_column, remarks_column
+
+def extract_aliases(remarks):
+    """備考欄の「別名：A、B（読み）」から別名の一覧を取り出す"""
+    aliases = []
+    readings = {}
+    for line in remarks.splitlines():
+        match = ALIAS_LINE.search(line)
+        if not match:
+            continue
+        for alias in re.split(r'[、,､]', match.group(1)):
+            alias = alias.strip()
+            if not alias:
+                continue
+            pair = WITH_READING.match(alias)
+            if pair:
+                word, note = pair.group(1).strip(), pair.group(2).strip()
+                aliases.extend([word, note])
+                # 「甘藷（かんしょ）」「かんしょ（甘藷）」のどちらの順でも読みとして登録
+                if is_reading_pair(word, note):
+                    readings[word] = note
+                elif is_reading_pair(note, word):
+                    readings[note] = word
+            else:
+                aliases.append(alias)
+    # 文章になっている注記は別名として扱わない
+    return [alias for alias in aliases if len(alias) <= 12 and '場合' not in alias], readings
+
+def build(xlsx_path, food_names):
+    with zipfile.ZipFile(xlsx_path) as workbook:
+        strings = load_shared_strings(workbook)
+        rows = list(read_sheet_rows(workbook, strings))
+
+    name_column, remarks_column = find_columns(rows)
+    if not name_column or not remarks_column:
+        raise SystemExit('食品名・備考の列が見つかりません')
+
+    words = dict(COMMON_READINGS)
+    aliases = {}
+    for cells in rows:
+        name = cells.get(name_column, '')
+        if name not in food_names:
+            continue
+        row_aliases, row_readings = extract_aliases(cells.get(remarks_column, ''))
+        for word, reading in row_readings.items():
+            words.setdefault(word, reading)
+        for alias in row_aliases:
+            # 同じ別名を持つ食品が複数ある場合は成分表の並び順で先頭（生・基本形）を採用
+            aliases.setdefault(alias, name)
+
+    return {'words': dict(sorted(words.items())), 'aliases': dict(sorted(aliases.items()))}
+
+def main():
+    parser = argparse.ArgumentParser(description='読み辞書 food_readings.json を生成')
+    parser.add_argument('--xlsx', default='20230428-mxt_kagsei-mext_00001_012.xlsx')
+    parser.add_argument('--foods', default='food_database.json')
+    parser.add_argument('--output', default='food_readings.json')
+    args = parser.parse_args()
+
+    with open(args.foods, 'r', encoding='utf-8') as f:
+        food_names = {food['食品名'] for food in json.load(f)}
+
+    readings = build(args.xlsx, food_names)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(readings, f, ensure_ascii=False, indent=1)
+
+    print(f"✓ 読み: {len(readings['words'])}語、別名: {len(readings['aliases'])}件を {args.output} に保存しました")
+
+if __name__ == '__main__':
+    main()
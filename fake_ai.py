@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+DeepSeek / Claude のHTTP APIを模したローカルのスタブサーバー（負荷試験用）
+
+- POST /v1/chat/completions: DeepSeek（OpenAI互換）の応答形式
+- POST /v1/messages: Claude（Anthropic Messages API）の応答形式
+- GET /stats: プロバイダーごとのリクエスト数・失敗数
+
+アプリのプロンプト（「以下から最も適切な食品を1つ選んでください:」に続く候補の一覧）から
+最初の候補を選んで返します。応答までの遅延（平均・ばらつき）と、500エラー・429（レート制限）を
+返す割合はプロバイダーごとに指定できます。
+
+アプリを向けるには:
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8090 CLAUDE_BASE_URL=http://127.0.0.1:8090 \\
+    DEEPSEEK_API_KEY=dummy CLAUDE_API_KEY=dummy python app.py
+
+使い方:
+    python fake_ai.py --port 8090 --latency 800 --jitter 200
+    python fake_ai.py --deepseek-failure-rate 0.3       # DeepSeekの3割を500にしてClaudeへのフォールバックを試す
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROVIDERS = ('deepseek', 'claude')
+DEFAULT_LATENCY_MS = 800
+DEFAULT_JITTER_MS = 200
+PROMPT_MARKER = '選んでください'
+
+def provider_config(latency_ms=DEFAULT_LATENCY_MS, jitter_ms=DEFAULT_JITTER_MS, failure_rate=0.0, rate_limit_rate=0.0):
+    return {'latency_ms': latency_ms, 'jitter_ms': jitter_ms, 'failure_rate': failure_rate,
+            'rate_limit_rate': rate_limit_rate}
+
+def choose_food(prompt):
+    """プロンプトの候補の一覧から最初の食品名を選ぶ（候補が無ければ入力をそのまま返す）"""
+    lines = prompt.splitlines()
+    for index, line in enumerate(lines):
+        if PROMPT_MARKER in line:
+            for candidate in lines[index + 1:]:
+                if candidate.strip():
+                    return candidate.strip()
+            break
+    return lines[0].replace('入力:', '').strip() if lines else ''
+
+def deepseek_response(model, text):
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+    }
+
+def claude_response(model, text):
+    return {
+        'id': f'msg_{uuid.uuid4().hex}',
+        'type': 'message',
+        'role': 'assistant',
+        'model': model,
+        'content': [{'type': 'text', 'text': text}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': {'input_tokens': 0, 'output_tokens': 0}
+    }
+
+class FakeAIServer(ThreadingHTTPServer):
+    """プロバイダーごとの設定と集計を持つスタブサーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address, providers=None, seed=None):
+        super().__init__(address, FakeAIHandler)
+        self.providers = {name: provider_config() for name in PROVIDERS}
+        self.providers.update(providers or {})
+        self.random = random.Random(seed)
+        self.stats = {name: {'requests': 0, 'errors': 0, 'rate_limited': 0} for name in PROVIDERS}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def plan(self, provider):
+        """このリクエストの (遅延秒, 返すステータス) を決めて集計する"""
+        config = self.providers[provider]
+        with self.lock:
+            delay = max(0.0, self.random.gauss(config['latency_ms'], config['jitter_ms'])) / 1000
+            draw = self.random.random()
+            stats = self.stats[provider]
+            stats['requests'] += 1
+            if draw < config['failure_rate']:
+                stats['errors'] += 1
+                return delay, 500
+            if draw < config['failure_rate'] + config['rate_limit_rate']:
+                stats['rate_limited'] += 1
+                return delay, 429
+        return delay, 200
+
+    def start(self):
+        """別スレッドで応答を始める"""
+        thread = threading.Thread(target=self.serve_forever, name='fake-ai', daemon=True)
+        thread.start()
+        return thread
+
+class FakeAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.server.lock:
+                stats = json.loads(json.dumps(self.server.stats))
+            self._send_json(200, {'providers': self.server.providers, 'stats': stats})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'invalid json'})
+            return
+
+        if self.path == '/v1/chat/completions':
+            provider = 'deepseek'
+            authorized = self.headers.get('Authorization', '').startswith('Bearer ')
+        elif self.path == '/v1/messages':
+            provider = 'claude'
+            authorized = bool(self.headers.get('x-api-key'))
+        else:
+            self._send_json(404, {'error': 'not found'})
+            return
+        if not authorized:
+            self._send_json(401, {'error': {'type': 'authentication_error', 'message': 'missing api key'}})
+            return
+
+        delay, status = self.server.plan(provider)
+        time.sleep(delay)
+        if status == 429:
+            self._send_json(429, {'error': {'type': 'rate_limit_error', 'message': 'rate limited (fake)'}},
+                            {'Retry-After': '1'})
+            return
+        if status != 200:
+            self._send_json(status, {'error': {'type': 'api_error', 'message': 'internal error (fake)'}})
+            return
+
+        messages = payload.get('messages') or [{}]
+        content = messages[-1].get('content', '')
+        if isinstance(content, list):
+            content = ''.join(block.get('text', '') for block in content if isinstance(block, dict))
+        text = choose_food(content)
+        model = payload.get('model', '')
+        if provider == 'deepseek':
+            self._send_json(200, deepseek_response(model, text))
+        else:
+            self._send_json(200, claude_response(model, text))
+
+def main():
+    parser = argparse.ArgumentParser(description='DeepSeek / Claude APIのスタブサーバー')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY_MS, help='応答までの平均遅延（ms）')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER_MS, help='遅延の標準偏差（ms）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='500を返す割合（両方）')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='429を返す割合（両方）')
+    parser.add_argument('--deepseek-failure-rate', type=float, help='DeepSeekだけ500を返す割合')
+    parser.add_argument('--claude-failure-rate', type=float, help='Claudeだけ500を返す割合')
+    parser.add_argument('--seed', type=int, help='乱数の種（遅延・失敗を再現する）')
+    args = parser.parse_args()
+
+    providers = {}
+    for name in PROVIDERS:
+        failure_rate = getattr(args, f'{name}_failure_rate')
+        providers[name] = provider_config(args.latency, args.jitter,
+                                          args.failure_rate if failure_rate is None else failure_rate,
+                                          args.rate_limit_rate)
+    server = FakeAIServer((args.host, args.port), providers, args.seed)
+    print(f"スタブサーバー: {server.url}（Ctrl+Cで終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
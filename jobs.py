@@ -0,0 +1,148 @@
+"""
+バックグラウンドジョブ
+
+AIマッチングのように時間のかかる処理をリクエストの外で実行するための軽量なキューです。
+ジョブは保存先（storage.py）の jobs テーブルに入り、ワーカーが古い順に取り出して実行します。
+
+- アプリのプロセス内: JOB_WORKERS=2 で最初のリクエスト時にワーカースレッドを起動
+- 別プロセス: python worker.py --workers 2
+- テスト: JobQueue.run_pending() で待ちジョブを呼び出し元のスレッドで全て実行（通信不要）
+
+ジョブの状態は pending（待ち）→ running（実行中）→ done（完了）/ failed（失敗）。
+ハンドラーが JobError 以外の例外（AI APIのタイムアウト・429・5xx など）を出した場合は max_attempts 回まで
+再実行します。照合できない食品のように再実行しても結果が変わらない失敗は JobError にします。
+再実行までは retry_delay 秒から倍々に延ばした時間（ジッター付き、上限 max_retry_delay 秒）を空け、
+例外に retry_after（秒。HTTPの Retry-After）があればそれより早くは再実行しません。
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class JobError(Exception):
+    """再実行しても結果が変わらない失敗（入力の誤りなど）"""
+
+class JobQueue:
+    """ジョブの登録・取り出し・実行"""
+
+    def __init__(self, storage, max_attempts=3, stale_after=600, retry_delay=2.0, max_retry_delay=300.0):
+        self.storage = storage
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # 実行中のまま stale_after 秒を過ぎたジョブは、ワーカーの起動時に待ちに戻す
+        self.stale_after = stale_after
+        self.handlers = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def handler(self, kind):
+        """ジョブの種類ごとの処理を登録するデコレーター（引数はペイロード、戻り値は結果のdict）"""
+        def decorator(f):
+            self.handlers[kind] = f
+            return f
+        return decorator
+
+    def enqueue(self, kind, payload, user_id=None):
+        """ジョブを登録し、ジョブIDを返す"""
+        if kind not in self.handlers:
+            raise ValueError(f'不明なジョブの種類です: {kind}')
+        job_id = self.storage.enqueue_job(kind, user_id, json.dumps(payload, ensure_ascii=False))
+        self._wakeup.set()
+        return job_id
+
+    def backoff(self, attempts, error=None):
+        """attempts 回目の失敗から再実行までの秒数（指数バックオフ、0.5〜1倍のジッター）
+
+        例外に retry_after（秒）があれば、それより短くはしない。
+        """
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def run_one(self, now=None):
+        """待ちジョブを1つ実行する（実行するジョブがなければFalse）
+
+        now を指定すると現在時刻の代わりにその時刻（UNIX秒）で取り出し・再実行の予定を決める（テスト用）。
+        """
+        clock = time.time if now is None else (lambda: now)
+        job = self.storage.claim_job(clock())
+        if job is None:
+            return False
+
+        job_id, kind, _user_id, payload, attempts = job
+        handler = self.handlers.get(kind)
+        try:
+            if handler is None:
+                raise JobError(f'不明なジョブの種類です: {kind}')
+            result = handler(json.loads(payload))
+        except JobError as e:
+            self.storage.fail_job(job_id, str(e), clock())
+        except Exception as e:
+            retry = attempts < self.max_attempts
+            delay = self.backoff(attempts, e) if retry else 0
+            logger.warning('ジョブ %s（%s）の実行に失敗しました（%d回目%s）: %s',
+                           job_id, kind, attempts, f'、{delay:.1f}秒後に再実行します' if retry else '', e)
+            # 再実行までの時間は、失敗した時点（AI APIのタイムアウトを待った後）から数える
+            failed_at = clock()
+            self.storage.fail_job(job_id, f'{type(e).__name__}: {e}', failed_at,
+                                  retry=retry, run_after=failed_at + delay)
+        else:
+            self.storage.finish_job(job_id, json.dumps(result, ensure_ascii=False), clock())
+        return True
+
+    def run_pending(self, now=None):
+        """取り出せる待ちジョブがなくなるまで呼び出し元のスレッドで実行し、実行した件数を返す
+
+        再実行を待っているジョブは、その時刻（run_after）が now を過ぎるまで実行しない。
+        """
+        count = 0
+        while self.run_one(now):
+            count += 1
+        return count
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self, workers, poll_interval=1.0):
+        """ワーカースレッドを起動（起動済みなら何もしない）"""
+        with self._start_lock:
+            if self.running:
+                return
+            requeued = self.storage.requeue_stale_jobs(time.time() - self.stale_after)
+            if requeued:
+                logger.info('止まっていたジョブ%d件を待ちに戻しました', requeued)
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._work, args=(poll_interval,),
+                                              name=f'job-worker-{index + 1}', daemon=True)
+                             for index in range(workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """ワーカースレッドを止める（実行中のジョブは完了まで待つ）"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self, poll_interval):
+        while not self._stop.is_set():
+            try:
+                if self.run_one():
+                    continue
+            except Exception:
+                logger.exception('ジョブの取り出しに失敗しました')
+            # 同じプロセスで登録されたジョブはすぐに、他のプロセスの分は poll_interval ごとに拾う
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
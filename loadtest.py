@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+負荷試験ツール
+
+仮想ユーザーごとに合成した食事の記録（数日分の朝・昼・夕食）を /api/login と /api/calculate で
+記録してから、週間サマリーと食事履歴を読みます。仮想ユーザーは --concurrency 個のスレッドで同時に動かし、
+エンドポイントごとのレイテンシ（p50 / p95 / p99）とスループットを表示して JSON に保存します。
+
+--url を省略すると、AI APIのスタブ（fake_ai.py）と一時DBのアプリを起動して試験します
+（gunicornがあれば本番と同じ gthread、無ければFlaskの開発サーバー）。
+食事の入力のうち --ai-ratio の割合の食品はどの索引にも無い名前にして、AIによる照合（スタブ）を通します。
+ベースラインを指定すると p95 を比較し、閾値を超えて遅くなった項目があれば終了コード1で終了します。
+
+使い方:
+    python loadtest.py                                        # スタブとアプリを起動して試験
+    python loadtest.py --users 50 --concurrency 16 --days 14
+    python loadtest.py --ai-latency 2000 --ai-failure-rate 0.2
+    python loadtest.py --url http://localhost:5000 --password xxx   # 起動済みのアプリに対して
+    python loadtest.py --baseline loadtest_baseline.json      # ベースラインと比較
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+import fake_ai
+
+# よく記録される食品（照合は完全一致・読み・キーワードで済む）
+FOODS = [
+    '納豆45g', 'ご飯1杯', 'ご飯150g', '卵2個', '生卵60g', '牛乳200ml', '食パン1枚', 'ヨーグルト100g',
+    'バナナ1本', '味噌汁1杯', 'カレーライス1皿', '鶏もも肉100g', '豚肉80g', 'さば100g', '鮭1切れ',
+    'ほうれん草80g', 'ブロッコリー50g', 'トマト1個', '大根50g', '豆腐半丁', '醤油小さじ1', 'りんご1個',
+]
+# どの索引にも無い食品名を作る音（AIによる照合を通す）
+SYLLABLES = 'ぬめぽぺぷゐゑをゞぢづ'
+MEAL_TIMES = ('07:30', '12:15', '19:00')
+ENDPOINTS = ('POST /api/login', 'POST /api/calculate', 'GET /api/weekly-summary', 'GET /api/meal-history')
+
+def make_diary(rng, days, meals_per_day, ai_ratio, today=None):
+    """[(日付, 時刻, 入力), ...]（古い順）。食品は1食2〜4品で、ai_ratio の割合を未知の名前にする"""
+    today = today or datetime.now()
+    diary = []
+    for day in range(days - 1, -1, -1):
+        meal_date = (today - timedelta(days=day)).strftime('%Y-%m-%d')
+        for meal_time in MEAL_TIMES[:meals_per_day]:
+            items = []
+            for _ in range(rng.randint(2, 4)):
+                if rng.random() < ai_ratio:
+                    name = ''.join(rng.choice(SYLLABLES) for _ in range(5))
+                    items.append(f'{name}{rng.choice((50, 100, 150))}g')
+                else:
+                    items.append(rng.choice(FOODS))
+            diary.append((meal_date, meal_time, '、'.join(items)))
+    return diary
+
+def percentile(sorted_values, q):
+    """並べ替え済みの値のqパーセンタイル（線形補間）"""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class Recorder:
+    """エンドポイントごとの (開始時刻, 所要秒, ステータス) を集める"""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def request(self, session, label, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=120, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples.setdefault(label, []).append((started, elapsed, status))
+        return response
+
+    def summary(self):
+        """エンドポイントごとの件数・エラー数・スループット・レイテンシ（ms）"""
+        results = {}
+        labels = [label for label in ENDPOINTS if label in self.samples]
+        for label in labels + sorted(set(self.samples) - set(labels)):
+            samples = self.samples[label]
+            latencies = sorted(elapsed * 1000 for _started, elapsed, _status in samples)
+            span = max(started + elapsed for started, elapsed, _status in samples) - min(
+                started for started, _elapsed, _status in samples)
+            results[label] = {
+                'count': len(samples),
+                'errors': sum(1 for _started, _elapsed, status in samples if status == 0 or status >= 500),
+                'statuses': {str(status): count for status, count in sorted(
+                    collections.Counter(status for _started, _elapsed, status in samples).items())},
+                'throughput': round(len(samples) / span, 2) if span else None,
+                'mean': round(statistics.mean(latencies), 2),
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'max': round(latencies[-1], 2),
+            }
+        return results
+
+def run_user(base_url, password, username, person_name, diary, reads, recorder):
+    """仮想ユーザー1人分: ログイン → 食事の記録 → サマリー・履歴の読み込み"""
+    with requests.Session() as session:
+        response = recorder.request(session, 'POST /api/login', 'POST', f'{base_url}/api/login',
+                                    json={'username': username, 'password': password})
+        if response is None or response.status_code != 200:
+            return
+        for meal_date, meal_time, food_input in diary:
+            recorder.request(session, 'POST /api/calculate', 'POST', f'{base_url}/api/calculate', json={
+                'person_name': person_name, 'meal_date': meal_date, 'meal_time': meal_time,
+                'food_input': food_input})
+        for _ in range(reads):
+            recorder.request(session, 'GET /api/weekly-summary', 'GET', f'{base_url}/api/weekly-summary/{person_name}')
+            recorder.request(session, 'GET /api/meal-history', 'GET', f'{base_url}/api/meal-history/{person_name}')
+
+def run_load(base_url, password, username='', users=20, concurrency=8, days=7, meals_per_day=3, reads=10,
+             ai_ratio=0.1, seed=1):
+    """仮想ユーザーを concurrency 並列で動かし、(エンドポイントごとの集計, 全体の秒数) を返す"""
+    rng = random.Random(seed)
+    run_id = datetime.now().strftime('%H%M%S')
+    plans = [(f'負荷試験{run_id}-{index}', make_diary(rng, days, meals_per_day, ai_ratio)) for index in range(users)]
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_user, base_url, password, username, person_name, diary, reads, recorder)
+                   for person_name, diary in plans]
+        for future in futures:
+            future.result()
+    return recorder.summary(), time.perf_counter() - started
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_app(port, env, threads):
+    """一時DBでアプリを起動する（gunicornがあれば gthread ワーカー1つ）"""
+    try:
+        import gunicorn  # noqa: F401
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--workers', '1', '--worker-class', 'gthread',
+                   '--threads', str(threads), '--timeout', '300', '--bind', f'127.0.0.1:{port}']
+    except ImportError:
+        command = [sys.executable, 'app.py']
+    return subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_until_ready(base_url, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'アプリが起動できませんでした（終了コード{process.returncode}）')
+        try:
+            requests.get(f'{base_url}/api/check-auth', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('アプリの起動を待てませんでした')
+
+def print_results(results, elapsed):
+    print(f"\n{'エンドポイント':26s} {'件数':>6s} {'エラー':>6s} {'件/秒':>8s} {'平均':>8s} "
+          f"{'p50':>8s} {'p95':>8s} {'p99':>8s} {'最大':>8s}  (ms)")
+    for label, result in results.items():
+        throughput = f"{result['throughput']:.1f}" if result['throughput'] is not None else '-'
+        print(f"{label:26s} {result['count']:6d} {result['errors']:6d} {throughput:>8s} {result['mean']:8.1f} "
+              f"{result['p50']:8.1f} {result['p95']:8.1f} {result['p99']:8.1f} {result['max']:8.1f}")
+    total = sum(result['count'] for result in results.values())
+    print(f"\n合計 {total:,}件 / {elapsed:.1f}秒（{total / elapsed:.1f}件/秒）")
+
+def compare(results, baseline, threshold):
+    """p95 が baseline より threshold の割合を超えて遅くなったエンドポイントの一覧"""
+    regressions = []
+    for label, result in results.items():
+        base = baseline.get('results', {}).get(label)
+        if base and base['p95'] and result['p95'] > base['p95'] * (1 + threshold):
+            regressions.append((label, base['p95'], result['p95']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='負荷試験（合成した食事の記録とサマリー・履歴の読み込み）')
+    parser.add_argument('--url', help='試験するアプリのURL（省略時はスタブとアプリを起動）')
+    parser.add_argument('--username', default='', help='ログインするユーザー（省略時は管理ユーザー）')
+    parser.add_argument('--password', default=os.environ.get('APP_PASSWORD', 'admin123'), help='パスワード')
+    parser.add_argument('--users', type=int, default=20, help='仮想ユーザー（人物）の数')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時に動く仮想ユーザーの数')
+    parser.add_argument('--days', type=int, default=7, help='1人あたりの記録の日数')
+    parser.add_argument('--meals-per-day', type=int, default=3, choices=(1, 2, 3), help='1日の食事の数')
+    parser.add_argument('--reads', type=int, default=10, help='記録の後にサマリー・履歴を読む回数')
+    parser.add_argument('--ai-ratio', type=float, default=0.1, help='AIで照合する食品の割合')
+    parser.add_argument('--ai-latency', type=float, default=fake_ai.DEFAULT_LATENCY_MS, help='スタブの平均遅延（ms）')
+    parser.add_argument('--ai-jitter', type=float, default=fake_ai.DEFAULT_JITTER_MS, help='スタブの遅延の標準偏差（ms）')
+    parser.add_argument('--ai-failure-rate', type=float, default=0.0, help='スタブが500を返す割合')
+    parser.add_argument('--ai-rate-limit-rate', type=float, default=0.0, help='スタブが429を返す割合')
+    parser.add_argument('--threads', type=int, default=32, help='起動するアプリのスレッド数（gunicorn）')
+    parser.add_argument('--seed', type=int, default=1, help='食事の記録とスタブの乱数の種')
+    parser.add_argument('--output', default='loadtest_results.json', help='結果の保存先')
+    parser.add_argument('--baseline', help='比較するベースラインのJSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='回帰とみなす p95 の遅延の割合')
+    args = parser.parse_args()
+
+    stub = process = None
+    base_url = args.url.rstrip('/') if args.url else None
+    tmp_dir = tempfile.TemporaryDirectory()
+    try:
+        if base_url is None:
+            config = fake_ai.provider_config(args.ai_latency, args.ai_jitter, args.ai_failure_rate,
+                                             args.ai_rate_limit_rate)
+            stub = fake_ai.FakeAIServer(('127.0.0.1', 0), {name: dict(config) for name in fake_ai.PROVIDERS},
+                                        args.seed)
+            stub.start()
+            port = free_port()
+            env = dict(os.environ, PORT=str(port), APP_PASSWORD=args.password, MATCH_LOG_PATH='',
+                       NUTRITION_DB=os.path.join(tmp_dir.name, 'loadtest.db'),
+                       DEEPSEEK_BASE_URL=stub.url, CLAUDE_BASE_URL=stub.url,
+                       DEEPSEEK_API_KEY='loadtest', CLAUDE_API_KEY='loadtest')
+            env.pop('DATABASE_URL', None)
+            base_url = f'http://127.0.0.1:{port}'
+            print(f"スタブ {stub.url}、アプリ {base_url} を起動中...", file=sys.stderr)
+            process = start_app(port, env, args.threads)
+            wait_until_ready(base_url, process)
+
+        print(f"仮想ユーザー{args.users}人（同時{args.concurrency}）、1人{args.days}日×{args.meals_per_day}食、"
+              f"読み込み{args.reads}回", file=sys.stderr)
+        results, elapsed = run_load(base_url, args.password, args.username, args.users, args.concurrency,
+                                    args.days, args.meals_per_day, args.reads, args.ai_ratio, args.seed)
+        print_results(results, elapsed)
+
+        output = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'config': {key: value for key, value in vars(args).items() if key not in ('password', 'baseline', 'output')},
+            'elapsed': round(elapsed, 2),
+            'results': results,
+        }
+        if stub is not None:
+            output['fake_ai'] = stub.stats
+            calls = ', '.join(f"{name} {stats['requests']}件（500: {stats['errors']}、429: {stats['rate_limited']}）"
+                              for name, stats in stub.stats.items())
+            print(f"AIスタブ: {calls}")
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"結果を {args.output} に保存しました")
+
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = compare(results, json.load(f), args.threshold)
+            for label, before, after in regressions:
+                print(f"⚠️ {label}: p95 {before:.1f}ms → {after:.1f}ms")
+            if regressions:
+                sys.exit(1)
+            print("✓ ベースラインからの回帰はありません")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if stub is not None:
+            stub.shutdown()
+            stub.server_close()
+        tmp_dir.cleanup()
+
+if __name__ == '__main__':
+    main()
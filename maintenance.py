@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+データベースのバックアップ・アーカイブ・圧縮スクリプト
+
+- backup: SQLiteのバックアップAPIで、アプリを止めずに一貫したコピーを --backup-dir に作る
+  （nutrition-YYYYMMDD-HHMMSS.db、新しい --keep 個を残す）
+- archive: --retention-days より前の月の食事を、月ごとの圧縮ファイル
+  （--archive-dir/meals-YYYY-MM.jsonl.gz、1行1食事のJSON）に書き出してからDBから削除する。
+  同じ月をもう一度アーカイブすると、食事IDで重複を除いて1つのファイルにまとめる。
+  日・週・月の集計は残すので、/api/trends はアーカイブした期間も返せる
+- compact: 空きページを incremental_vacuum でファイルから返し、PRAGMA optimize で統計を更新する
+  （初回だけ auto_vacuum を INCREMENTAL にするための VACUUM を行う）
+
+アプリからは POST /api/admin/maintenance で同じ処理を実行できます。
+PostgreSQLでは archive だけが使えます（バックアップは pg_dump、VACUUMは autovacuum に任せる）。
+
+使い方:
+    python maintenance.py backup                         # backups/ にバックアップ
+    python maintenance.py archive --retention-days 730   # 2年より前の月をアーカイブ
+    python maintenance.py compact --pages 1000           # 空きページを1000ページまで返す
+    python maintenance.py all --retention-days 730       # バックアップ → アーカイブ → 圧縮
+
+復元はアプリを止めてから、バックアップのファイルを NUTRITION_DB のパスにコピーします。
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import sys
+import time
+
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 7
+BACKUP_PREFIX = 'nutrition-'
+ARCHIVE_DIR = 'archive'
+# /api/contributors（最大365日）や週間サマリーが読む期間はアーカイブしない
+MIN_RETENTION_DAYS = 400
+TASKS = ('backup', 'archive', 'compact')
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """バックアップの (ファイル名, バイト数) の一覧（新しい順）"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted((name for name in os.listdir(backup_dir)
+                    if name.startswith(BACKUP_PREFIX) and name.endswith('.db')), reverse=True)
+    return [(name, os.path.getsize(os.path.join(backup_dir, name))) for name in names]
+
+def backup_database(storage, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, now=None):
+    """バックアップを作り、古いものを keep 個まで減らす"""
+    now = now or datetime.datetime.now()
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{now:%Y%m%d-%H%M%S}.db')
+    storage.backend.backup(path)
+
+    removed = []
+    for name, _size in list_backups(backup_dir)[max(keep, 1):]:
+        os.remove(os.path.join(backup_dir, name))
+        removed.append(name)
+    return {'path': path, 'size': os.path.getsize(path), 'removed': removed}
+
+def archive_path(archive_dir, month):
+    return os.path.join(archive_dir, f'meals-{month:%Y-%m}.jsonl.gz')
+
+def read_archive(path):
+    """アーカイブファイルの食事（dict）をID順に返す"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        meals = {meal['id']: meal for meal in map(json.loads, f)}
+    return [meals[meal_id] for meal_id in sorted(meals)]
+
+def _write_archive(path, meals):
+    """一時ファイルに書いてから置き換える（途中で止まっても既存のアーカイブは壊れない）"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            for meal in meals:
+                f.write(json.dumps(meal, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+def _month_starts(first, end):
+    month = first.replace(day=1)
+    while month < end:
+        yield month
+        month = (month + datetime.timedelta(days=31)).replace(day=1)
+
+def archive_meals(storage, retention_days, archive_dir=ARCHIVE_DIR, today=None):
+    """retention_days 日より前の月（月単位）の食事をアーカイブし、DBから削除する
+
+    1か月ずつ「書き出し → fsync → 置き換え → 削除」を行う。削除の前に止まっても、
+    次の実行で同じ食事を食事IDでまとめ直すので重複しない。削除した食事の人物IDの集合も返す
+    """
+    if retention_days < MIN_RETENTION_DAYS:
+        raise ValueError(f'保存期間は{MIN_RETENTION_DAYS}日以上にしてください')
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=retention_days)).replace(day=1)
+    oldest = storage.oldest_meal_date()
+    report = {'before': cutoff.isoformat(), 'months': [], 'meals': 0, 'person_ids': set()}
+    if oldest is None:
+        return report
+
+    os.makedirs(archive_dir, exist_ok=True)
+    for month in _month_starts(datetime.date.fromisoformat(str(oldest)), cutoff):
+        next_month = (month + datetime.timedelta(days=31)).replace(day=1)
+        meals = storage.export_meals(month.isoformat(), next_month.isoformat())
+        if not meals:
+            continue
+        path = archive_path(archive_dir, month)
+        merged = {meal['id']: meal for meal in (read_archive(path) if os.path.exists(path) else [])}
+        merged.update((meal['id'], meal) for meal in meals)
+        _write_archive(path, [merged[meal_id] for meal_id in sorted(merged)])
+        report['person_ids'] |= storage.purge_meals([meal['id'] for meal in meals])
+        report['months'].append(f'{month:%Y-%m}')
+        report['meals'] += len(meals)
+    return report
+
+def compact_database(storage, pages=None):
+    """空きページを pages ページまで（Noneなら全て）返し、統計を更新する"""
+    return storage.backend.compact(pages)
+
+def run_maintenance(storage, tasks=TASKS, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, archive_dir=ARCHIVE_DIR,
+                    retention_days=None, pages=None):
+    """tasks を backup → archive → compact の順に実行し、処理ごとの結果と秒数を返す
+
+    archive は retention_days を指定したときだけ実行する
+    """
+    report = {}
+    for task in TASKS:
+        if task not in tasks or (task == 'archive' and not retention_days):
+            continue
+        started = time.perf_counter()
+        if task == 'backup':
+            report[task] = backup_database(storage, backup_dir, keep)
+        elif task == 'archive':
+            report[task] = archive_meals(storage, retention_days, archive_dir)
+        else:
+            report[task] = compact_database(storage, pages)
+        report[task]['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='データベースのバックアップ・アーカイブ・圧縮')
+    parser.add_argument('task', choices=TASKS + ('all',), help='実行する処理（all は全て）')
+    parser.add_argument('--backup-dir', default=BACKUP_DIR, help='バックアップの保存先')
+    parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help='残すバックアップの数')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help='アーカイブの保存先')
+    parser.add_argument('--retention-days', type=int, help=f'DBに残す日数（{MIN_RETENTION_DAYS}日以上、archive では必須）')
+    parser.add_argument('--pages', type=int, help='1回に返す空きページ数の上限（既定は全て）')
+    args = parser.parse_args()
+    if args.task == 'archive' and not args.retention_days:
+        parser.error('archive には --retention-days が必要です')
+
+    from app import STORAGE
+
+    tasks = TASKS if args.task == 'all' else (args.task,)
+    try:
+        report = run_maintenance(STORAGE, tasks, args.backup_dir, args.keep, args.archive_dir,
+                                 args.retention_days, args.pages)
+    except (RuntimeError, ValueError) as e:
+        sys.exit(str(e))
+
+    if 'backup' in report:
+        result = report['backup']
+        print(f"✓ バックアップ: {result['path']}（{result['size']:,}バイト、{result['seconds']}秒）"
+              f" 削除{len(result['removed'])}件")
+    if 'archive' in report:
+        result = report['archive']
+        print(f"✓ アーカイブ: {result['before']}より前の{result['meals']:,}件"
+              f"（{', '.join(result['months']) or 'なし'}、{result['seconds']}秒）")
+    if 'compact' in report:
+        result = report['compact']
+        vacuumed = 'VACUUMで INCREMENTAL に切り替え、' if result['vacuumed'] else ''
+        print(f"✓ 圧縮: {vacuumed}空きページ{result['freed_pages']:,}件を返却 残り{result['free_pages']:,}件 "
+              f"サイズ{result['size']:,}バイト（{result['seconds']}秒）")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+ユーザー（世帯）管理スクリプト
+
+ユーザーごとに人物と食事データが分かれます。初回起動時には
+DEFAULT_USERNAME（既定: admin）/ APP_PASSWORD の管理ユーザーが作成されます。
+
+使い方:
+    python manage_users.py list
+    python manage_users.py add suzuki                # パスワードは対話入力
+    python manage_users.py add ops --admin           # 管理ユーザー（/api/admin/* を利用可）
+    python manage_users.py passwd suzuki
+"""
+
+import argparse
+import getpass
+import sys
+
+from werkzeug.security import generate_password_hash
+
+from app import STORAGE, init_db
+
+def read_password():
+    password = getpass.getpass('パスワード: ')
+    if not password or password != getpass.getpass('パスワード（確認）: '):
+        sys.exit('パスワードが空か、一致しません')
+    return password
+
+def list_users():
+    for user_id, username, is_admin, created_at, persons in STORAGE.list_users():
+        role = '管理' if is_admin else '一般'
+        print(f"{user_id:4d}  {username:20s} {role}  人物{persons}人  作成 {created_at}")
+
+def add_user(username, is_admin):
+    if STORAGE.find_user(username):
+        sys.exit(f'ユーザー「{username}」は既に存在します')
+    STORAGE.create_user(username, generate_password_hash(read_password()), is_admin)
+    print(f"✓ ユーザー「{username}」を作成しました")
+
+def change_password(username):
+    if not STORAGE.find_user(username):
+        sys.exit(f'ユーザー「{username}」が見つかりません')
+    STORAGE.set_password(username, generate_password_hash(read_password()))
+    print(f"✓ ユーザー「{username}」のパスワードを変更しました")
+
+def main():
+    parser = argparse.ArgumentParser(description='ユーザー（世帯）管理')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='ユーザーの一覧')
+    add_parser = subparsers.add_parser('add', help='ユーザーを追加')
+    add_parser.add_argument('username')
+    add_parser.add_argument('--admin', action='store_true', help='管理ユーザーにする')
+    passwd_parser = subparsers.add_parser('passwd', help='パスワードを変更')
+    passwd_parser.add_argument('username')
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == 'list':
+        list_users()
+    elif args.command == 'add':
+        add_user(args.username, args.admin)
+    elif args.command == 'passwd':
+        change_password(args.username)
+
+if __name__ == '__main__':
+    main()
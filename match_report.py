@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+マッチング統計レポート
+
+マッチングログ（アプリを MATCH_LOG_PATH=match_log.tsv で起動すると記録）を集計し、
+レベル4（類似度）・レベル5（ベクトル）・レベル6（AI）・マッチなしに落ちた入力を頻度順に
+表示します。安定して同じ食品にマッチしている入力は
+別名辞書 food_aliases.json の候補として提案します（--apply で追記）。
+
+使い方:
+    python match_report.py
+    python match_report.py --top 30 --min-count 3
+    python match_report.py --apply
+"""
+
+import argparse
+import json
+import os
+from collections import Counter, defaultdict
+
+from app import FOOD_DATA, KEYWORD_MAPPINGS, MATCH_LOG_PATH, normalize_text
+
+LEVEL_NAMES = {
+    0: 'マッチなし',
+    1: '完全一致',
+    2: '読み一致',
+    3: 'キーワード',
+    4: '類似度',
+    5: 'ベクトル',
+    6: 'AI',
+}
+
+def read_match_log(path):
+    """ログを読み込み (レベル, 所要ms, 入力, マッチ結果) を返す"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 5:
+                continue
+            _, level, elapsed_ms, food_input, matched = fields
+            try:
+                yield int(level), float(elapsed_ms), food_input, matched
+            except ValueError:
+                continue
+
+def aggregate(records, slow_levels):
+    """入力ごとに件数・レベル内訳・所要時間・マッチ結果を集計"""
+    stats = defaultdict(lambda: {'count': 0, 'levels': Counter(), 'total_ms': 0.0, 'matches': Counter()})
+    level_totals = Counter()
+
+    for level, elapsed_ms, food_input, matched in records:
+        level_totals[level] += 1
+        if level not in slow_levels:
+            continue
+        entry = stats[normalize_text(food_input)]
+        entry['count'] += 1
+        entry['levels'][level] += 1
+        entry['total_ms'] += elapsed_ms
+        if matched:
+            entry['matches'][matched] += 1
+
+    return stats, level_totals
+
+def propose_aliases(stats, min_count, min_share):
+    """同じ食品に安定してマッチしている入力を別名候補として返す"""
+    proposals = {}
+    for food_input, entry in stats.items():
+        if entry['count'] < min_count or not entry['matches']:
+            continue
+        if food_input in FOOD_DATA.aliases or food_input in KEYWORD_MAPPINGS:
+            continue
+        matched, matched_count = entry['matches'].most_common(1)[0]
+        if matched_count / entry['count'] >= min_share:
+            proposals[food_input] = matched
+    return proposals
+
+def print_report(stats, level_totals, proposals, top):
+    total = sum(level_totals.values())
+    print("=" * 70)
+    print("マッチング統計")
+    print("=" * 70)
+    print(f"総マッチング数: {total}")
+    for level in sorted(level_totals):
+        count = level_totals[level]
+        print(f"  レベル{level} ({LEVEL_NAMES.get(level, '?')}): {count} ({count / total:.1%})")
+
+    print("\n" + "=" * 70)
+    print(f"低速パスに落ちた入力 上位{top}件")
+    print("=" * 70)
+    ranked = sorted(stats.items(), key=lambda x: (x[1]['total_ms'], x[1]['count']), reverse=True)
+    for food_input, entry in ranked[:top]:
+        levels = ', '.join(f"L{level}×{count}" for level, count in sorted(entry['levels'].items()))
+        matched = entry['matches'].most_common(1)[0][0] if entry['matches'] else '-'
+        average_ms = entry['total_ms'] / entry['count']
+        print(f"「{food_input}」 {entry['count']}回 [{levels}] 平均{average_ms:.1f}ms → {matched}")
+
+    print("\n" + "=" * 70)
+    print(f"別名辞書の候補: {len(proposals)}件")
+    print("=" * 70)
+    for food_input, matched in sorted(proposals.items()):
+        print(f"    {json.dumps(food_input, ensure_ascii=False)}: {json.dumps(matched, ensure_ascii=False)},")
+
+def apply_aliases(proposals, path):
+    """候補を別名辞書ファイルに追記"""
+    aliases = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            aliases = json.load(f)
+    aliases.update(proposals)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"\n✓ {len(proposals)}件を {path} に追記しました（POST /api/admin/food-data/reload または再起動後に有効）")
+
+def main():
+    parser = argparse.ArgumentParser(description='マッチング統計レポートと別名辞書の提案')
+    parser.add_argument('--log', default=MATCH_LOG_PATH or 'match_log.tsv', help='マッチングログのパス')
+    parser.add_argument('--top', type=int, default=20, help='表示する入力の件数')
+    parser.add_argument('--levels', default='0,4,5,6', help='集計対象のレベル（カンマ区切り）')
+    parser.add_argument('--min-count', type=int, default=2, help='別名候補とする最小出現回数')
+    parser.add_argument('--min-share', type=float, default=0.8, help='別名候補とする同一マッチの最小割合')
+    parser.add_argument('--apply', action='store_true', help='候補を別名辞書に追記')
+    parser.add_argument('--aliases', default='food_aliases.json', help='別名辞書のパス')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"ログファイルが見つかりません: {args.log}")
+        return
+
+    slow_levels = {int(level) for level in args.levels.split(',') if level.strip()}
+    stats, level_totals = aggregate(read_match_log(args.log), slow_levels)
+    proposals = propose_aliases(stats, args.min_count, args.min_share)
+    print_report(stats, level_totals, proposals, args.top)
+
+    if args.apply and proposals:
+        apply_aliases(proposals, args.aliases)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+不足栄養素を補う食品の提案
+
+全食品の100gあたりの栄養素を 食品 × 栄養素 の行列にしておき、
+1回の行列演算で全食品を採点して上位K件を返します（2,500食品で1ms程度）。
+
+- 1食品の量は100gまで、かつエネルギーが PORTION_ENERGY kcal までの量（油・菓子などは少なめ）
+- 採点: その量で埋まる不足分（不足量を上限に、目標量に対する割合で合計）÷ 不足分の合計
+- エネルギー・食塩相当量は補う対象にせず、残りの量を超える分を目標量に対する割合で減点
+- その他の栄養素も、不足分を超える分を EXCESS_PENALTY の重みで減点
+
+numpyが無い環境では使えません（NUMPY_AVAILABLE=False）。
+"""
+
+# numpyはオプショナル（無ければ提案機能は無効）
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 補うのではなく、超えないようにする栄養素
+LIMITED_NUTRIENTS = ('エネルギー', '食塩相当量')
+PORTION_GRAMS = 100
+PORTION_ENERGY = 250
+# 不足分を超えて摂りすぎる分の減点（目標量に対する割合あたり。乾物・茶葉など少量で過剰になる食品を下げる）
+EXCESS_PENALTY = 0.1
+
+class NutrientRecommender:
+    """食品 × 栄養素の行列による提案"""
+
+    def __init__(self, food_vectors, nutrient_names, targets, limited=LIMITED_NUTRIENTS,
+                 portion_grams=PORTION_GRAMS, portion_energy=PORTION_ENERGY, excess_penalty=EXCESS_PENALTY):
+        self.names = list(food_vectors)
+        self.nutrient_names = list(nutrient_names)
+        self.matrix = np.asarray(list(food_vectors.values()), dtype=np.float64)
+        self.targets = np.asarray(targets, dtype=np.float64)
+        self.limited = np.isin(self.nutrient_names, limited)
+        self.penalties = np.where(self.limited, 1.0, excess_penalty)
+
+        # 食品ごとの1回分の量（g）
+        energy = self.matrix[:, self.nutrient_names.index('エネルギー')]
+        with np.errstate(divide='ignore'):
+            by_energy = np.where(energy > 0, portion_energy / energy * 100, portion_grams)
+        self.portions = np.minimum(portion_grams, by_energy)
+        self.portion_matrix = self.matrix * (self.portions / 100)[:, None]
+
+    def deficits(self, intake):
+        """1日あたりの摂取量（栄養素の順のリスト）から、目標量までの不足分を返す"""
+        return np.maximum(self.targets - np.asarray(intake, dtype=np.float64), 0)
+
+    def recommend(self, intake, k=10):
+        """不足分を埋める食品の上位k件を [(食品名, 量g, スコア, 1回分の栄養素の配列), ...] で返す"""
+        remaining = self.deficits(intake)
+        gaps = np.where(self.limited, 0, remaining)
+        total_gap = (gaps / self.targets).sum()
+        if total_gap == 0:
+            return []
+
+        closed = (np.minimum(self.portion_matrix, gaps) / self.targets).sum(axis=1) / total_gap
+        overshoot = np.maximum(self.portion_matrix - remaining, 0) / self.targets
+        scores = closed - overshoot @ self.penalties
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.names[i], float(self.portions[i]), float(scores[i]), self.portion_matrix[i])
+                for i in top if scores[i] > 0]
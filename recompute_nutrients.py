@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+保存済みの食事の栄養素を再計算するスクリプト
+
+meal_nutrients には記録した時点の食品データで計算した合計が保存されています。
+食品データ（food_database.json）を修正したあとにこのスクリプトを実行すると、
+meal_items の食品名と重さから現在の食品データで合計を計算し直して書き戻します。
+
+- 食事をID順に --chunk-size 件ずつ読み、プロセスプールで並列に計算する
+  （1チャンクの計算は 食品 × 栄養素 の行列を使った一括計算）
+- 値が変わった食事だけを、チャンクごとに1つのトランザクションで書き込む
+  （書き込んだ人物のバージョンを進めるので、実行中のアプリのキャッシュも次のリクエストで無効になる）
+- 書き込みのたびにチェックポイント（--checkpoint）を保存し、中断しても続きから再開する。
+  食品データの版が変わっていればチェックポイントは使わずに最初からやり直す
+- 現在の食品データに無い食品を含む食事は書き換えずに件数を報告する
+
+使い方:
+    python recompute_nutrients.py                        # 全件を再計算（中断したら同じコマンドで再開）
+    python recompute_nutrients.py --workers 8 --chunk-size 10000
+    python recompute_nutrients.py --dry-run              # 書き込まずに変わる件数だけ数える
+    python recompute_nutrients.py --restart              # チェックポイントを捨てて最初から
+"""
+
+import argparse
+import collections
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# numpyはオプショナル（無ければ1件ずつ計算する）
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+CHUNK_SIZE = 5000
+CHECKPOINT_PATH = 'recompute_checkpoint.json'
+# 保存済みの値とこの誤差以内なら書き換えない（足し算の順序による差は無視する）
+TOLERANCE = 1e-9
+
+# ワーカープロセスごとの食品データ（init_worker で設定）
+_food_rows = None
+_food_matrix = None
+
+def init_worker(food_vectors):
+    """{食品名: 100gあたりの栄養素のリスト} を受け取り、計算用の行列を作る"""
+    global _food_rows, _food_matrix
+    _food_rows = {name: row for row, name in enumerate(food_vectors)}
+    if NUMPY_AVAILABLE:
+        _food_matrix = np.asarray(list(food_vectors.values()), dtype=np.float64)
+    else:
+        _food_matrix = list(food_vectors.values())
+
+def calculate_totals(meal_items):
+    """[[(食品名, 重さ), ...], ...] の食事ごとの栄養素の合計を計算する
+
+    (合計の行列（numpyが無ければリストのリスト）, 食品データに全ての食品があるか) を返す。
+    食品データに無い食品を含む食事の合計は0のままにする。
+    """
+    known = [all(name in _food_rows for name, _weight in items) for items in meal_items]
+    if not NUMPY_AVAILABLE:
+        totals = []
+        for items, ok in zip(meal_items, known):
+            total = [0.0] * len(_food_matrix[0])
+            for name, weight in items if ok else ():
+                total = [value + food_value * weight / 100.0
+                         for value, food_value in zip(total, _food_matrix[_food_rows[name]])]
+            totals.append(total)
+        return totals, known
+
+    # 全食事の食品を1列に並べ、行列から100gあたりの値を取り出して重さで換算し、食事ごとに足し込む
+    meal_index, food_rows, weights = [], [], []
+    for index, (items, ok) in enumerate(zip(meal_items, known)):
+        if ok:
+            for name, weight in items:
+                meal_index.append(index)
+                food_rows.append(_food_rows[name])
+                weights.append(weight)
+    totals = np.zeros((len(meal_items), _food_matrix.shape[1]))
+    if food_rows:
+        amounts = _food_matrix[food_rows] * (np.asarray(weights, dtype=np.float64) / 100.0)[:, None]
+        np.add.at(totals, np.asarray(meal_index), amounts)
+    return totals, known
+
+def changed_meals(totals, stored):
+    """保存済みの値（None は未保存）と合計が誤差を超えて違う食事か"""
+    if not NUMPY_AVAILABLE:
+        return [values is None or not all(
+                    old is not None and math.isclose(old, new, rel_tol=TOLERANCE, abs_tol=TOLERANCE)
+                    for old, new in zip(values, total))
+                for total, values in zip(totals, stored)]
+    # None（列・行の欠け）は nan になり、違う値として扱われる
+    stored = np.array([values if values is not None else [None] * totals.shape[1] for values in stored],
+                      dtype=np.float64).reshape(totals.shape)
+    return (~np.isclose(totals, stored, rtol=TOLERANCE, atol=TOLERANCE).all(axis=1)).tolist()
+
+def recompute_chunk(chunk):
+    """storage.meal_chunk の1チャンクを再計算する
+
+    (最後の食事ID, 件数, 書き込む行 [(食事ID, 栄養素...), ...], 書き込む食事の人物ID, 対象外の件数) を返す。
+    食品の無い食事・食品データに無い食品を含む食事は対象外として書き換えない。
+    """
+    meals = [meal for meal in chunk if meal[2]]
+    totals, known = calculate_totals([items for _meal_id, _person_id, items, _stored in meals])
+    changed = [index for index, is_changed in enumerate(changed_meals(totals, [meal[3] for meal in meals]))
+               if known[index] and is_changed]
+    values = totals[changed].tolist() if NUMPY_AVAILABLE else [totals[index] for index in changed]
+    rows = [(meals[index][0], *total) for index, total in zip(changed, values)]
+    person_ids = {meals[index][1] for index in changed}
+    skipped = len(chunk) - len(meals) + known.count(False)
+    return chunk[-1][0], len(chunk), rows, person_ids, skipped
+
+def load_checkpoint(path, food_version):
+    """食品データの版が同じチェックポイントがあればその内容を返す（なければNone）"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('food_version') != food_version:
+        return None
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def recompute(storage, food_vectors, food_version, chunk_size=CHUNK_SIZE, workers=None,
+              checkpoint_path=CHECKPOINT_PATH, dry_run=False, progress=None):
+    """全食事の栄養素を再計算し、{'processed', 'changed', 'skipped', 'resumed'} を返す
+
+    workers が1以下ならプロセスプールを使わずにこのプロセスで計算する。
+    progress には書き込みのたびに (処理済み件数, 全件数, 変更件数) が渡される。
+    チェックポイントは dry_run では使わず、完了したら削除する。
+    """
+    if dry_run:
+        checkpoint_path = None
+    checkpoint = load_checkpoint(checkpoint_path, food_version)
+    resumed = checkpoint is not None
+    checkpoint = checkpoint or {'food_version': food_version, 'last_meal_id': 0,
+                                'processed': 0, 'changed': 0, 'skipped': 0}
+    total = checkpoint['processed'] + storage.count_meals(checkpoint['last_meal_id'])
+    workers = os.cpu_count() if workers is None else workers
+
+    def apply(result):
+        last_meal_id, processed, rows, person_ids, skipped = result
+        if rows and not dry_run:
+            storage.update_meal_nutrients(rows, person_ids)
+        checkpoint.update(last_meal_id=last_meal_id,
+                          processed=checkpoint['processed'] + processed,
+                          changed=checkpoint['changed'] + len(rows),
+                          skipped=checkpoint['skipped'] + skipped)
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, checkpoint)
+        if progress:
+            progress(checkpoint['processed'], total, checkpoint['changed'])
+
+    def chunks():
+        after_id = checkpoint['last_meal_id']
+        while True:
+            chunk = storage.meal_chunk(after_id, chunk_size)
+            if not chunk:
+                return
+            after_id = chunk[-1][0]
+            yield chunk
+
+    if workers <= 1:
+        init_worker(food_vectors)
+        for chunk in chunks():
+            apply(recompute_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(food_vectors,)) as pool:
+            # 読み込みは先行させ、書き込み（とチェックポイント）は食事IDの順に行う
+            pending = collections.deque()
+            for chunk in chunks():
+                pending.append(pool.submit(recompute_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    apply(pending.popleft().result())
+            while pending:
+                apply(pending.popleft().result())
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {'processed': checkpoint['processed'], 'changed': checkpoint['changed'],
+            'skipped': checkpoint['skipped'], 'resumed': resumed}
+
+def main():
+    parser = argparse.ArgumentParser(description='保存済みの食事の栄養素を再計算')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='1回に読み込む食事の件数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='計算するプロセスの数（1ならプールを使わない）')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help='再開用のチェックポイントファイル')
+    parser.add_argument('--restart', action='store_true', help='チェックポイントを捨てて最初から')
+    parser.add_argument('--dry-run', action='store_true', help='書き込まずに変わる件数だけ数える')
+    args = parser.parse_args()
+
+    # プロセスプールの子プロセスでアプリ（食品データの索引）を読み込まないよう、ここでimportする
+    from app import FOOD_DATA, STORAGE
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    started = time.perf_counter()
+
+    def report(processed, total, changed):
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        remaining = (total - processed) / rate if rate else 0
+        percent = processed / total * 100 if total else 100
+        print(f"\r{processed:,}/{total:,}件（{percent:.1f}%） 変更{changed:,}件 "
+              f"{rate:,.0f}件/秒 残り{remaining:.0f}秒", end='', file=sys.stderr, flush=True)
+
+    stats = recompute(STORAGE, FOOD_DATA.nutrient_vectors, FOOD_DATA.version, args.chunk_size, args.workers,
+                      args.checkpoint, args.dry_run, report)
+    print(file=sys.stderr)
+    if stats['resumed']:
+        print("（チェックポイントから再開しました）")
+    action = '変わる' if args.dry_run else '更新した'
+    print(f"✓ {stats['processed']:,}件を再計算、{action}食事 {stats['changed']:,}件"
+          f"（{time.perf_counter() - started:.1f}秒、食品データ {FOOD_DATA.version}）")
+    if stats['skipped']:
+        print(f"⚠️ 食品が無い・現在の食品データに無い食品を含む食事 {stats['skipped']:,}件は書き換えていません")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,786 @@
+let radarChartInstance = null;
+let currentEditMealId = null;
+let summaryState = null;
+let summaryStream = null;
+
+// 今日の日付をデフォルトで設定
+document.addEventListener('DOMContentLoaded', function() {
+    const today = new Date().toISOString().split('T')[0];
+    const now = new Date().toTimeString().split(' ')[0].substring(0, 5);
+    document.getElementById('mealDate').value = today;
+    document.getElementById('mealTime').value = now;
+    checkAuth();
+    loadPersons();
+});
+
+// 食品名の入力補完
+const FOOD_SEPARATOR = /[、,，;；。\n]/;
+let foodSearchTimer = null;
+
+function currentFoodFragment() {
+    const input = document.getElementById('foodInput');
+    const before = input.value.substring(0, input.selectionStart);
+    const parts = before.split(FOOD_SEPARATOR);
+    return parts[parts.length - 1];
+}
+
+function scheduleFoodSearch() {
+    clearTimeout(foodSearchTimer);
+    foodSearchTimer = setTimeout(searchFoods, 150);
+}
+
+async function searchFoods() {
+    const container = document.getElementById('foodSuggestions');
+    // 数量以降を除いた食品名部分で検索
+    const query = currentFoodFragment().replace(/[\d０-９.．\/].*$/, '').trim();
+    if (!query) {
+        container.classList.add('hidden');
+        return;
+    }
+    try {
+        const response = await fetch(`/api/foods/search?q=${encodeURIComponent(query)}&limit=8`);
+        const data = await response.json();
+        container.innerHTML = '';
+        (data.foods || []).forEach(name => {
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'text-xs bg-blue-50 text-blue-700 px-2 py-1 rounded hover:bg-blue-100';
+            button.textContent = name;
+            button.onclick = () => applyFoodSuggestion(query, name);
+            container.appendChild(button);
+        });
+        container.classList.toggle('hidden', container.children.length === 0);
+    } catch (error) {
+        container.classList.add('hidden');
+    }
+}
+
+function applyFoodSuggestion(query, name) {
+    const input = document.getElementById('foodInput');
+    const cursor = input.selectionStart;
+    const before = input.value.substring(0, cursor);
+    const start = before.lastIndexOf(query);
+    if (start >= 0) {
+        input.value = input.value.substring(0, start) + name + input.value.substring(start + query.length);
+        const position = start + name.length;
+        input.setSelectionRange(position, position);
+    }
+    document.getElementById('foodSuggestions').classList.add('hidden');
+    input.focus();
+}
+
+async function loadPersons() {
+    try {
+        const response = await fetch('/api/persons');
+        const data = await response.json();
+
+        if (data.success) {
+            const select = document.getElementById('personSelect');
+            select.innerHTML = '<option value="">新規入力...</option>';
+
+            data.persons.forEach(person => {
+                const option = document.createElement('option');
+                option.value = person;
+                option.textContent = person;
+                select.appendChild(option);
+            });
+        }
+    } catch (error) {
+        console.error('人物リスト取得エラー:', error);
+    }
+}
+
+function selectPerson() {
+    const select = document.getElementById('personSelect');
+    const input = document.getElementById('personName');
+
+    if (select.value) {
+        input.value = select.value;
+        // 自動的にサマリーも更新
+        document.getElementById('summaryPersonName').value = select.value;
+        loadWeeklySummary();
+        loadMealShortcuts(select.value);
+    } else {
+        input.value = '';
+        document.getElementById('mealShortcuts').classList.add('hidden');
+    }
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
+async function loadMealShortcuts(personName) {
+    try {
+        const response = await fetch(`/api/meal-shortcuts/${encodeURIComponent(personName)}`);
+        const data = await response.json();
+        if (!data.success) return;
+
+        const chip = 'text-sm px-3 py-1 rounded-full border';
+        document.getElementById('templateList').innerHTML = data.templates.map(template => `
+            <span class="${chip} bg-yellow-50 border-yellow-300 hover:bg-yellow-100">
+                <button onclick="quickLogMeal({template_id: ${template.id}})" title="${escapeHtml(template.raw_input)}">⭐ ${escapeHtml(template.name)}</button>
+                <button onclick="deleteTemplate(${template.id})" class="ml-1 text-gray-400 hover:text-red-600" title="テンプレートを削除">×</button>
+            </span>
+        `).join('');
+        document.getElementById('recentMealList').innerHTML = data.recent.map(meal => `
+            <button onclick="quickLogMeal({meal_id: ${meal.meal_id}})" class="${chip} bg-gray-50 border-gray-300 hover:bg-gray-100" title="${meal.count}回記録（最終: ${meal.last_date}）">
+                🕘 ${escapeHtml(meal.raw_input.length > 30 ? meal.raw_input.slice(0, 30) + '…' : meal.raw_input)}
+            </button>
+        `).join('');
+
+        const hasShortcuts = data.templates.length > 0 || data.recent.length > 0;
+        document.getElementById('mealShortcuts').classList.toggle('hidden', !hasShortcuts);
+    } catch (error) {
+        console.error('テンプレート取得エラー:', error);
+    }
+}
+
+async function quickLogMeal(source) {
+    const personName = document.getElementById('personName').value.trim();
+    const mealDate = document.getElementById('mealDate').value;
+    const mealTime = document.getElementById('mealTime').value;
+    const errorDiv = document.getElementById('calculateError');
+    errorDiv.classList.add('hidden');
+
+    if (!personName || !mealDate || !mealTime) {
+        errorDiv.textContent = '個人名・日付・時刻を入力してください';
+        errorDiv.classList.remove('hidden');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/quick-log', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                person_name: personName,
+                meal_date: mealDate,
+                meal_time: mealTime,
+                ...source
+            })
+        });
+        const data = await response.json();
+
+        if (data.success) {
+            await showSummary(personName);
+            await loadMealShortcuts(personName);
+        } else {
+            errorDiv.textContent = data.error;
+            errorDiv.classList.remove('hidden');
+        }
+    } catch (error) {
+        errorDiv.textContent = 'エラー: ' + error.message;
+        errorDiv.classList.remove('hidden');
+    }
+}
+
+async function saveAsTemplate(mealId) {
+    const personName = document.getElementById('summaryPersonName').value.trim();
+    const name = prompt('テンプレート名を入力してください', (historyRawInputs[mealId] || '').slice(0, 20));
+    if (!name) return;
+
+    try {
+        const response = await fetch('/api/templates', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ person_name: personName, name: name, meal_id: mealId })
+        });
+        const data = await response.json();
+        if (data.success) {
+            await loadMealShortcuts(personName);
+        } else {
+            alert('エラー: ' + data.error);
+        }
+    } catch (error) {
+        alert('エラー: ' + error.message);
+    }
+}
+
+async function deleteTemplate(templateId) {
+    if (!confirm('このテンプレートを削除しますか？')) return;
+
+    try {
+        const response = await fetch(`/api/templates/${templateId}`, { method: 'DELETE' });
+        const data = await response.json();
+        if (data.success) {
+            await loadMealShortcuts(document.getElementById('personName').value.trim());
+        } else {
+            alert('エラー: ' + data.error);
+        }
+    } catch (error) {
+        alert('エラー: ' + error.message);
+    }
+}
+
+async function checkAuth() {
+    try {
+        const response = await fetch('/api/check-auth');
+        const data = await response.json();
+        if (data.authenticated) {
+            document.getElementById('currentUsername').textContent = `👤 ${data.username}`;
+            document.getElementById('loginScreen').classList.add('hidden');
+            document.getElementById('mainScreen').classList.remove('hidden');
+        }
+    } catch (error) {
+        console.error('認証チェックエラー:', error);
+    }
+}
+
+async function login() {
+    const username = document.getElementById('usernameInput').value.trim();
+    const password = document.getElementById('passwordInput').value;
+    const errorDiv = document.getElementById('loginError');
+
+    try {
+        const response = await fetch('/api/login', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ username, password })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            document.getElementById('currentUsername').textContent = `👤 ${data.username}`;
+            document.getElementById('loginScreen').classList.add('hidden');
+            document.getElementById('mainScreen').classList.remove('hidden');
+            await loadPersons();
+        } else {
+            errorDiv.classList.remove('hidden');
+        }
+    } catch (error) {
+        errorDiv.textContent = 'ログインエラー: ' + error.message;
+        errorDiv.classList.remove('hidden');
+    }
+}
+
+async function logout() {
+    try {
+        await fetch('/api/logout', { method: 'POST' });
+        location.reload();
+    } catch (error) {
+        console.error('ログアウトエラー:', error);
+    }
+}
+
+async function calculateNutrition() {
+    const personName = document.getElementById('personName').value.trim();
+    const mealDate = document.getElementById('mealDate').value;
+    const mealTime = document.getElementById('mealTime').value;
+    const foodInput = document.getElementById('foodInput').value.trim();
+
+    const errorDiv = document.getElementById('calculateError');
+    const loadingDiv = document.getElementById('calculateLoading');
+
+    errorDiv.classList.add('hidden');
+
+    if (!personName || !mealDate || !mealTime || !foodInput) {
+        errorDiv.textContent = '全ての項目を入力してください';
+        errorDiv.classList.remove('hidden');
+        return;
+    }
+
+    loadingDiv.classList.remove('hidden');
+
+    try {
+        const response = await fetch('/api/calculate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                person_name: personName,
+                meal_date: mealDate,
+                meal_time: mealTime,
+                food_input: foodInput
+            })
+        });
+
+        let data = await response.json();
+        if (data.success && data.status === 'pending') {
+            // AIによる照合はバックグラウンドで実行されるため、完了を待つ
+            data = await waitForJob(data.job_id);
+        }
+        loadingDiv.classList.add('hidden');
+
+        if (data.success) {
+            displayCalculationResult(data);
+            // 自動的にサマリーも更新
+            await showSummary(personName);
+            // 人物リストを更新
+            await loadPersons();
+            await loadMealShortcuts(personName);
+            // 入力フィールドをクリア
+            document.getElementById('foodInput').value = '';
+        } else {
+            errorDiv.textContent = data.error;
+            if (data.unparsed && data.unparsed.length > 0) {
+                errorDiv.textContent += ` （読み取れなかった入力: ${data.unparsed.join('、')}）`;
+            }
+            errorDiv.classList.remove('hidden');
+        }
+    } catch (error) {
+        loadingDiv.classList.add('hidden');
+        errorDiv.textContent = 'エラー: ' + error.message;
+        errorDiv.classList.remove('hidden');
+    }
+}
+
+async function waitForJob(jobId) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        if (job.status === 'failed') {
+            return { success: false, error: job.error };
+        }
+        if (!job.success || job.status === 'done') {
+            return job;
+        }
+    }
+}
+
+function displayCalculationResult(data) {
+    const resultSection = document.getElementById('resultSection');
+    const resultContent = document.getElementById('resultContent');
+
+    let html = '<div class="space-y-4">';
+
+    // マッチした食品を表示
+    html += '<div class="mb-4"><h3 class="font-semibold text-gray-700 mb-2">照合結果:</h3><ul class="space-y-1">';
+    for (const item of data.matched_items) {
+        html += `<li class="text-sm text-gray-600">
+            <span class="font-medium">${item.input_name}</span> (${item.weight}g) 
+            → <span class="text-green-600">${item.matched_name}</span>
+        </li>`;
+    }
+    html += '</ul></div>';
+
+    // 読み取れなかった入力を表示
+    if (data.unparsed && data.unparsed.length > 0) {
+        html += '<div class="bg-yellow-50 border border-yellow-200 text-yellow-800 px-4 py-3 rounded text-sm">';
+        html += '読み取れなかった入力（記録されていません）: ';
+        html += data.unparsed.map(fragment => `「${fragment}」`).join(' ');
+        html += '</div>';
+    }
+
+    // 合計栄養価
+    html += '<div><h3 class="font-semibold text-gray-700 mb-2">合計栄養価:</h3>';
+    html += '<div class="grid grid-cols-2 md:grid-cols-4 gap-2">';
+    const nutrients = data.total_nutrients;
+    for (const [key, value] of Object.entries(nutrients)) {
+        html += `<div class="bg-gray-50 p-2 rounded">
+            <div class="text-xs text-gray-600">${key}</div>
+            <div class="font-semibold">${value.toFixed(1)}</div>
+        </div>`;
+    }
+    html += '</div></div>';
+
+    html += '</div>';
+
+    resultContent.innerHTML = html;
+    resultSection.classList.remove('hidden');
+}
+
+async function loadWeeklySummary() {
+    const personName = document.getElementById('summaryPersonName').value.trim();
+    const loadingDiv = document.getElementById('summaryLoading');
+    const errorDiv = document.getElementById('summaryError');
+    const contentDiv = document.getElementById('summaryContent');
+
+    errorDiv.classList.add('hidden');
+    contentDiv.classList.add('hidden');
+
+    if (!personName) {
+        errorDiv.textContent = '個人名を入力してください';
+        errorDiv.classList.remove('hidden');
+        return;
+    }
+
+    loadingDiv.classList.remove('hidden');
+
+    try {
+        const response = await fetch(`/api/weekly-summary/${encodeURIComponent(personName)}`);
+        const data = await response.json();
+
+        loadingDiv.classList.add('hidden');
+
+        if (data.success) {
+            summaryState = data;
+            displayWeeklySummary(data);
+            await loadMealHistory(personName);
+        } else {
+            summaryState = null;
+            errorDiv.textContent = data.error;
+            errorDiv.classList.remove('hidden');
+        }
+        connectSummaryStream(personName);
+    } catch (error) {
+        loadingDiv.classList.add('hidden');
+        errorDiv.textContent = 'エラー: ' + error.message;
+        errorDiv.classList.remove('hidden');
+    }
+}
+
+// ライブ更新（Server-Sent Events）
+// 表示中の人物の食事が追加・更新・削除されると、食事の行と日ごとの増減が届く
+function connectSummaryStream(personName) {
+    if (summaryStream && summaryStream.personName === personName) return;
+    if (summaryStream) summaryStream.source.close();
+
+    const source = new EventSource(`/api/stream/${encodeURIComponent(personName)}`);
+    const stream = { personName: personName, source: source, opened: false };
+    summaryStream = stream;
+    source.addEventListener('meal', event => applyMealChange(JSON.parse(event.data)));
+    source.addEventListener('refresh', () => loadWeeklySummary());
+    source.onopen = () => {
+        // 再接続までの間の変更を取りこぼさないよう、再接続時は取得し直す（変更がなければ304）
+        if (stream.opened) loadWeeklySummary();
+        stream.opened = true;
+    };
+    source.onerror = () => {
+        // 接続数の上限や未登録の人物などで接続できない場合は、操作ごとに取得し直す方式に戻す
+        if (source.readyState === EventSource.CLOSED && summaryStream === stream) {
+            summaryStream = null;
+        }
+    };
+}
+
+function isStreaming(personName) {
+    return summaryStream !== null && summaryStream.personName === personName
+        && summaryStream.source.readyState === EventSource.OPEN;
+}
+
+async function showSummary(personName) {
+    // 同じ人物のライブ更新に接続中なら、変更はイベントで反映される
+    if (isStreaming(personName)) return;
+    document.getElementById('summaryPersonName').value = personName;
+    await loadWeeklySummary();
+}
+
+function applyMealChange(change) {
+    // 食事履歴: 行を差し替えて並べ直す
+    historyMeals = historyMeals.filter(meal => meal.id !== change.meal.id);
+    if (change.action !== 'deleted' && change.meal.meal_date >= historySince) {
+        historyMeals.push(change.meal);
+    }
+    renderMealHistory();
+
+    if (!summaryState) {
+        loadWeeklySummary();
+        return;
+    }
+
+    // 週間サマリー: 日ごとの合計に増減を足し、平均と充足率を計算し直す
+    for (const [date, day] of Object.entries(change.days)) {
+        if (date < summaryState.since) continue;
+        const count = (summaryState.meal_counts[date] || 0) + day.meals;
+        if (count <= 0) {
+            delete summaryState.meal_counts[date];
+            delete summaryState.daily_totals[date];
+            continue;
+        }
+        summaryState.meal_counts[date] = count;
+        const totals = summaryState.daily_totals[date] || (summaryState.daily_totals[date] = {});
+        for (const [nutrient, delta] of Object.entries(day.nutrients)) {
+            totals[nutrient] = (totals[nutrient] || 0) + delta;
+        }
+    }
+
+    const dates = Object.keys(summaryState.daily_totals).sort();
+    if (dates.length === 0) {
+        loadWeeklySummary();
+        return;
+    }
+    summaryState.period_days = dates.length;
+    summaryState.start_date = dates[0];
+    summaryState.end_date = dates[dates.length - 1];
+    for (const [nutrient, target] of Object.entries(summaryState.daily_targets)) {
+        const total = dates.reduce((sum, date) => sum + (summaryState.daily_totals[date][nutrient] || 0), 0);
+        const average = total / dates.length;
+        summaryState.average_daily[nutrient] = Math.round(average * 100) / 100;
+        summaryState.fulfillment_rates[nutrient] = target > 0 ? Math.round(average / target * 1000) / 10 : 0;
+    }
+    displayWeeklySummary(summaryState);
+}
+
+function displayWeeklySummary(data) {
+    const infoDiv = document.getElementById('summaryInfo');
+    const contentDiv = document.getElementById('summaryContent');
+    const nutrientsListDiv = document.getElementById('nutrientsList');
+
+    // 期間情報
+    infoDiv.innerHTML = `
+        <p class="text-sm"><strong>${data.person_name}</strong> さんのデータ</p>
+        <p class="text-sm">期間: ${data.start_date} ～ ${data.end_date} (${data.period_days}日間)</p>
+    `;
+
+    // レーダーチャートを描画（主要栄養素のみ）
+    const mainNutrients = [
+        'エネルギー', 'たんぱく質', '脂質', '食物繊維総量', 
+        'カルシウム', '鉄', 'ビタミンA', 'ビタミンC'
+    ];
+
+    const radarData = {
+        labels: mainNutrients,
+        datasets: [{
+            label: '充足率 (%)',
+            data: mainNutrients.map(n => data.fulfillment_rates[n]),
+            backgroundColor: 'rgba(59, 130, 246, 0.2)',
+            borderColor: 'rgb(59, 130, 246)',
+            pointBackgroundColor: 'rgb(59, 130, 246)',
+            pointBorderColor: '#fff',
+            pointHoverBackgroundColor: '#fff',
+            pointHoverBorderColor: 'rgb(59, 130, 246)'
+        }, {
+            label: '目標 (100%)',
+            data: mainNutrients.map(() => 100),
+            backgroundColor: 'rgba(16, 185, 129, 0.1)',
+            borderColor: 'rgb(16, 185, 129)',
+            borderDash: [5, 5],
+            pointRadius: 0
+        }]
+    };
+
+    const ctx = document.getElementById('radarChart').getContext('2d');
+
+    // 既存のチャートを破棄
+    if (radarChartInstance) {
+        radarChartInstance.destroy();
+    }
+
+    radarChartInstance = new Chart(ctx, {
+        type: 'radar',
+        data: radarData,
+        options: {
+            responsive: true,
+            scales: {
+                r: {
+                    beginAtZero: true,
+                    max: 150,
+                    ticks: {
+                        stepSize: 50
+                    }
+                }
+            },
+            plugins: {
+                legend: {
+                    position: 'top',
+                }
+            }
+        }
+    });
+
+    // 全栄養素の詳細リスト
+    let html = '';
+    for (const [nutrient, target] of Object.entries(data.daily_targets)) {
+        const average = data.average_daily[nutrient];
+        const fulfillment = data.fulfillment_rates[nutrient];
+
+        let colorClass = 'fulfillment-low';
+        if (fulfillment >= 130) colorClass = 'fulfillment-high';
+        else if (fulfillment >= 100) colorClass = 'fulfillment-good';
+        else if (fulfillment >= 70) colorClass = 'fulfillment-medium';
+
+        html += `
+            <div class="border rounded-lg p-3">
+                <div class="flex justify-between items-center mb-2">
+                    <div>
+                        <span class="font-semibold text-gray-700">${nutrient}</span>
+                        <span class="text-sm text-gray-500 ml-2">
+                            平均 ${average.toFixed(1)} / 目標 ${target}
+                        </span>
+                    </div>
+                    <span class="text-lg font-bold ${fulfillment >= 100 ? 'text-green-600' : 'text-orange-600'}">
+                        ${fulfillment.toFixed(0)}%
+                    </span>
+                </div>
+                <div class="w-full bg-gray-200 rounded-full h-3">
+                    <div class="progress-bar ${colorClass} h-3 rounded-full" style="width: ${Math.min(fulfillment, 150)}%"></div>
+                </div>
+            </div>
+        `;
+    }
+
+    nutrientsListDiv.innerHTML = html;
+    contentDiv.classList.remove('hidden');
+}
+
+const historyRawInputs = {};
+let historyMeals = [];
+let historySince = '';
+
+async function loadMealHistory(personName) {
+    try {
+        const response = await fetch(`/api/meal-history/${encodeURIComponent(personName)}`);
+        const data = await response.json();
+
+        if (data.success) {
+            historyMeals = data.meals;
+            historySince = data.since;
+            renderMealHistory();
+        }
+    } catch (error) {
+        console.error('履歴取得エラー:', error);
+    }
+}
+
+function renderMealHistory() {
+    const historyDiv = document.getElementById('historyContent');
+    let html = '';
+
+    // 新しい順（日付・時刻の降順）
+    historyMeals.sort((a, b) => (b.meal_date + b.meal_time).localeCompare(a.meal_date + a.meal_time));
+
+    if (historyMeals.length === 0) {
+        html = '<p class="text-gray-500 text-sm">食事履歴がありません</p>';
+    } else {
+        for (const meal of historyMeals) {
+            historyRawInputs[meal.id] = meal.raw_input;
+            html += `
+                <div class="border rounded p-3 hover:bg-gray-50">
+                    <div class="flex justify-between items-start">
+                        <div class="flex-1">
+                            <span class="font-semibold text-sm">${meal.meal_date} ${meal.meal_time}</span>
+                            <p class="text-sm text-gray-600 mt-1">${meal.raw_input}</p>
+                        </div>
+                        <div class="flex gap-2 ml-4">
+                            <button 
+                                onclick="saveAsTemplate(${meal.id})"
+                                class="text-yellow-600 hover:text-yellow-800 text-sm px-2 py-1 rounded hover:bg-yellow-50"
+                                title="テンプレートに保存"
+                            >
+                                ⭐
+                            </button>
+                            <button 
+                                onclick="editMeal(${meal.id})"
+                                class="text-blue-600 hover:text-blue-800 text-sm px-2 py-1 rounded hover:bg-blue-50"
+                                title="編集"
+                            >
+                                ✏️
+                            </button>
+                            <button 
+                                onclick="deleteMeal(${meal.id})"
+                                class="text-red-600 hover:text-red-800 text-sm px-2 py-1 rounded hover:bg-red-50"
+                                title="削除"
+                            >
+                                🗑️
+                            </button>
+                        </div>
+                    </div>
+                </div>
+            `;
+        }
+    }
+
+    historyDiv.innerHTML = html;
+}
+
+async function editMeal(mealId) {
+    try {
+        const response = await fetch(`/api/meal/${mealId}`);
+        const data = await response.json();
+
+        if (data.success) {
+            currentEditMealId = mealId;
+            document.getElementById('editPersonName').value = data.meal.person_name;
+            document.getElementById('editMealDate').value = data.meal.meal_date;
+            document.getElementById('editMealTime').value = data.meal.meal_time;
+            document.getElementById('editFoodInput').value = data.meal.raw_input;
+            document.getElementById('editModal').classList.remove('hidden');
+            document.getElementById('editError').classList.add('hidden');
+        }
+    } catch (error) {
+        alert('食事データの取得に失敗しました');
+    }
+}
+
+function closeEditModal() {
+    document.getElementById('editModal').classList.add('hidden');
+    currentEditMealId = null;
+}
+
+async function saveEdit() {
+    const personName = document.getElementById('editPersonName').value.trim();
+    const mealDate = document.getElementById('editMealDate').value;
+    const mealTime = document.getElementById('editMealTime').value;
+    const foodInput = document.getElementById('editFoodInput').value.trim();
+
+    const errorDiv = document.getElementById('editError');
+    const loadingDiv = document.getElementById('editLoading');
+
+    errorDiv.classList.add('hidden');
+
+    if (!personName || !mealDate || !mealTime || !foodInput) {
+        errorDiv.textContent = '全ての項目を入力してください';
+        errorDiv.classList.remove('hidden');
+        return;
+    }
+
+    loadingDiv.classList.remove('hidden');
+
+    try {
+        const response = await fetch(`/api/meal/${currentEditMealId}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                person_name: personName,
+                meal_date: mealDate,
+                meal_time: mealTime,
+                food_input: foodInput
+            })
+        });
+
+        const data = await response.json();
+        loadingDiv.classList.add('hidden');
+
+        if (data.success) {
+            closeEditModal();
+            // 更新を反映
+            await showSummary(personName);
+            alert('食事を更新しました');
+        } else {
+            errorDiv.textContent = data.error;
+            errorDiv.classList.remove('hidden');
+        }
+    } catch (error) {
+        loadingDiv.classList.add('hidden');
+        errorDiv.textContent = 'エラー: ' + error.message;
+        errorDiv.classList.remove('hidden');
+    }
+}
+
+async function deleteMeal(mealId) {
+    if (!confirm('この食事を削除してもよろしいですか？')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/meal/${mealId}`, {
+            method: 'DELETE'
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            // 表示を更新
+            const personName = document.getElementById('summaryPersonName').value;
+            if (personName) {
+                await showSummary(personName);
+            }
+            alert('食事を削除しました');
+        } else {
+            alert('削除に失敗しました: ' + data.error);
+        }
+    } catch (error) {
+        alert('削除エラー: ' + error.message);
+    }
+}
+
+// Enterキーでログイン
+document.getElementById('passwordInput').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        login();
+    }
+});
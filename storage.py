@@ -0,0 +1,999 @@
+"""
+データの保存先（ストレージ）
+
+食事・食事項目・栄養素・テンプレート・ユーザー・人物・ジョブの読み書きを
+MealRepository にまとめ、保存先はバックエンドで切り替えます。
+
+- SQLiteBackend: 既定。ファイル1つ（':memory:' でテスト用のメモリ上DB）
+- PostgresBackend: DATABASE_URL=postgresql://... で有効。コネクションプールを使い、
+  複数のアプリノードで同じデータを共有できる（psycopg2が必要）
+
+SQLは '?' プレースホルダーで書き、PostgreSQLでは '%s' に変換して実行します。
+"""
+
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import threading
+
+# psycopg2はオプショナル（PostgreSQLを使う場合のみ必要）
+try:
+    import psycopg2
+    import psycopg2.pool
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+
+# 栄養素名とmeal_nutrientsテーブルの列名の対応
+NUTRIENT_COLUMNS = {
+    'エネルギー': 'energy', 'たんぱく質': 'protein', '脂質': 'fat', '食物繊維総量': 'fiber',
+    'カリウム': 'potassium', 'カルシウム': 'calcium', 'マグネシウム': 'magnesium', 'リン': 'phosphorus',
+    '鉄': 'iron', '亜鉛': 'zinc', '銅': 'copper', 'マンガン': 'manganese', 'ヨウ素': 'iodine',
+    'セレン': 'selenium', 'クロム': 'chromium', 'モリブデン': 'molybdenum', 'ビタミンA': 'vitamin_a',
+    'ビタミンD': 'vitamin_d', 'ビタミンE': 'vitamin_e', 'ビタミンK': 'vitamin_k', 'ビタミンB1': 'vitamin_b1',
+    'ビタミンB2': 'vitamin_b2', 'ナイアシン': 'niacin', 'ビタミンB6': 'vitamin_b6', 'ビタミンB12': 'vitamin_b12',
+    '葉酸': 'folate', 'パントテン酸': 'pantothenic_acid', 'ビオチン': 'biotin', 'ビタミンC': 'vitamin_c',
+    '食塩相当量': 'salt',
+}
+_NUTRIENT_COLUMN_LIST = ', '.join(NUTRIENT_COLUMNS.values())
+_NUTRIENT_SUMS = ', '.join(f'SUM(n.{column})' for column in NUTRIENT_COLUMNS.values())
+
+# 栄養素の集計の期間と、週・月の集計に保存する日ごとの合計のパーセンタイル
+ROLLUP_PERIODS = ('day', 'week', 'month')
+ROLLUP_PERCENTILES = (10, 50, 90)
+
+def rollup_start(period, day):
+    """日付（date）を含む期間の初日（週は月曜日始まり）"""
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_rollup_start(period, start):
+    """次の期間の初日"""
+    if period == 'week':
+        return start + datetime.timedelta(days=7)
+    if period == 'month':
+        return (start + datetime.timedelta(days=31)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+def summarize_days(day_rows):
+    """日の集計 [(食事数, 栄養素の合計...), ...] から (日数, 食事数, 栄養素の合計のリスト, パーセンタイルJSON) を作る
+
+    パーセンタイルは日ごとの合計を並べた線形補間（日数が同じなので補間の位置は全栄養素で共通）
+    """
+    columns = list(zip(*day_rows))
+    last = len(day_rows) - 1
+    positions = [(int(last * q / 100), last * q / 100 % 1) for q in ROLLUP_PERCENTILES]
+    sums, percentiles = [], []
+    for column in columns[1:]:
+        values = sorted(value or 0 for value in column)
+        sums.append(sum(values))
+        percentiles.append([round(values[lower] + (values[min(lower + 1, last)] - values[lower]) * fraction, 3)
+                            for lower, fraction in positions])
+    return len(day_rows), sum(columns[0]), sums, json.dumps(percentiles, separators=(',', ':'))
+
+# テーブル定義。{id} {real} は各バックエンドの型に置き換える
+TABLE_SCHEMAS = {
+    # ユーザー（世帯）
+    'users': '''(id {id},
+                 username TEXT NOT NULL UNIQUE,
+                 password_hash TEXT NOT NULL,
+                 is_admin INTEGER NOT NULL DEFAULT 0,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    # 人物（ユーザーごとに名前が一意）。versionは書き込みごとに進め、ノード間でキャッシュを無効化する
+    'persons': '''(id {id},
+                   user_id INTEGER NOT NULL REFERENCES users (id),
+                   name TEXT NOT NULL,
+                   version INTEGER NOT NULL DEFAULT 0,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   UNIQUE (user_id, name))''',
+    'meals': '''(id {id},
+                 person_id INTEGER NOT NULL REFERENCES persons (id),
+                 meal_date DATE NOT NULL,
+                 meal_time TIME NOT NULL,
+                 raw_input TEXT NOT NULL,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    # 食品データの100gあたりの栄養素（アプリが読み込んだ版に sync_foods で合わせる）。IDは名前ごとに固定
+    'foods': '(id {id}, name TEXT NOT NULL UNIQUE, '
+             + ', '.join(f'{column} {{real}}' for column in NUTRIENT_COLUMNS.values()) + ')',
+    # food_id は照合後の食品（食品データに無い食品はNULL）。食品ごとの集計に使う
+    'meal_items': '''(id {id},
+                      meal_id INTEGER NOT NULL REFERENCES meals (id),
+                      food_name TEXT NOT NULL,
+                      weight {real} NOT NULL,
+                      matched_food_name TEXT NOT NULL,
+                      food_id INTEGER REFERENCES foods (id))''',
+    'meal_nutrients': '(meal_id INTEGER PRIMARY KEY REFERENCES meals (id), '
+                      + ', '.join(f'{column} {{real}}' for column in NUTRIENT_COLUMNS.values()) + ')',
+    # 人物・期間（day / week / month）ごとの栄養素の合計。食事の書き込みと同じトランザクションで、
+    # 日の行には食事の栄養素を足し引きし、週・月の行は日の行から作り直す（アーカイブで食事を消しても残る）。
+    # days は記録のある日数。週・月の percentiles は日ごとの合計のパーセンタイルを栄養素の順に並べたJSON
+    'nutrient_rollups': '''(person_id INTEGER NOT NULL REFERENCES persons (id),
+                            period TEXT NOT NULL,
+                            start_date DATE NOT NULL,
+                            days INTEGER NOT NULL,
+                            meal_count INTEGER NOT NULL, '''
+                        + ', '.join(f'{column} {{real}}' for column in NUTRIENT_COLUMNS.values())
+                        + ''', percentiles TEXT,
+                            PRIMARY KEY (person_id, period, start_date))''',
+    # 食事テンプレート（照合済みの食品と栄養素の合計をJSONで保持）
+    'meal_templates': '''(id {id},
+                          person_id INTEGER NOT NULL REFERENCES persons (id),
+                          name TEXT NOT NULL,
+                          raw_input TEXT NOT NULL,
+                          items TEXT NOT NULL,
+                          nutrients TEXT NOT NULL,
+                          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    # バックグラウンドジョブ（status: pending → running → done / failed）。時刻はUNIX秒
+    # run_after: 再実行を待つジョブはこの時刻まで取り出さない（NULLならすぐ）
+    'jobs': '''(id {id},
+                kind TEXT NOT NULL,
+                user_id INTEGER,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at {real},
+                finished_at {real},
+                run_after {real})''',
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_meals_person_date ON meals (person_id, meal_date)',
+    'CREATE INDEX IF NOT EXISTS idx_meal_items_meal ON meal_items (meal_id)',
+    # 食品ごとの集計（/api/contributors）をテーブルを読まずに索引だけで行う
+    'CREATE INDEX IF NOT EXISTS idx_meal_items_meal_food ON meal_items (meal_id, food_id, weight)',
+    'CREATE INDEX IF NOT EXISTS idx_meal_templates_person ON meal_templates (person_id)',
+    'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)',
+]
+
+# バックアップで1回にコピーするページ数と、その間に他の接続へ譲る秒数
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+# PRAGMA optimize で統計を作るときに表ごとに読む行数の上限
+ANALYSIS_LIMIT = 1000
+
+class SQLiteBackend:
+    """SQLiteのバックエンド（操作ごとに接続を開く。':memory:' は1つの接続を使い回す）"""
+
+    name = 'sqlite'
+    shared = False
+    id_type = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    real_type = 'REAL'
+
+    def __init__(self, path):
+        self.path = path
+        self._memory_connection = None
+        self._memory_lock = threading.Lock()
+        if path == ':memory:':
+            self._memory_connection = sqlite3.connect(':memory:', check_same_thread=False)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """トランザクション1つ分の接続（正常終了でコミット、例外でロールバック）"""
+        if self._memory_connection is not None:
+            with self._memory_lock:
+                try:
+                    yield self._memory_connection
+                    self._memory_connection.commit()
+                except Exception:
+                    self._memory_connection.rollback()
+                    raise
+            return
+
+        conn = sqlite3.connect(self.path)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def insert(self, c, sql, params):
+        """INSERTを実行し、採番されたIDを返す"""
+        c.execute(sql, params)
+        return c.lastrowid
+
+    @contextlib.contextmanager
+    def _maintenance_connection(self):
+        """トランザクションを自動で開かない接続（VACUUM・PRAGMA用）"""
+        if self._memory_connection is not None:
+            with self._memory_lock:
+                self._memory_connection.commit()
+                yield self._memory_connection
+            return
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def backup(self, path, pages=BACKUP_STEP_PAGES):
+        """バックアップAPIで path に一貫したコピーを作る（書き込みを止めずに pages ページずつコピー）
+
+        コピー中に他の接続が書き込むと、SQLiteが次の手順で最初からコピーし直す。
+        一時ファイルにコピーして quick_check で確認してから path に置き換える
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        target = sqlite3.connect(tmp_path)
+        try:
+            with self._maintenance_connection() as source:
+                source.backup(target, pages=pages, sleep=BACKUP_STEP_SLEEP)
+            result = target.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise RuntimeError(f'バックアップの検査に失敗しました: {result}')
+        except Exception:
+            target.close()
+            os.remove(tmp_path)
+            raise
+        target.close()
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def compact(self, pages=None):
+        """空きページをファイルから返し、クエリプランナーの統計を更新する
+
+        auto_vacuum が INCREMENTAL でなければ最初の1回だけ VACUUM で切り替える。
+        以降は incremental_vacuum で pages ページずつ（Noneなら全て）返すので、書き込みを長く止めない。
+        統計は PRAGMA optimize（analysis_limit で表ごとに読む行数を制限）で必要な表だけ更新する
+        """
+        with self._maintenance_connection() as conn:
+            vacuumed = conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+            if vacuumed:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            # execute() では1ページ分しか実行されないため、最後まで実行する executescript() を使う
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages or 0)});')
+            remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+            conn.execute('PRAGMA optimize')
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        return {'vacuumed': vacuumed, 'freed_pages': free_pages - remaining, 'free_pages': remaining,
+                'size': page_size * page_count}
+
+    def close(self):
+        if self._memory_connection is not None:
+            self._memory_connection.close()
+
+class _PostgresCursor:
+    """'?' プレースホルダーを変換し、日付・時刻をSQLiteと同じ文字列で返すカーソル"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @staticmethod
+    def _convert(sql):
+        return sql.replace('?', '%s')
+
+    @staticmethod
+    def _normalize(row):
+        if row is None:
+            return None
+        values = []
+        for value in row:
+            if isinstance(value, datetime.datetime):
+                value = value.strftime('%Y-%m-%d %H:%M:%S')
+            elif isinstance(value, datetime.date):
+                value = value.isoformat()
+            elif isinstance(value, datetime.time):
+                value = value.strftime('%H:%M')
+            values.append(value)
+        return tuple(values)
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._convert(sql), params)
+        return self
+
+    def executemany(self, sql, params):
+        self._cursor.executemany(self._convert(sql), params)
+        return self
+
+    def fetchone(self):
+        return self._normalize(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._normalize(row) for row in self._cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+class _PostgresConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _PostgresCursor(self._conn.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+class PostgresBackend:
+    """PostgreSQLのバックエンド（スレッドセーフなコネクションプール）"""
+
+    name = 'postgresql'
+    shared = True
+    id_type = 'SERIAL PRIMARY KEY'
+    real_type = 'DOUBLE PRECISION'
+
+    def __init__(self, dsn, min_connections=1, max_connections=10):
+        if not PSYCOPG2_AVAILABLE:
+            raise RuntimeError('PostgreSQLを使うには psycopg2 をインストールしてください（pip install psycopg2-binary）')
+        self.pool = psycopg2.pool.ThreadedConnectionPool(min_connections, max_connections, dsn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.pool.getconn()
+        try:
+            yield _PostgresConnection(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def insert(self, c, sql, params):
+        c.execute(sql + ' RETURNING id', params)
+        return c.fetchone()[0]
+
+    def backup(self, path, pages=None):
+        raise RuntimeError('PostgreSQLのバックアップは pg_dump またはホスティング先のバックアップを使ってください')
+
+    def compact(self, pages=None):
+        raise RuntimeError('PostgreSQLの VACUUM / ANALYZE は autovacuum に任せてください')
+
+    def close(self):
+        self.pool.closeall()
+
+def open_backend(url, min_connections=1, max_connections=10):
+    """URL（postgresql://...）またはSQLiteのファイルパスからバックエンドを作る"""
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresBackend(url, min_connections, max_connections)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteBackend(url)
+
+class MealRepository:
+    """食事データの読み書き（SQLはすべてここに集める）"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @property
+    def shared(self):
+        """複数ノードで共有される保存先か（プロセス内キャッシュだけでは整合しない）"""
+        return self.backend.shared
+
+    def _schema(self, table):
+        return TABLE_SCHEMAS[table].format(id=self.backend.id_type, real=self.backend.real_type)
+
+    # ---- スキーマ ----
+
+    def init_schema(self, default_username, make_password_hash):
+        """テーブルを作成し、ユーザーがいなければ管理ユーザーを作る（パスワードのハッシュは必要な時だけ計算）"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            for table in ('users', 'persons'):
+                c.execute(f'CREATE TABLE IF NOT EXISTS {table} {self._schema(table)}')
+
+            c.execute('SELECT COUNT(*) FROM users')
+            if c.fetchone()[0] == 0:
+                c.execute('INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, 1)',
+                          (default_username, make_password_hash()))
+
+            if self.backend.name == 'sqlite':
+                self._migrate_sqlite(c)
+
+            for table in ('foods', 'meals', 'meal_items', 'meal_nutrients', 'nutrient_rollups', 'meal_templates', 'jobs'):
+                c.execute(f'CREATE TABLE IF NOT EXISTS {table} {self._schema(table)}')
+            if self.backend.name != 'sqlite':
+                c.execute('ALTER TABLE meal_items ADD COLUMN IF NOT EXISTS food_id INTEGER REFERENCES foods (id)')
+                c.execute(f'ALTER TABLE jobs ADD COLUMN IF NOT EXISTS run_after {self.backend.real_type}')
+            for index in INDEXES:
+                c.execute(index)
+
+            # 集計テーブルより前からある食事の集計を作る
+            c.execute('SELECT 1 FROM nutrient_rollups LIMIT 1')
+            if c.fetchone() is None:
+                self._rebuild_rollups(c)
+
+    def _migrate_sqlite(self, c):
+        """旧形式のSQLiteデータベースを現在のスキーマに合わせる
+
+        person_name列を持つmeals/meal_templatesは、管理ユーザーの人物IDを参照する形に作り直す。
+        """
+        c.execute('PRAGMA table_info(persons)')
+        if 'version' not in [row[1] for row in c.fetchall()]:
+            c.execute('ALTER TABLE persons ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+        c.execute('PRAGMA table_info(meal_items)')
+        columns = [row[1] for row in c.fetchall()]
+        if columns and 'food_id' not in columns:
+            # 既存の食事項目の food_id は sync_foods で埋める
+            c.execute('ALTER TABLE meal_items ADD COLUMN food_id INTEGER REFERENCES foods (id)')
+
+        c.execute('PRAGMA table_info(jobs)')
+        columns = [row[1] for row in c.fetchall()]
+        if columns and 'run_after' not in columns:
+            c.execute(f'ALTER TABLE jobs ADD COLUMN run_after {self.backend.real_type}')
+
+        c.execute('SELECT id FROM users WHERE is_admin = 1 ORDER BY id LIMIT 1')
+        owner_id = c.fetchone()[0]
+
+        for table in ('meals', 'meal_templates'):
+            c.execute(f'PRAGMA table_info({table})')
+            existing_columns = [row[1] for row in c.fetchall()]
+            if 'person_name' not in existing_columns:
+                continue
+            columns = [column for column in existing_columns if column not in ('id', 'person_name')]
+
+            # 新しいテーブルを作ってから入れ替える（他テーブルからの参照名を変えないため）
+            c.execute(f'''INSERT INTO persons (user_id, name)
+                          SELECT DISTINCT ?, person_name FROM {table} WHERE true
+                          ON CONFLICT (user_id, name) DO NOTHING''', (owner_id,))
+            c.execute(f'CREATE TABLE {table}_migrated {self._schema(table)}')
+            c.execute(f'''INSERT INTO {table}_migrated (id, person_id, {', '.join(columns)})
+                          SELECT t.id, p.id, {', '.join('t.' + column for column in columns)}
+                          FROM {table} t
+                          JOIN persons p ON p.user_id = ? AND p.name = t.person_name''', (owner_id,))
+            c.execute(f'DROP TABLE {table}')
+            c.execute(f'ALTER TABLE {table}_migrated RENAME TO {table}')
+
+    # ---- ユーザー ----
+
+    def find_user(self, username):
+        """(ユーザーID, パスワードハッシュ, 管理者か) を返す。いなければNone"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, password_hash, is_admin FROM users WHERE username = ?', (username,))
+            return c.fetchone()
+
+    def create_user(self, username, password_hash, is_admin=False):
+        with self.backend.connection() as conn:
+            return self.backend.insert(conn.cursor(),
+                                       'INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)',
+                                       (username, password_hash, int(is_admin)))
+
+    def set_password(self, username, password_hash):
+        """パスワードを変更し、変更できたかを返す"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('UPDATE users SET password_hash = ? WHERE username = ?', (password_hash, username))
+            return c.rowcount > 0
+
+    def list_users(self):
+        """[(ユーザーID, ユーザー名, 管理者か, 作成日時, 人物数), ...]"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT u.id, u.username, u.is_admin, u.created_at, COUNT(p.id)
+                         FROM users u LEFT JOIN persons p ON p.user_id = u.id
+                         GROUP BY u.id, u.username, u.is_admin, u.created_at
+                         ORDER BY u.id''')
+            return c.fetchall()
+
+    # ---- 人物 ----
+
+    def get_person_id(self, user_id, person_name, create=False):
+        """人物IDを返す（create=Trueなら無ければ作成、それ以外は無ければNone）"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            if create:
+                c.execute('''INSERT INTO persons (user_id, name) VALUES (?, ?)
+                             ON CONFLICT (user_id, name) DO NOTHING''', (user_id, person_name))
+            c.execute('SELECT id FROM persons WHERE user_id = ? AND name = ?', (user_id, person_name))
+            row = c.fetchone()
+            return row[0] if row else None
+
+    def list_person_names(self, user_id):
+        """食事が記録されている人物名の一覧"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT p.name FROM persons p
+                         WHERE p.user_id = ?
+                           AND EXISTS (SELECT 1 FROM meals m WHERE m.person_id = p.id)
+                         ORDER BY p.name''', (user_id,))
+            return [row[0] for row in c.fetchall()]
+
+    def person_version(self, person_id):
+        """人物のデータのバージョン（書き込みごとに増える）"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT version FROM persons WHERE id = ?', (person_id,))
+            row = c.fetchone()
+            return row[0] if row else 0
+
+    def _touch_persons(self, c, *person_ids):
+        for person_id in {person_id for person_id in person_ids if person_id}:
+            c.execute('UPDATE persons SET version = version + 1 WHERE id = ?', (person_id,))
+
+    # ---- 食事 ----
+
+    def _insert_meal(self, c, meal_id, person_id, meal_date, meal_time, raw_input, matched_items, total_nutrients):
+        if meal_id is None:
+            meal_id = self.backend.insert(c, '''INSERT INTO meals (person_id, meal_date, meal_time, raw_input)
+                                                VALUES (?, ?, ?, ?)''',
+                                          (person_id, meal_date, meal_time, raw_input))
+        else:
+            c.execute('''INSERT INTO meals (id, person_id, meal_date, meal_time, raw_input)
+                         VALUES (?, ?, ?, ?, ?)''',
+                      (meal_id, person_id, meal_date, meal_time, raw_input))
+
+        c.executemany('''INSERT INTO meal_items (meal_id, food_name, weight, matched_food_name, food_id)
+                         VALUES (?, ?, ?, ?, (SELECT id FROM foods WHERE name = ?))''',
+                      [(meal_id, item['input_name'], item['weight'], item['matched_name'], item['matched_name'])
+                       for item in matched_items])
+
+        placeholders = ', '.join('?' * (len(NUTRIENT_COLUMNS) + 1))
+        c.execute(f'INSERT INTO meal_nutrients (meal_id, {_NUTRIENT_COLUMN_LIST}) VALUES ({placeholders})',
+                  (meal_id, *(total_nutrients[jp_name] for jp_name in NUTRIENT_COLUMNS)))
+        return meal_id
+
+    def _delete_meal_rows(self, c, meal_id):
+        """食事を削除し、削除した食事の (人物ID, 日付) を返す（なければNone）"""
+        c.execute('SELECT person_id, meal_date FROM meals WHERE id = ?', (meal_id,))
+        day = c.fetchone()
+        c.execute('DELETE FROM meal_nutrients WHERE meal_id = ?', (meal_id,))
+        c.execute('DELETE FROM meal_items WHERE meal_id = ?', (meal_id,))
+        c.execute('DELETE FROM meals WHERE id = ?', (meal_id,))
+        return day
+
+    def create_meal(self, person_id, meal_date, meal_time, raw_input, matched_items, total_nutrients):
+        """食事・食事項目・栄養素を保存し、食事IDを返す"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            meal_id = self._insert_meal(c, None, person_id, meal_date, meal_time, raw_input,
+                                        matched_items, total_nutrients)
+            self._refresh_rollups(c, self._add_to_day_rollups(c, [meal_id]))
+            self._touch_persons(c, person_id)
+            return meal_id
+
+    def replace_meal(self, meal_id, previous_person_id, person_id, meal_date, meal_time, raw_input,
+                     matched_items, total_nutrients):
+        """同じIDのまま食事を置き換える"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            previous_days = self._add_to_day_rollups(c, [meal_id], sign=-1)
+            self._delete_meal_rows(c, meal_id)
+            self._insert_meal(c, meal_id, person_id, meal_date, meal_time, raw_input,
+                              matched_items, total_nutrients)
+            self._refresh_rollups(c, previous_days + self._add_to_day_rollups(c, [meal_id]))
+            self._touch_persons(c, previous_person_id, person_id)
+
+    def delete_meal(self, meal_id, person_id):
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            days = self._add_to_day_rollups(c, [meal_id], sign=-1)
+            self._delete_meal_rows(c, meal_id)
+            self._refresh_rollups(c, days)
+            self._touch_persons(c, person_id)
+
+    def copy_meal(self, source_meal_id, person_id, meal_date, meal_time):
+        """保存済みの食事を別の日時の食事として複製し、新しい食事IDを返す（元がなければNone）"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT raw_input FROM meals WHERE id = ?', (source_meal_id,))
+            row = c.fetchone()
+            if row is None:
+                return None
+            meal_id = self.backend.insert(c, '''INSERT INTO meals (person_id, meal_date, meal_time, raw_input)
+                                                VALUES (?, ?, ?, ?)''',
+                                          (person_id, meal_date, meal_time, row[0]))
+            c.execute('''INSERT INTO meal_items (meal_id, food_name, weight, matched_food_name, food_id)
+                         SELECT ?, food_name, weight, matched_food_name, food_id FROM meal_items WHERE meal_id = ?
+                         ORDER BY id''', (meal_id, source_meal_id))
+            c.execute(f'''INSERT INTO meal_nutrients (meal_id, {_NUTRIENT_COLUMN_LIST})
+                          SELECT ?, {_NUTRIENT_COLUMN_LIST} FROM meal_nutrients WHERE meal_id = ?''',
+                      (meal_id, source_meal_id))
+            self._refresh_rollups(c, self._add_to_day_rollups(c, [meal_id]))
+            self._touch_persons(c, person_id)
+            return meal_id
+
+    def get_owned_meal(self, user_id, meal_id):
+        """ユーザーの食事なら (人物ID, 人物名, 日付, 時刻, 入力) を返す。他のユーザーの食事や存在しない場合はNone"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT p.id, p.name, m.meal_date, m.meal_time, m.raw_input FROM meals m
+                         JOIN persons p ON p.id = m.person_id
+                         WHERE m.id = ? AND p.user_id = ?''', (meal_id, user_id))
+            return c.fetchone()
+
+    def load_meal_items(self, meal_id):
+        """保存済みの食事から (matched_items, total_nutrients) を読み込む。見つからなければ (None, None)"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT food_name, matched_food_name, weight FROM meal_items
+                         WHERE meal_id = ? ORDER BY id''', (meal_id,))
+            items = [{'input_name': row[0], 'matched_name': row[1], 'weight': row[2]} for row in c.fetchall()]
+
+            c.execute(f'SELECT {_NUTRIENT_COLUMN_LIST} FROM meal_nutrients WHERE meal_id = ?', (meal_id,))
+            row = c.fetchone()
+            if row is None:
+                return None, None
+            return items, {jp_name: value or 0 for jp_name, value in zip(NUTRIENT_COLUMNS, row)}
+
+    def meal_nutrient_rows(self, person_id, since):
+        """指定日以降の食事ごとの (日付, 時刻, 入力, 栄養素...) の一覧（栄養素はNUTRIENT_COLUMNSの順）"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT m.meal_date, m.meal_time, m.raw_input,
+                                 {', '.join('n.' + column for column in NUTRIENT_COLUMNS.values())}
+                          FROM meals m
+                          JOIN meal_nutrients n ON m.id = n.meal_id
+                          WHERE m.person_id = ? AND m.meal_date >= ?
+                          ORDER BY m.meal_date DESC, m.meal_time DESC''', (person_id, since))
+            return c.fetchall()
+
+    def meal_history(self, person_id, since):
+        """指定日以降の (食事ID, 日付, 時刻, 入力, 作成日時) の一覧"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT m.id, m.meal_date, m.meal_time, m.raw_input, m.created_at
+                         FROM meals m
+                         WHERE m.person_id = ? AND m.meal_date >= ?
+                         ORDER BY m.meal_date DESC, m.meal_time DESC''', (person_id, since))
+            return c.fetchall()
+
+    def recent_meals(self, person_id, limit):
+        """最近の食事（同じ入力は1件にまとめる）の (最新の食事ID, 入力, 回数, 最終日) の一覧"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT MAX(id), raw_input, COUNT(*), MAX(meal_date)
+                         FROM meals WHERE person_id = ?
+                         GROUP BY raw_input
+                         ORDER BY MAX(id) DESC
+                         LIMIT ?''', (person_id, limit))
+            return c.fetchall()
+
+    def logged_food_names(self, person_id):
+        """この人物が記録したことのある食品名（照合後の名前）の一覧"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT DISTINCT i.matched_food_name
+                         FROM meal_items i JOIN meals m ON i.meal_id = m.id
+                         WHERE m.person_id = ?
+                         ORDER BY i.matched_food_name''', (person_id,))
+            return [row[0] for row in c.fetchall()]
+
+    def food_contributions(self, person_id, since):
+        """since以降に記録した食品ごとの [(食品名, 合計の重さg, 栄養素の量...), ...]
+
+        重さは食品IDごとに集計し、栄養素の量は foods テーブル（現在の食品データ）の値から計算する
+        （栄養素は NUTRIENT_COLUMNS の順）。食品データに無い食品は含まない。
+        """
+        amounts = ', '.join(f'f.{column} * g.grams / 100' for column in NUTRIENT_COLUMNS.values())
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT f.name, g.grams, {amounts}
+                          FROM (SELECT i.food_id, SUM(i.weight) AS grams
+                                FROM meals m JOIN meal_items i ON i.meal_id = m.id
+                                WHERE m.person_id = ? AND m.meal_date >= ? AND i.food_id IS NOT NULL
+                                GROUP BY i.food_id) g
+                          JOIN foods f ON f.id = g.food_id''', (person_id, since))
+            return c.fetchall()
+
+    # ---- 食品データ ----
+
+    def sync_foods(self, food_vectors):
+        """{食品名: 100gあたりの栄養素のリスト} を foods テーブルに書き込む
+
+        新しい食品は追加し、既存の食品（同じ名前）は値を置き換える（IDは変わらない）。
+        food_id の無い食事項目のうち、食品データにある食品には food_id を埋め、その件数を返す。
+        """
+        placeholders = ', '.join('?' * (len(NUTRIENT_COLUMNS) + 1))
+        updates = ', '.join(f'{column} = excluded.{column}' for column in NUTRIENT_COLUMNS.values())
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.executemany(f'''INSERT INTO foods (name, {_NUTRIENT_COLUMN_LIST}) VALUES ({placeholders})
+                              ON CONFLICT (name) DO UPDATE SET {updates}''',
+                          [(name, *vector) for name, vector in food_vectors.items()])
+            c.execute('''UPDATE meal_items SET food_id = (SELECT id FROM foods WHERE name = meal_items.matched_food_name)
+                         WHERE food_id IS NULL
+                           AND matched_food_name IN (SELECT name FROM foods)''')
+            return c.rowcount
+
+    # ---- 栄養素の再計算（recompute_nutrients.py） ----
+
+    def count_meals(self, after_id=0):
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT COUNT(*) FROM meals WHERE id > ?', (after_id,))
+            return c.fetchone()[0]
+
+    def meal_chunk(self, after_id, limit):
+        """食事IDが after_id より大きい食事をID順に limit 件読む
+
+        [(食事ID, 人物ID, [(照合後の食品名, 重さ), ...], 保存済みの栄養素のタプルまたはNone), ...] を返す
+        （栄養素は NUTRIENT_COLUMNS の順）。
+        """
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, person_id FROM meals WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+            meals = c.fetchall()
+            if not meals:
+                return []
+            first_id, last_id = meals[0][0], meals[-1][0]
+
+            items = {}
+            c.execute('''SELECT meal_id, matched_food_name, weight FROM meal_items
+                         WHERE meal_id BETWEEN ? AND ? ORDER BY id''', (first_id, last_id))
+            for meal_id, matched_name, weight in c.fetchall():
+                items.setdefault(meal_id, []).append((matched_name, weight))
+
+            c.execute(f'''SELECT meal_id, {_NUTRIENT_COLUMN_LIST} FROM meal_nutrients
+                          WHERE meal_id BETWEEN ? AND ?''', (first_id, last_id))
+            nutrients = {row[0]: tuple(row[1:]) for row in c.fetchall()}
+        return [(meal_id, person_id, items.get(meal_id, []), nutrients.get(meal_id))
+                for meal_id, person_id in meals]
+
+    def update_meal_nutrients(self, rows, person_ids):
+        """[(食事ID, 栄養素の値...), ...] を1つのトランザクションで書き込み、人物のバージョンを進める"""
+        placeholders = ', '.join('?' * (len(NUTRIENT_COLUMNS) + 1))
+        updates = ', '.join(f'{column} = excluded.{column}' for column in NUTRIENT_COLUMNS.values())
+        meal_ids = [row[0] for row in rows]
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            days = self._add_to_day_rollups(c, meal_ids, sign=-1)
+            c.executemany(f'''INSERT INTO meal_nutrients (meal_id, {_NUTRIENT_COLUMN_LIST}) VALUES ({placeholders})
+                              ON CONFLICT (meal_id) DO UPDATE SET {updates}''', rows)
+            self._refresh_rollups(c, days + self._add_to_day_rollups(c, meal_ids))
+            self._touch_persons(c, *person_ids)
+
+    # ---- 栄養素の集計（日・週・月） ----
+
+    def _add_to_day_rollups(self, c, meal_ids, sign=1):
+        """食事の栄養素を日の集計に足す（sign=-1 なら引く）。変わった [(人物ID, 日付), ...] を返す
+
+        日の行を食事から作り直すのではなく差分を足し引きするので、アーカイブで食事を削除した日に
+        食事を追加・修正・削除しても、アーカイブした食事の分の合計は失われない。食事数が0になった日の行は消す
+        """
+        meal_ids = set(meal_ids)
+        if not meal_ids:
+            return []
+        c.execute(f'''SELECT m.id, m.person_id, m.meal_date, {', '.join('n.' + column for column in NUTRIENT_COLUMNS.values())}
+                      FROM meals m JOIN meal_nutrients n ON n.meal_id = m.id
+                      WHERE m.id BETWEEN ? AND ?''', (min(meal_ids), max(meal_ids)))
+        deltas = {}
+        for row in c.fetchall():
+            if row[0] not in meal_ids:
+                continue
+            key = (row[1], str(row[2]))
+            count, sums = deltas.get(key, (0, [0.0] * len(NUTRIENT_COLUMNS)))
+            deltas[key] = (count + sign, [total + sign * (value or 0) for total, value in zip(sums, row[3:])])
+
+        placeholders = ', '.join('?' * (len(NUTRIENT_COLUMNS) + 1))
+        updates = ', '.join(f'{column} = COALESCE(nutrient_rollups.{column}, 0) + excluded.{column}'
+                            for column in NUTRIENT_COLUMNS.values())
+        c.executemany(f'''INSERT INTO nutrient_rollups (person_id, period, start_date, days, meal_count,
+                                                        {_NUTRIENT_COLUMN_LIST})
+                          VALUES (?, 'day', ?, 1, {placeholders})
+                          ON CONFLICT (person_id, period, start_date) DO UPDATE
+                          SET meal_count = nutrient_rollups.meal_count + excluded.meal_count, {updates}''',
+                      [(person_id, day, count, *sums) for (person_id, day), (count, sums) in deltas.items()])
+        c.executemany('''DELETE FROM nutrient_rollups
+                         WHERE person_id = ? AND period = 'day' AND start_date = ? AND meal_count <= 0''',
+                      list(deltas))
+        return list(deltas)
+
+    def _refresh_rollups(self, c, person_days):
+        """[(人物ID, 日付), ...] を含む週・月の集計を日の集計から作り直す"""
+        days = {(person_id, datetime.date.fromisoformat(str(meal_date))) for person_id, meal_date in person_days}
+        for period in ROLLUP_PERIODS[1:]:
+            for person_id, start in {(person_id, rollup_start(period, day)) for person_id, day in days}:
+                c.execute(f'''SELECT meal_count, {_NUTRIENT_COLUMN_LIST} FROM nutrient_rollups
+                              WHERE person_id = ? AND period = 'day' AND start_date >= ? AND start_date < ?''',
+                          (person_id, start.isoformat(), next_rollup_start(period, start).isoformat()))
+                day_rows = c.fetchall()
+                c.execute('DELETE FROM nutrient_rollups WHERE person_id = ? AND period = ? AND start_date = ?',
+                          (person_id, period, start.isoformat()))
+                if day_rows:
+                    self._insert_rollup(c, person_id, period, start, day_rows)
+
+    def _insert_rollup(self, c, person_id, period, start, day_rows):
+        num_days, meal_count, sums, percentiles = summarize_days(day_rows)
+        placeholders = ', '.join('?' * (len(NUTRIENT_COLUMNS) + 6))
+        c.execute(f'''INSERT INTO nutrient_rollups (person_id, period, start_date, days, meal_count,
+                                                    {_NUTRIENT_COLUMN_LIST}, percentiles)
+                      VALUES ({placeholders})''',
+                  (person_id, period, start.isoformat(), num_days, meal_count, *sums, percentiles))
+
+    def _rebuild_rollups(self, c):
+        """全人物の集計を食事から作り直す"""
+        c.execute('DELETE FROM nutrient_rollups')
+        c.execute(f'''INSERT INTO nutrient_rollups (person_id, period, start_date, days, meal_count,
+                                                    {_NUTRIENT_COLUMN_LIST})
+                      SELECT m.person_id, 'day', m.meal_date, 1, COUNT(*), {_NUTRIENT_SUMS}
+                      FROM meals m JOIN meal_nutrients n ON n.meal_id = m.id
+                      GROUP BY m.person_id, m.meal_date''')
+        c.execute(f'''SELECT person_id, start_date, meal_count, {_NUTRIENT_COLUMN_LIST} FROM nutrient_rollups
+                      WHERE period = 'day' ORDER BY person_id, start_date''')
+        day_rows = [(row[0], datetime.date.fromisoformat(str(row[1])), row[2:]) for row in c.fetchall()]
+        for period in ROLLUP_PERIODS[1:]:
+            for (person_id, start), rows in itertools.groupby(
+                    day_rows, key=lambda row: (row[0], rollup_start(period, row[1]))):
+                self._insert_rollup(c, person_id, period, start, [row[2] for row in rows])
+
+    def rollups(self, person_id, period, start, end):
+        """初日が start 以上 end 未満の集計を初日の順に返す
+
+        [(初日, 日数, 食事数, 栄養素の合計..., パーセンタイルJSON), ...]（栄養素は NUTRIENT_COLUMNS の順）
+        """
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT start_date, days, meal_count, {_NUTRIENT_COLUMN_LIST}, percentiles
+                          FROM nutrient_rollups
+                          WHERE person_id = ? AND period = ? AND start_date >= ? AND start_date < ?
+                          ORDER BY start_date''', (person_id, period, start, end))
+            return c.fetchall()
+
+    # ---- アーカイブ ----
+
+    def oldest_meal_date(self):
+        """最も古い食事の日付（食事がなければNone）"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT MIN(meal_date) FROM meals')
+            return c.fetchone()[0]
+
+    def export_meals(self, start, end):
+        """日付が start 以上 end 未満の食事を、人物・食事項目・栄養素とともにID順に返す"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT m.id, p.user_id, p.name, m.meal_date, m.meal_time, m.raw_input, m.created_at
+                         FROM meals m JOIN persons p ON p.id = m.person_id
+                         WHERE m.meal_date >= ? AND m.meal_date < ?
+                         ORDER BY m.id''', (start, end))
+            meals = [{'id': row[0], 'user_id': row[1], 'person_name': row[2], 'meal_date': row[3],
+                      'meal_time': row[4], 'raw_input': row[5], 'created_at': row[6], 'items': [],
+                      'nutrients': None} for row in c.fetchall()]
+            if not meals:
+                return []
+            by_id = {meal['id']: meal for meal in meals}
+
+            c.execute('''SELECT i.meal_id, i.food_name, i.matched_food_name, i.weight
+                         FROM meal_items i JOIN meals m ON m.id = i.meal_id
+                         WHERE m.meal_date >= ? AND m.meal_date < ?
+                         ORDER BY i.id''', (start, end))
+            for meal_id, input_name, matched_name, weight in c.fetchall():
+                by_id[meal_id]['items'].append({'input_name': input_name, 'matched_name': matched_name,
+                                                'weight': weight})
+
+            c.execute(f'''SELECT n.meal_id, {', '.join('n.' + column for column in NUTRIENT_COLUMNS.values())}
+                          FROM meal_nutrients n JOIN meals m ON m.id = n.meal_id
+                          WHERE m.meal_date >= ? AND m.meal_date < ?''', (start, end))
+            for row in c.fetchall():
+                by_id[row[0]]['nutrients'] = {jp_name: value or 0 for jp_name, value in zip(NUTRIENT_COLUMNS, row[1:])}
+        return meals
+
+    def purge_meals(self, meal_ids, batch_size=500):
+        """アーカイブした食事を1つのトランザクションで削除し、人物のバージョンを進める（人物IDの集合を返す）
+
+        日・週・月の集計（nutrient_rollups）は残すので、アーカイブした期間の推移も引き続き返せる
+        """
+        meal_ids = list(meal_ids)
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            person_ids = set()
+            for i in range(0, len(meal_ids), batch_size):
+                batch = meal_ids[i:i + batch_size]
+                placeholders = ', '.join('?' * len(batch))
+                c.execute(f'SELECT DISTINCT person_id FROM meals WHERE id IN ({placeholders})', batch)
+                person_ids.update(row[0] for row in c.fetchall())
+                c.execute(f'DELETE FROM meal_nutrients WHERE meal_id IN ({placeholders})', batch)
+                c.execute(f'DELETE FROM meal_items WHERE meal_id IN ({placeholders})', batch)
+                c.execute(f'DELETE FROM meals WHERE id IN ({placeholders})', batch)
+            self._touch_persons(c, *person_ids)
+        return person_ids
+
+    # ---- 食事テンプレート ----
+
+    def list_templates(self, person_id):
+        """[(テンプレートID, 名前, 入力, 栄養素JSON), ...]"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT id, name, raw_input, nutrients FROM meal_templates
+                         WHERE person_id = ? ORDER BY name''', (person_id,))
+            return c.fetchall()
+
+    def create_template(self, person_id, name, raw_input, items_json, nutrients_json):
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            template_id = self.backend.insert(c, '''INSERT INTO meal_templates
+                                                    (person_id, name, raw_input, items, nutrients)
+                                                    VALUES (?, ?, ?, ?, ?)''',
+                                              (person_id, name, raw_input, items_json, nutrients_json))
+            self._touch_persons(c, person_id)
+            return template_id
+
+    def get_owned_template(self, user_id, template_id):
+        """ユーザーのテンプレートなら (人物ID, 入力, 食品JSON, 栄養素JSON) を返す"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT t.person_id, t.raw_input, t.items, t.nutrients FROM meal_templates t
+                         JOIN persons p ON p.id = t.person_id
+                         WHERE t.id = ? AND p.user_id = ?''', (template_id, user_id))
+            return c.fetchone()
+
+    def delete_template(self, template_id, person_id):
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('DELETE FROM meal_templates WHERE id = ?', (template_id,))
+            self._touch_persons(c, person_id)
+
+    # ---- バックグラウンドジョブ ----
+
+    def enqueue_job(self, kind, user_id, payload_json):
+        with self.backend.connection() as conn:
+            return self.backend.insert(conn.cursor(),
+                                       'INSERT INTO jobs (kind, user_id, payload) VALUES (?, ?, ?)',
+                                       (kind, user_id, payload_json))
+
+    def claim_job(self, now):
+        """最も古い待ちジョブを実行中にして (ジョブID, 種類, ユーザーID, ペイロードJSON, 試行回数) を返す
+
+        複数のワーカーが同時に取り出しても、状態を条件にした UPDATE で1つだけが取得する。
+        再実行の待ち時間（run_after）が now を過ぎていないジョブは取り出さない。
+        """
+        while True:
+            with self.backend.connection() as conn:
+                c = conn.cursor()
+                c.execute("SELECT id, kind, user_id, payload, attempts FROM jobs WHERE status = 'pending' "
+                          "AND (run_after IS NULL OR run_after <= ?) ORDER BY id LIMIT 1", (now,))
+                row = c.fetchone()
+                if row is None:
+                    return None
+                c.execute("""UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?
+                             WHERE id = ? AND status = 'pending'""", (now, row[0]))
+                if c.rowcount == 1:
+                    return row[:4] + (row[4] + 1,)
+
+    def finish_job(self, job_id, result_json, now):
+        with self.backend.connection() as conn:
+            conn.cursor().execute("""UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?
+                                     WHERE id = ?""", (result_json, now, job_id))
+
+    def fail_job(self, job_id, error, now, retry=False, run_after=None):
+        """ジョブを失敗にする（retry=Trueなら待ちに戻し、run_after の時刻以降に再実行させる）"""
+        with self.backend.connection() as conn:
+            conn.cursor().execute('UPDATE jobs SET status = ?, error = ?, finished_at = ?, run_after = ? WHERE id = ?',
+                                  ('pending' if retry else 'failed', error, None if retry else now,
+                                   run_after if retry else None, job_id))
+
+    def requeue_stale_jobs(self, started_before):
+        """実行中のまま止まったジョブ（ワーカーの強制終了など）を待ちに戻し、件数を返す"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running' AND started_at < ?",
+                      (started_before,))
+            return c.rowcount
+
+    def get_job(self, job_id, user_id=None):
+        """(種類, 状態, 結果JSON, エラー, 試行回数) を返す。user_idを指定すると他のユーザーのジョブはNone"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            sql = 'SELECT kind, status, result, error, attempts FROM jobs WHERE id = ?'
+            params = (job_id,)
+            if user_id is not None:
+                sql += ' AND user_id = ?'
+                params += (user_id,)
+            c.execute(sql, params)
+            return c.fetchone()
+
+    def count_jobs(self):
+        """{状態: 件数}"""
+        with self.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+            return dict(c.fetchall())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+静的ファイルの配信と圧縮のテストスクリプト
+"""
+
+import gzip
+import os
+import tempfile
+
+from werkzeug.datastructures import Accept
+from werkzeug.wrappers import Response
+
+from assets import BROTLI_AVAILABLE, AssetManifest, compress_body
+
+def test_manifest():
+    """内容のハッシュ付きの名前で引け、圧縮済みファイルがあればそれを返す"""
+    with tempfile.TemporaryDirectory() as static_dir:
+        with open(os.path.join(static_dir, 'app.js'), 'w', encoding='utf-8') as f:
+            f.write('console.log("食品");\n' * 100)
+        manifest = AssetManifest(static_dir)
+        hashed = manifest.url_name('app.js')
+        print(f"app.js → {hashed}")
+        assert hashed.startswith('app.') and hashed.endswith('.js') and hashed != 'app.js'
+        assert manifest.get('app.js') is None
+
+        data, mimetype, encoding = manifest.get(hashed)
+        assert mimetype.endswith('javascript') and encoding is None
+        compressed, _, encoding = manifest.get(hashed, 'gzip')
+        assert encoding == 'gzip' and gzip.decompress(compressed) == data
+
+        built = manifest.build()
+        assert hashed + '.gz' in built
+        assert (hashed + '.br' in built) == BROTLI_AVAILABLE
+        with open(os.path.join(manifest.dist_dir, hashed + '.gz'), 'rb') as f:
+            assert manifest.get(hashed, 'gzip')[0] == f.read()
+
+        # 内容が変わると名前も変わり、古い名前は引けない
+        with open(os.path.join(static_dir, 'app.js'), 'a', encoding='utf-8') as f:
+            f.write('// 変更\n')
+        manifest.reload()
+        assert manifest.url_name('app.js') != hashed
+        assert manifest.get(hashed) is None
+
+def test_compress_body():
+    """JSONは圧縮してETagを弱いETagに、小さいレスポンスや未対応のクライアントはそのまま"""
+    body = '{"エネルギー": 2700}' * 100
+    response = Response(body, mimetype='application/json')
+    response.set_etag('abc')
+    compress_body(response, Accept([('gzip', 1)]))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == ('abc', True)
+    assert gzip.decompress(response.get_data()).decode('utf-8') == body
+
+    plain = compress_body(Response(body, mimetype='application/json'), Accept([]))
+    assert 'Content-Encoding' not in plain.headers
+    small = compress_body(Response('{}', mimetype='application/json'), Accept([('gzip', 1)]))
+    assert 'Content-Encoding' not in small.headers
+    binary = compress_body(Response(body, mimetype='application/octet-stream'), Accept([('gzip', 1)]))
+    assert 'Content-Encoding' not in binary.headers
+
+if __name__ == '__main__':
+    test_manifest()
+    test_compress_body()
+    print("\n✅ 全てのテスト成功!")
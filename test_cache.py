@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+週間サマリー・食事履歴のレスポンスキャッシュ（ETag / If-None-Match）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import datetime
+
+import app
+from storage import NUTRIENT_COLUMNS
+from testutil import open_client
+
+def record(client, food_input, meal_time='12:00'):
+    response = client.post('/api/calculate', json={
+        'person_name': '太郎', 'meal_date': datetime.now().strftime('%Y-%m-%d'),
+        'meal_time': meal_time, 'food_input': food_input})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_not_modified():
+    """変更がなければ同じETagで304を返し、書き込み後は新しいETagで200を返す"""
+    with open_client() as client:
+        record(client, '納豆45g')
+        for path in ('/api/meal-history/太郎', '/api/weekly-summary/太郎'):
+            first = client.get(path)
+            assert first.status_code == 200 and first.headers['ETag']
+            assert first.headers['Cache-Control'] == 'private, no-cache'
+
+            cached = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+            assert cached.status_code == 304 and cached.get_data() == b''
+            assert cached.headers['ETag'] == first.headers['ETag']
+
+        etag = client.get('/api/meal-history/太郎').headers['ETag']
+        meal_id = record(client, 'ご飯150g', '19:00')['meal_id']
+        changed = client.get('/api/meal-history/太郎', headers={'If-None-Match': etag})
+        assert changed.status_code == 200 and changed.headers['ETag'] != etag
+        assert [meal['id'] for meal in changed.get_json()['meals']][0] == meal_id
+
+        # 削除でも無効化される
+        etag = changed.headers['ETag']
+        assert client.delete(f'/api/meal/{meal_id}').status_code == 200
+        deleted = client.get('/api/meal-history/太郎', headers={'If-None-Match': etag})
+        assert deleted.status_code == 200 and len(deleted.get_json()['meals']) == 1
+
+def test_variants():
+    """compact形式と通常形式は別のETag、データのない人物の404もキャッシュする"""
+    with open_client() as client:
+        record(client, '納豆45g')
+        full = client.get('/api/weekly-summary/太郎')
+        compact = client.get('/api/weekly-summary/太郎?format=compact')
+        assert full.headers['ETag'] != compact.headers['ETag']
+        assert compact.get_json()['format'] == 'compact'
+        assert client.get('/api/weekly-summary/太郎', headers={'If-None-Match': compact.headers['ETag']}).status_code == 200
+
+        missing = client.get('/api/weekly-summary/花子')
+        assert missing.status_code == 404
+        assert client.get('/api/weekly-summary/花子',
+                          headers={'If-None-Match': missing.headers['ETag']}).status_code == 304
+
+def test_external_write():
+    """別プロセス（recompute_nutrients.py など）がDBに書き込んだ変更でもキャッシュが無効になる"""
+    with open_client() as client:
+        meal_id = record(client, '納豆45g')['meal_id']
+        before = {path: client.get(path) for path in ('/api/meal-history/太郎', '/api/weekly-summary/太郎')}
+
+        # アプリを通さずに保存先へ直接書き込む（アプリ内のキャッシュには何も伝えない）
+        person_id = app.STORAGE.get_person_id(1, '太郎')
+        app.STORAGE.update_meal_nutrients([(meal_id, *[1.0] * len(NUTRIENT_COLUMNS))], [person_id])
+
+        for path, first in before.items():
+            response = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+            assert response.status_code == 200 and response.headers['ETag'] != first.headers['ETag']
+        summary = client.get('/api/weekly-summary/太郎').get_json()
+        assert all(day['エネルギー'] == 1.0 for day in summary['daily_totals'].values())
+
+if __name__ == '__main__':
+    test_not_modified()
+    test_variants()
+    test_external_write()
+    print("\n✅ 全てのテスト成功!")
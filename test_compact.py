@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+compact形式のレスポンスのテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import datetime
+
+import app
+from testutil import open_client
+
+def expand(payload, values):
+    """compact形式の配列を {栄養素名: 値} に戻す"""
+    return dict(zip(payload['nutrients'], values))
+
+def test_calculate():
+    """compact形式は通常形式と同じ値を配列で返す"""
+    with open_client() as client:
+        meal = {'person_name': '太郎', 'meal_date': datetime.now().strftime('%Y-%m-%d'),
+                'meal_time': '12:00', 'food_input': '納豆45g、ご飯150g'}
+        full = client.post('/api/calculate', json=meal).get_json()
+        compact = client.post('/api/calculate?format=compact', json=meal).get_json()
+        accepted = client.post('/api/calculate', json=meal,
+                               headers={'Accept': app.COMPACT_MIMETYPE}).get_json()
+
+        assert compact['format'] == 'compact' and accepted['format'] == 'compact'
+        assert 'format' not in full
+        assert compact['nutrients'] == list(app.DAILY_TARGETS)
+        assert expand(compact, compact['total_nutrients']) == full['total_nutrients']
+        for full_item, compact_item in zip(full['matched_items'], compact['matched_items']):
+            assert expand(compact, compact_item['nutrients']) == full_item['nutrients']
+
+def test_weekly_summary():
+    """週間サマリーは形式ごとに別のETagでキャッシュされる"""
+    with open_client() as client:
+        meal = {'person_name': '花子', 'meal_date': datetime.now().strftime('%Y-%m-%d'),
+                'meal_time': '08:00', 'food_input': '生卵60g'}
+        client.post('/api/calculate', json=meal)
+
+        full = client.get('/api/weekly-summary/花子')
+        compact = client.get('/api/weekly-summary/花子?format=compact')
+        print(f"通常形式: {len(full.get_data())} bytes, compact形式: {len(compact.get_data())} bytes")
+        assert full.headers['ETag'] != compact.headers['ETag']
+        assert 'Accept' in compact.headers['Vary']
+        assert len(compact.get_data()) < len(full.get_data())
+
+        full, compact = full.get_json(), compact.get_json()
+        assert expand(compact, compact['average_daily']) == full['average_daily']
+        assert expand(compact, compact['fulfillment_rates']) == full['fulfillment_rates']
+        assert expand(compact, compact['daily_targets']) == full['daily_targets']
+        for meal_date, totals in compact['daily_totals'].items():
+            assert expand(compact, totals) == full['daily_totals'][meal_date]
+
+        again = client.get('/api/weekly-summary/花子?format=compact')
+        assert again.get_json() == compact
+
+if __name__ == '__main__':
+    test_calculate()
+    test_weekly_summary()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+食品ごとの摂取量の集計（/api/contributors）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import datetime
+
+import app
+from testutil import open_client
+
+def record(client, person_name, food_input):
+    response = client.post('/api/calculate', json={
+        'person_name': person_name, 'meal_date': datetime.now().strftime('%Y-%m-%d'),
+        'meal_time': '12:00', 'food_input': food_input})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_contributors():
+    """記録した食品ごとの量を合計し、栄養素ごとに多い順に返す"""
+    with open_client() as client:
+        first = record(client, '太郎', '納豆45g、ご飯150g')
+        second = record(client, '太郎', '納豆45g、生卵60g')
+
+        response = client.get('/api/contributors/太郎?k=3')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['food_data_version'] == app.FOOD_DATA.version
+        assert set(data['contributors']) <= set(app.NUTRIENT_NAMES)
+
+        # 食事ごとの合計と一致する
+        energy = data['contributors']['エネルギー']
+        total = first['total_nutrients']['エネルギー'] + second['total_nutrients']['エネルギー']
+        assert abs(sum(row['amount'] for row in energy) - total) < 0.1
+        assert [row['amount'] for row in energy] == sorted((row['amount'] for row in energy), reverse=True)
+        assert abs(sum(row['share'] for row in energy) - 100) < 0.5
+
+        natto = next(item['matched_name'] for item in first['matched_items'] if item['input_name'] == '納豆')
+        assert {row['food_name']: row['weight'] for row in energy}[natto] == 90.0
+
+def test_single_nutrient():
+    with open_client() as client:
+        record(client, '花子', '納豆45g、ご飯150g、生卵60g')
+
+        data = client.get('/api/contributors/花子?nutrient=食塩相当量&k=1').get_json()
+        assert list(data['contributors']) == ['食塩相当量']
+        assert len(data['contributors']['食塩相当量']) == 1
+
+        assert client.get('/api/contributors/花子?nutrient=糖質').status_code == 400
+        assert client.get('/api/contributors/いない人').status_code == 404
+
+if __name__ == '__main__':
+    test_contributors()
+    test_single_nutrient()
+    print("\n✅ 全てのテスト成功!")
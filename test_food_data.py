@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+食品データの再読み込みのテストスクリプト
+
+一時ディレクトリに小さな食品データを書き出して実行します。
+"""
+
+import json
+import os
+import tempfile
+
+import app
+
+FOODS = [
+    {'食品名': '鶏卵　全卵　生', 'エネルギー': '142', 'たんぱく質': '12.2'},
+    {'食品名': 'だいず　［納豆類］　糸引き納豆', 'エネルギー': '184', 'たんぱく質': '16.5'},
+]
+
+def write_json(directory, filename, data):
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def test_snapshot():
+    """スナップショットは別名・索引・栄養素の行列をまとめて持つ"""
+    data = app.FoodData(FOODS, {'たまご': '鶏卵　全卵　生', 'なし': '存在しない食品'}, version='test')
+    assert data.aliases == {'たまご': '鶏卵　全卵　生'}
+    assert app.fuzzy_match_food_with_level('たまご', data.foods, data=data) == ('鶏卵　全卵　生', 1)
+    assert data.nutrient_vectors['鶏卵　全卵　生'][:2] == [142.0, 12.2]
+    assert data.search('納豆') == ('だいず　［納豆類］　糸引き納豆',)
+
+def test_reload():
+    """内容が変わったときだけ差し替え、古いスナップショットは使用中のリクエストにそのまま残る"""
+    original = app.FOOD_DATA
+    with tempfile.TemporaryDirectory() as directory:
+        write_json(directory, 'food_database.json', FOODS)
+        try:
+            app.FOOD_DATA = app.FoodData.load(directory)
+            old = app.FOOD_DATA
+            assert not app.reload_food_data(directory)
+            assert app.FOOD_DATA is old
+
+            write_json(directory, 'food_aliases.json', {'たまご': '鶏卵　全卵　生'})
+            assert app.reload_food_data(directory)
+            print(f"版: {old.version} → {app.FOOD_DATA.version}")
+            assert app.FOOD_DATA.version != old.version
+            assert app.FOOD_DATA.aliases == {'たまご': '鶏卵　全卵　生'}
+            assert old.aliases == {}
+
+            # 壊れたファイルは読み込まず、今のスナップショットを使い続ける
+            current = app.FOOD_DATA
+            with open(os.path.join(directory, 'food_aliases.json'), 'w', encoding='utf-8') as f:
+                f.write('{')
+            assert not app.reload_food_data(directory)
+            assert app.FOOD_DATA is current
+            assert app._food_data_status['last_error'].startswith('JSONDecodeError')
+        finally:
+            app.FOOD_DATA = original
+            app._food_data_status['last_error'] = None
+
+if __name__ == '__main__':
+    test_snapshot()
+    test_reload()
+    print("\n✅ 全てのテスト成功!")
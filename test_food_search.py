@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+食品名の入力補完（/api/foods/search）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from testutil import open_client
+
+def search(client, **params):
+    response = client.get('/api/foods/search', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()['foods']
+
+def test_reading_folding():
+    """ひらがな・カタカナを区別せずに引く"""
+    with open_client() as client:
+        foods = search(client, q='さんま')
+        print(f"さんま: {foods[:3]}")
+        assert foods and all('さんま' in name for name in foods)
+        assert search(client, q='サンマ') == foods
+        assert search(client, q='ニンジン') == search(client, q='にんじん')
+        assert search(client, q='ばなな')[0] == 'バナナ　生'
+
+def test_ranking():
+    """別名の完全一致 > 食品名のトークンの前方一致 > 部分一致"""
+    with open_client() as client:
+        assert search(client, q='ご飯')[0] == 'こめ　［水稲めし］　精白米　うるち米'
+
+        foods = search(client, q='にんじん', limit=50)
+        prefix = [i for i, name in enumerate(foods) if '　にんじん　' in name]
+        substring = [i for i, name in enumerate(foods) if '葉にんじん' in name or 'つるにんじん' in name]
+        assert prefix and substring and max(prefix) < min(substring)
+        # 先頭は別名「にんじん」の食品、あとの同順位は短い名前から
+        assert foods[0] == '（にんじん類）　にんじん　根　皮つき　生'
+        lengths = [len(foods[i]) for i in prefix[1:]]
+        assert lengths == sorted(lengths)
+
+def test_limit_and_empty_query():
+    """limit は1〜50に収め、q が空・空白だけ・無い場合は空の結果"""
+    with open_client() as client:
+        assert len(search(client, q='あ')) == 10
+        assert len(search(client, q='あ', limit=3)) == 3
+        assert len(search(client, q='あ', limit=500)) == 50
+        assert len(search(client, q='あ', limit=0)) == 1
+        assert len(search(client, q='あ', limit=-5)) == 1
+        assert len(search(client, q='あ', limit='abc')) == 10
+
+        for params in ({'q': ''}, {'q': '   '}, {}):
+            response = client.get('/api/foods/search', query_string=params)
+            assert response.get_json() == {'success': True, 'query': '', 'foods': []}
+
+def test_headers_and_auth():
+    """ブラウザで10分キャッシュさせ、未ログインなら401"""
+    with open_client() as client:
+        response = client.get('/api/foods/search?q=なす')
+        assert response.headers['Cache-Control'] == 'private, max-age=600'
+    with open_client(login=False) as client:
+        assert client.get('/api/foods/search?q=なす').status_code == 401
+
+if __name__ == '__main__':
+    test_reading_folding()
+    test_ranking()
+    test_limit_and_empty_query()
+    test_headers_and_auth()
+    print("\n✅ 全てのテスト成功!")
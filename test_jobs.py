@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+バックグラウンドジョブのテストスクリプト
+
+SQLiteのメモリ上DBを使い、外部サービスへの通信なしで実行できます。
+"""
+
+import os
+import threading
+
+import app
+import fake_ai
+from jobs import JobError, JobQueue
+from storage import MealRepository, SQLiteBackend
+from testutil import open_client
+
+def open_queue(**options):
+    storage = MealRepository(SQLiteBackend(':memory:'))
+    storage.init_schema('admin', lambda: 'hash')
+    return JobQueue(storage, **options)
+
+def test_run_pending():
+    """待ちジョブを古い順に実行し、結果・エラーを保存"""
+    queue = open_queue()
+    calls = []
+
+    @queue.handler('double')
+    def double(payload):
+        calls.append(payload['value'])
+        if payload['value'] < 0:
+            raise JobError('負の数は扱えません')
+        return {'value': payload['value'] * 2}
+
+    first = queue.enqueue('double', {'value': 2}, user_id=1)
+    second = queue.enqueue('double', {'value': -1}, user_id=1)
+    assert queue.storage.get_job(first) == ('double', 'pending', None, None, 0)
+
+    assert queue.run_pending() == 2
+    assert calls == [2, -1]
+    assert queue.storage.get_job(first) == ('double', 'done', '{"value": 4}', None, 1)
+    assert queue.storage.get_job(second) == ('double', 'failed', None, '負の数は扱えません', 1)
+    # 他のユーザーのジョブは見えない
+    assert queue.storage.get_job(first, user_id=2) is None
+    print(f"ジョブの件数: {queue.storage.count_jobs()}")
+
+def test_retry():
+    """想定外の例外は max_attempts 回まで再実行"""
+    queue = open_queue(max_attempts=3)
+    attempts = []
+
+    @queue.handler('flaky')
+    def flaky(payload):
+        attempts.append(1)
+        if len(attempts) < payload['succeed_on']:
+            raise ConnectionError('一時的なエラー')
+        return {}
+
+    recovered = queue.enqueue('flaky', {'succeed_on': 2})
+    assert queue.run_pending(now=100) == 1
+    assert queue.storage.get_job(recovered)[1] == 'pending'
+    # 再実行の待ち時間（1回目の失敗は1〜2秒）が過ぎるまでは取り出さない
+    assert queue.run_pending(now=100.9) == 0
+    assert queue.run_pending(now=102) == 1
+    assert queue.storage.get_job(recovered)[1:] == ('done', '{}', None, 2)
+
+    attempts.clear()
+    exhausted = queue.enqueue('flaky', {'succeed_on': 10})
+    assert [queue.run_pending(now=now) for now in (200, 202, 206, 300)] == [1, 1, 1, 0]
+    assert queue.storage.get_job(exhausted)[1] == 'failed'
+    assert queue.storage.get_job(exhausted)[3] == 'ConnectionError: 一時的なエラー'
+
+def test_backoff():
+    """再実行までの時間は倍々に延び（ジッター付き・上限あり）、Retry-After より短くしない"""
+    queue = open_queue(retry_delay=2, max_retry_delay=10)
+    for attempts, (low, high) in {1: (1, 2), 2: (2, 4), 3: (4, 8), 6: (5, 10)}.items():
+        delays = [queue.backoff(attempts) for _ in range(20)]
+        assert all(low <= delay <= high for delay in delays), (attempts, delays)
+
+    class RateLimited(Exception):
+        retry_after = 30
+    assert queue.backoff(1, RateLimited()) == 30
+
+    assert app.retry_after_seconds({'Retry-After': '5'}) == 5
+    assert 0 < app.retry_after_seconds({'Retry-After': 'Fri, 31 Dec 2100 23:59:59 GMT'})
+    assert app.retry_after_seconds({'Retry-After': 'soon'}) is None
+    assert app.retry_after_seconds({}) is None
+
+def test_workers():
+    """複数のワーカースレッドでも各ジョブは1回だけ実行される"""
+    queue = open_queue()
+    done = []
+    lock = threading.Lock()
+
+    @queue.handler('record')
+    def record(payload):
+        with lock:
+            done.append(payload['index'])
+        return {}
+
+    job_ids = [queue.enqueue('record', {'index': index}) for index in range(50)]
+    queue.start(4, poll_interval=0.01)
+    try:
+        for _ in range(500):
+            if queue.storage.count_jobs().get('done') == len(job_ids):
+                break
+            threading.Event().wait(0.01)
+    finally:
+        queue.stop()
+    assert sorted(done) == list(range(50))
+    assert queue.storage.count_jobs() == {'done': 50}
+
+def test_requeue_stale():
+    """実行中のまま止まったジョブはワーカーの起動時に待ちに戻す"""
+    queue = open_queue(stale_after=60)
+
+    @queue.handler('noop')
+    def noop(payload):
+        return {}
+
+    job_id = queue.enqueue('noop', {})
+    assert queue.storage.claim_job(now=0)[0] == job_id
+    assert queue.storage.requeue_stale_jobs(started_before=100) == 1
+    assert queue.run_pending() == 1
+    assert queue.storage.get_job(job_id)[1] == 'done'
+
+def test_ai_provider_errors():
+    """AI APIの一時的な失敗（5xx・429）は再実行し、照合できない食品は1回で失敗にする"""
+    stub = fake_ai.FakeAIServer(('127.0.0.1', 0), {name: fake_ai.provider_config(0, 0, failure_rate=1.0)
+                                                   for name in fake_ai.PROVIDERS}, seed=1)
+    stub.start()
+    original = (app.DEEPSEEK_BASE_URL, app.CLAUDE_API_KEY, app.ANTHROPIC_AVAILABLE, app.JOB_QUEUE.retry_delay,
+                os.environ.get('DEEPSEEK_API_KEY'))
+    try:
+        app.DEEPSEEK_BASE_URL = stub.url
+        app.CLAUDE_API_KEY = 'test'
+        app.ANTHROPIC_AVAILABLE = False
+        os.environ['DEEPSEEK_API_KEY'] = 'test'
+        with open_client() as client:
+            payload = {'person_id': app.STORAGE.get_person_id(1, '太郎', create=True), 'meal_date': '2024-01-01',
+                       'meal_time': '12:00', 'food_input': 'ぬめぬめ草100g'}
+
+            # 5xxが続けば、間を空けて max_attempts 回まで再実行してから失敗
+            exhausted = app.JOB_QUEUE.enqueue('record_meal', payload)
+            assert app.JOB_QUEUE.run_pending(now=100) == 1
+            assert app.JOB_QUEUE.storage.get_job(exhausted)[1] == 'pending'
+            assert app.JOB_QUEUE.run_pending(now=100.5) == 0
+            assert app.JOB_QUEUE.run_pending(now=110) + app.JOB_QUEUE.run_pending(now=120) == 2
+            assert app.JOB_QUEUE.storage.get_job(exhausted)[1:] == (
+                'failed', None, 'AIProviderError: DeepSeek API: HTTP 500', app.JOB_QUEUE.max_attempts)
+            # 同期の照合では「見つかりません」ではなく503を返す
+            response = client.post('/api/calculate', json={'person_name': '太郎', 'meal_date': '2024-01-01',
+                                                           'meal_time': '12:00', 'food_input': 'ぬめぬめ草100g'})
+            assert response.status_code == 503
+
+            # 429の後に回復すれば記録される
+            stub.providers['deepseek'] = fake_ai.provider_config(0, 0, rate_limit_rate=1.0)
+            app.JOB_QUEUE.retry_delay = 0.1
+            recovered = app.JOB_QUEUE.enqueue('record_meal', payload)
+            assert app.JOB_QUEUE.run_one(now=200)
+            assert app.JOB_QUEUE.storage.get_job(recovered)[1] == 'pending'
+            stub.providers['deepseek'] = fake_ai.provider_config(0, 0)
+            # バックオフ（0.1秒以下）より長いスタブの Retry-After（1秒）が過ぎるまでは取り出さない
+            assert app.JOB_QUEUE.run_pending(now=200.9) == 0
+            assert app.JOB_QUEUE.run_pending(now=210) == 1
+            assert app.JOB_QUEUE.storage.get_job(recovered)[1::3] == ('done', 2)
+
+            # AIが使えず照合できない食品は再実行しない
+            del os.environ['DEEPSEEK_API_KEY']
+            unmatched = app.JOB_QUEUE.enqueue('record_meal', payload)
+            assert app.JOB_QUEUE.run_pending(now=300) == 1
+            status, result, error, attempts = app.JOB_QUEUE.storage.get_job(unmatched)[1:]
+            assert status == 'failed' and attempts == 1 and 'ぬめぬめ草' in error
+    finally:
+        app.DEEPSEEK_BASE_URL, app.CLAUDE_API_KEY, app.ANTHROPIC_AVAILABLE, app.JOB_QUEUE.retry_delay = original[:4]
+        if original[4] is None:
+            os.environ.pop('DEEPSEEK_API_KEY', None)
+        else:
+            os.environ['DEEPSEEK_API_KEY'] = original[4]
+        stub.shutdown()
+        stub.server_close()
+
+if __name__ == '__main__':
+    test_run_pending()
+    test_retry()
+    test_backoff()
+    test_workers()
+    test_requeue_stale()
+    test_ai_provider_errors()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+負荷試験ツール（loadtest.py）とAI APIのスタブ（fake_ai.py）のテストスクリプト
+
+スタブはローカルのポートで起動するため、外部への通信なしで実行できます。
+"""
+
+import os
+import random
+
+import requests
+
+import app
+import fake_ai
+import loadtest
+
+PROMPT = """入力: ぬめぬめ草
+
+以下から最も適切な食品を1つ選んでください:
+こめ　［水稲めし］　精白米　うるち米
+鶏卵　全卵　生
+
+選んだ食品名のみを回答してください（他の説明は不要）。"""
+
+def start_stub(**config):
+    stub = fake_ai.FakeAIServer(('127.0.0.1', 0), {name: fake_ai.provider_config(0, 0, **config)
+                                                   for name in fake_ai.PROVIDERS}, seed=1)
+    stub.start()
+    return stub
+
+def stop_stub(stub):
+    stub.shutdown()
+    stub.server_close()
+
+def test_stub_formats():
+    """DeepSeek・Claudeそれぞれの応答形式で、プロンプトの最初の候補を返す"""
+    stub = start_stub()
+    try:
+        response = requests.post(f'{stub.url}/v1/chat/completions', headers={'Authorization': 'Bearer x'},
+                                 json={'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': PROMPT}]})
+        assert response.status_code == 200
+        assert response.json()['choices'][0]['message']['content'] == 'こめ　［水稲めし］　精白米　うるち米'
+
+        response = requests.post(f'{stub.url}/v1/messages', headers={'x-api-key': 'x'},
+                                 json={'model': 'claude', 'messages': [{'role': 'user', 'content': PROMPT}]})
+        assert response.status_code == 200
+        assert response.json()['content'][0] == {'type': 'text', 'text': 'こめ　［水稲めし］　精白米　うるち米'}
+
+        assert requests.post(f'{stub.url}/v1/messages', json={}).status_code == 401
+        stats = requests.get(f'{stub.url}/stats').json()['stats']
+        assert stats['deepseek']['requests'] == 1 and stats['claude']['requests'] == 1
+    finally:
+        stop_stub(stub)
+
+def test_stub_failures():
+    """failure_rate / rate_limit_rate の割合で500・429を返す"""
+    stub = start_stub(failure_rate=1.0)
+    try:
+        response = requests.post(f'{stub.url}/v1/chat/completions', headers={'Authorization': 'Bearer x'},
+                                 json={'messages': [{'role': 'user', 'content': PROMPT}]})
+        assert response.status_code == 500
+    finally:
+        stop_stub(stub)
+
+    stub = start_stub(rate_limit_rate=1.0)
+    try:
+        response = requests.post(f'{stub.url}/v1/messages', headers={'x-api-key': 'x'},
+                                 json={'messages': [{'role': 'user', 'content': PROMPT}]})
+        assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+        assert stub.stats['claude']['rate_limited'] == 1
+    finally:
+        stop_stub(stub)
+
+def test_app_uses_stub():
+    """DEEPSEEK_BASE_URL を向けると、アプリのAI照合がスタブを通る"""
+    stub = start_stub()
+    original = (app.DEEPSEEK_BASE_URL, os.environ.get('DEEPSEEK_API_KEY'))
+    try:
+        app.DEEPSEEK_BASE_URL = stub.url
+        os.environ['DEEPSEEK_API_KEY'] = 'loadtest'
+        assert app.match_food_with_deepseek('ぬめぬめ草', app.FOOD_DATA.foods) == app.FOOD_DATA.foods[0]['食品名']
+        assert stub.stats['deepseek']['requests'] == 1
+    finally:
+        app.DEEPSEEK_BASE_URL = original[0]
+        if original[1] is None:
+            os.environ.pop('DEEPSEEK_API_KEY', None)
+        else:
+            os.environ['DEEPSEEK_API_KEY'] = original[1]
+        stop_stub(stub)
+
+def test_diary_and_summary():
+    """合成した記録は再現でき、集計はエンドポイントごとのパーセンタイルになる"""
+    diary = loadtest.make_diary(random.Random(1), 2, 3, 0.5)
+    assert diary == loadtest.make_diary(random.Random(1), 2, 3, 0.5)
+    assert len(diary) == 6 and diary[0][0] < diary[-1][0]
+    items, unparsed = app.parse_food_input('、'.join(meal[2] for meal in diary))
+    assert unparsed == [] and len(items) >= 12
+    assert app.parse_food_input('、'.join(loadtest.FOODS))[1] == []
+
+    recorder = loadtest.Recorder()
+    recorder.samples['POST /api/calculate'] = [(float(i), (i + 1) / 1000, 200) for i in range(100)]
+    recorder.samples['GET /api/meal-history'] = [(0.0, 0.01, 500)]
+    results = recorder.summary()
+    assert list(results) == ['POST /api/calculate', 'GET /api/meal-history']
+    calculate = results['POST /api/calculate']
+    assert (calculate['p50'], calculate['p95'], calculate['p99']) == (50.5, 95.05, 99.01)
+    assert calculate['errors'] == 0 and results['GET /api/meal-history']['errors'] == 1
+
+    baseline = {'results': {'POST /api/calculate': {'p95': 50.0}}}
+    assert loadtest.compare(results, baseline, 0.2) == [('POST /api/calculate', 50.0, 95.05)]
+
+if __name__ == '__main__':
+    test_stub_formats()
+    test_stub_failures()
+    test_app_uses_stub()
+    test_diary_and_summary()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+バックアップ・アーカイブ・圧縮（maintenance.py、/api/admin/maintenance）のテストスクリプト
+
+一時ディレクトリのSQLiteファイルを使い、AI APIなしで実行できます。
+"""
+
+import datetime
+import os
+import sqlite3
+import tempfile
+
+import app
+import maintenance
+from storage import NUTRIENT_COLUMNS, MealRepository, SQLiteBackend
+
+ITEMS = [{'input_name': '納豆', 'matched_name': '糸引き納豆', 'weight': 45.0}]
+NUTRIENTS = {jp_name: 1.0 for jp_name in NUTRIENT_COLUMNS}
+
+def open_storage(tmp_dir):
+    storage = MealRepository(SQLiteBackend(os.path.join(tmp_dir, 'nutrition.db')))
+    storage.init_schema('admin', lambda: 'hash')
+    return storage
+
+def test_backup():
+    """バックアップはDBと同じ内容で、古いものから keep 個まで減らす"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = open_storage(tmp_dir)
+        person_id = storage.get_person_id(1, '太郎', create=True)
+        storage.create_meal(person_id, '2026-01-01', '12:00', '納豆', ITEMS, NUTRIENTS)
+
+        backup_dir = os.path.join(tmp_dir, 'backups')
+        for second in range(3):
+            result = maintenance.backup_database(storage, backup_dir, keep=2,
+                                                 now=datetime.datetime(2026, 1, 1, 0, 0, second))
+        assert result['removed'] == ['nutrition-20260101-000000.db']
+        assert [name for name, _size in maintenance.list_backups(backup_dir)] == [
+            'nutrition-20260101-000002.db', 'nutrition-20260101-000001.db']
+
+        copy = MealRepository(SQLiteBackend(result['path']))
+        assert copy.meal_history(person_id, '2026-01-01') == storage.meal_history(person_id, '2026-01-01')
+        assert not [name for name in os.listdir(backup_dir) if name.endswith('.tmp')]
+
+def test_archive():
+    """保存期間より前の月の食事を月ごとのファイルに移し、集計は残す"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = open_storage(tmp_dir)
+        person_id = storage.get_person_id(1, '太郎', create=True)
+        old = storage.create_meal(person_id, '2024-01-10', '12:00', '納豆', ITEMS, NUTRIENTS)
+        storage.create_meal(person_id, '2024-03-31', '12:00', '納豆', ITEMS, NUTRIENTS)
+        kept = storage.create_meal(person_id, '2025-12-01', '12:00', '納豆', ITEMS, NUTRIENTS)
+        archive_dir = os.path.join(tmp_dir, 'archive')
+
+        try:
+            maintenance.archive_meals(storage, 30, archive_dir)
+            assert False, '短い保存期間はエラー'
+        except ValueError:
+            pass
+
+        # 2026-05-01 の 400日前は 2025-03-27 → 2025-03-01 より前をアーカイブ
+        result = maintenance.archive_meals(storage, 400, archive_dir, today=datetime.date(2026, 5, 1))
+        assert result['before'] == '2025-03-01'
+        assert result['months'] == ['2024-01', '2024-03'] and result['meals'] == 2
+        assert result['person_ids'] == {person_id}
+        assert storage.oldest_meal_date() == '2025-12-01'
+        assert storage.load_meal_items(old) == (None, None)
+        assert storage.load_meal_items(kept)[0] == ITEMS
+
+        archived = maintenance.read_archive(os.path.join(archive_dir, 'meals-2024-01.jsonl.gz'))
+        assert [meal['id'] for meal in archived] == [old]
+        assert archived[0]['person_name'] == '太郎' and archived[0]['items'] == ITEMS
+        assert archived[0]['nutrients'] == NUTRIENTS
+
+        # 集計は残るので推移は引き続き返せる
+        assert [row[0] for row in storage.rollups(person_id, 'month', '2024-01-01', '2025-01-01')] == [
+            '2024-01-01', '2024-03-01']
+
+        # アーカイブした日に食事を追加・修正・削除しても、アーカイブした食事の分の合計は残る
+        def month_totals():
+            return [row[:4] for row in storage.rollups(person_id, 'month', '2024-01-01', '2024-02-01')]
+
+        added = storage.create_meal(person_id, '2024-01-10', '19:00', '納豆', ITEMS, NUTRIENTS)
+        assert month_totals() == [('2024-01-01', 1, 2, 2.0)]
+        storage.replace_meal(added, person_id, person_id, '2024-01-20', '19:00', '納豆', ITEMS,
+                             {jp_name: 3.0 for jp_name in NUTRIENT_COLUMNS})
+        assert month_totals() == [('2024-01-01', 2, 2, 4.0)]
+        removed = storage.create_meal(person_id, '2024-01-10', '20:00', '納豆', ITEMS, NUTRIENTS)
+        storage.delete_meal(removed, person_id)
+        assert month_totals() == [('2024-01-01', 2, 2, 4.0)]
+        assert [row[:4] for row in storage.rollups(person_id, 'day', '2024-01-01', '2024-02-01')] == [
+            ('2024-01-10', 1, 1, 1.0), ('2024-01-20', 1, 1, 3.0)]
+
+        # 同じ月に食事を追加して再度アーカイブすると1つのファイルにまとまり、集計は変わらない
+        maintenance.archive_meals(storage, 400, archive_dir, today=datetime.date(2026, 5, 1))
+        archived = maintenance.read_archive(os.path.join(archive_dir, 'meals-2024-01.jsonl.gz'))
+        assert [meal['id'] for meal in archived] == [old, added]
+        assert month_totals() == [('2024-01-01', 2, 2, 4.0)]
+
+def test_compact():
+    """初回は INCREMENTAL に切り替え、削除で空いたページを返す"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = open_storage(tmp_dir)
+        person_id = storage.get_person_id(1, '太郎', create=True)
+        meal_ids = [storage.create_meal(person_id, '2026-01-01', '12:00', '納豆' * 500, ITEMS, NUTRIENTS)
+                    for _ in range(200)]
+        assert storage.backend.compact()['vacuumed']
+
+        storage.purge_meals(meal_ids)
+        result = maintenance.compact_database(storage, pages=5)
+        assert not result['vacuumed']
+        assert result['freed_pages'] == 5 and result['free_pages'] > 0
+        result = maintenance.compact_database(storage)
+        assert result['free_pages'] == 0
+
+        conn = sqlite3.connect(storage.backend.path)
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        conn.close()
+
+def test_endpoint():
+    """管理ユーザーだけが実行でき、wait=1 なら結果を返す"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        original = (app.STORAGE, app.BACKUP_DIR, app.ARCHIVE_DIR)
+        try:
+            app.STORAGE = MealRepository(SQLiteBackend(os.path.join(tmp_dir, 'nutrition.db')))
+            app.init_db()
+            app.BACKUP_DIR = os.path.join(tmp_dir, 'backups')
+            app.ARCHIVE_DIR = os.path.join(tmp_dir, 'archive')
+            app._person_ids.clear()
+            client = app.app.test_client()
+            assert client.post('/api/admin/maintenance').status_code == 401
+            client.post('/api/login', json={'password': app.APP_PASSWORD})
+
+            assert client.post('/api/admin/maintenance', json={'tasks': ['drop']}).status_code == 400
+            assert client.post('/api/admin/maintenance', json={'retention_days': 10}).status_code == 400
+
+            response = client.post('/api/admin/maintenance?wait=1', json={'tasks': ['backup', 'compact']})
+            assert response.status_code == 200, response.get_json()
+            report = response.get_json()['report']
+            assert set(report) == {'backup', 'compact'}
+
+            data = client.get('/api/admin/maintenance').get_json()
+            assert len(data['backups']) == 1 and data['last_error'] is None
+        finally:
+            app.STORAGE, app.BACKUP_DIR, app.ARCHIVE_DIR = original
+
+if __name__ == '__main__':
+    test_backup()
+    test_archive()
+    test_compact()
+    test_endpoint()
+    print("\n✅ 全てのテスト成功!")
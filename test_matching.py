@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+食品名マッチング（fuzzy_match_food_with_level）のテストスクリプト
+
+food_database.json の食品データを使い、AI APIなしで実行できます。
+"""
+
+import os
+import tempfile
+
+import app
+
+def match(food_input):
+    return app.fuzzy_match_food_with_level(food_input, app.FOOD_DATA.foods)
+
+def test_surface_before_reading():
+    """部分一致では表記そのままの一致を読みだけの一致より優先し、長音記号は除かない"""
+    assert match('鶏')[0].startswith('鶏卵')
+    assert match('コーラ')[0] == '＜その他＞　（炭酸飲料類）　コーラ'
+    assert 'カレーパン' in match('カレー')[0]
+
+def test_kanji_kana_pairs():
+    """漢字・かなのどちらで入力しても、キーワードマッピングと同じ食品になる"""
+    pairs = [('大根', 'だいこん'), ('人参', 'にんじん'), ('醤油', 'しょうゆ'), ('味噌', 'みそ'),
+             ('秋刀魚', 'さんま'), ('ほうれん草', 'ほうれんそう')]
+    for kanji, kana in pairs:
+        assert match(kanji)[0] == match(kana)[0], (kanji, kana)
+    assert match('だいこん') == ('（だいこん類）　だいこん　根　皮つき　生', 2)
+    assert match('人参') == ('（にんじん類）　にんじん　根　皮つき　生', 2)
+    # 長音の表記ゆれは読みキーの完全一致で吸収する
+    assert match('ブロッコリ') == match('ブロッコリー')
+    # ひらがなの入力もカタカナの食品名に部分一致する
+    assert match('ばなな')[0] == match('バナナ')[0] == 'バナナ　生'
+
+def test_embedding_threshold():
+    """ベクトル検索（レベル5）は類似度の低い近傍を採用しない"""
+    if app.FOOD_DATA.embedding_index is None:
+        return
+    nearest = app.FOOD_DATA.embedding_index.search('オムライス', k=1)
+    assert nearest[0][0] == 'カレーライス' and nearest[0][1] < app.EMBEDDING_MIN_SCORE
+    assert match('オムライス') == (None, None)
+    assert match('ぶろっこりい') == ('ブロッコリー　花序　生', 5)
+
+def test_match_log():
+    """マッチングログは MATCH_LOG_PATH を指定したときだけ書く"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        original = (app.MATCH_LOG_PATH, app._match_log_file)
+        path = os.path.join(tmp_dir, 'match_log.tsv')
+        try:
+            app.MATCH_LOG_PATH, app._match_log_file = '', None
+            match('バナナ')
+            assert not os.path.exists(path)
+
+            app.MATCH_LOG_PATH = path
+            match('バナナ')
+            app._match_log_file.close()
+            with open(path, encoding='utf-8') as f:
+                fields = f.read().rstrip('\n').split('\t')
+            assert fields[1] == '3' and fields[3:] == ['バナナ', 'バナナ　生']
+        finally:
+            app.MATCH_LOG_PATH, app._match_log_file = original
+
+if __name__ == '__main__':
+    test_surface_before_reading()
+    test_kanji_kana_pairs()
+    test_embedding_threshold()
+    test_match_log()
+    print("\n✅ 全てのテスト成功!")
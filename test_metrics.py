@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+レイテンシ計測（/metrics、Server-Timing ヘッダー）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import datetime
+
+import app
+from testutil import open_client
+
+def test_disabled():
+    """METRICS_ENABLED=0 では /metrics は404で、Server-Timing も付けない"""
+    original = app.METRICS_ENABLED
+    try:
+        app.METRICS_ENABLED = False
+        with open_client() as client:
+            assert client.get('/metrics').status_code == 404
+            assert 'Server-Timing' not in client.get('/api/persons').headers
+    finally:
+        app.METRICS_ENABLED = original
+
+def test_server_timing_and_metrics():
+    """処理段階ごとの所要時間を Server-Timing で返し、/metrics のヒストグラムに積む"""
+    original = app.METRICS_ENABLED
+    try:
+        app.METRICS_ENABLED = True
+        with open_client() as client:
+            response = client.post('/api/calculate', json={
+                'person_name': '太郎', 'meal_date': datetime.now().strftime('%Y-%m-%d'),
+                'meal_time': '12:00', 'food_input': '納豆45g'})
+            assert response.status_code == 200
+            stages = dict(entry.split(';dur=') for entry in response.headers['Server-Timing'].split(', '))
+            assert {'parse', 'db_write', 'total'} <= set(stages)
+            assert any(stage.startswith('match_l') for stage in stages)
+            assert all(float(duration) >= 0 for duration in stages.values())
+
+            metrics = client.get('/metrics')
+            assert metrics.status_code == 200
+            assert metrics.mimetype == 'text/plain'
+            text = metrics.get_data(as_text=True)
+            assert '# TYPE nutrition_stage_duration_seconds histogram' in text
+            assert 'nutrition_stage_duration_seconds_count{stage="parse"}' in text
+            assert 'nutrition_request_duration_seconds_bucket{endpoint="calculate_nutrition",le="+Inf"}' in text
+    finally:
+        app.METRICS_ENABLED = original
+
+if __name__ == '__main__':
+    test_disabled()
+    test_server_timing_and_metrics()
+    print("\n✅ 全てのテスト成功!")
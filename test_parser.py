@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+食事入力パーサーのテストスクリプト
+"""
+
+from app import parse_food_input
+
+def test_units_and_portions():
+    """重量・容量・個数・量を表す言葉をグラムに換算"""
+    print("=" * 50)
+    print("単位の換算テスト")
+    print("=" * 50)
+
+    cases = [
+        ('納豆45g', '納豆', 45.0),
+        ('ご飯1杯', 'ご飯', 150.0),
+        ('卵2個', '卵', 100.0),
+        ('牛乳200ml', '牛乳', 206.0),
+        ('醤油小さじ1', '醤油', 6.0),
+        ('豆腐半丁', '豆腐', 150.0),
+        ('りんご1/2個', 'りんご', 125.0),
+        ('バナナ１本', 'バナナ', 100.0),
+        ('鶏卵　全卵　生 ６０ｇ', '鶏卵　全卵　生', 60.0),
+        ('塩少々', '塩', 0.5),
+    ]
+
+    for text, expected_name, expected_weight in cases:
+        parsed, unparsed = parse_food_input(text)
+        print(f"「{text}」 → {parsed}")
+        assert unparsed == []
+        assert parsed == [{'food_name': expected_name, 'weight': expected_weight}]
+
+def test_separators_and_unparsed():
+    """複数の区切り文字で分割し、読み取れない断片を報告"""
+    print("\n" + "=" * 50)
+    print("区切り文字テスト")
+    print("=" * 50)
+
+    text = '納豆45g、ご飯1杯,卵1個\nカレー；みそ汁1杯。卵2'
+    parsed, unparsed = parse_food_input(text)
+    print(f"パース結果: {parsed}")
+    print(f"読み取れなかった入力: {unparsed}")
+
+    assert [item['food_name'] for item in parsed] == ['納豆', 'ご飯', '卵', 'みそ汁']
+    assert unparsed == ['カレー', '卵2']
+
+def test_serving_sizes_and_notes():
+    """「大盛り」「半分」は1人分の倍率、量のあとの注記は読み飛ばし、それ以外の余計な語は読み取らない"""
+    cases = [
+        ('ご飯 大盛り', 'ご飯', 225.0),
+        ('ご飯小盛り', 'ご飯', 105.0),
+        ('りんご半分', 'りんご', 125.0),
+        ('ご飯150g 大盛り', 'ご飯', 150.0),
+        ('ご飯1杯 大盛り', 'ご飯', 150.0),
+        ('納豆45g（朝）', '納豆', 45.0),
+        ('ご飯1杯くらい', 'ご飯', 150.0),
+    ]
+    for text, expected_name, expected_weight in cases:
+        parsed, unparsed = parse_food_input(text)
+        print(f"「{text}」 → {parsed}")
+        assert unparsed == []
+        assert parsed == [{'food_name': expected_name, 'weight': expected_weight}]
+
+    # 1人分の重さがわからない食品、知らない注記は読み取れない断片として返す
+    for text in ('ぬめぬめ草大盛り', '納豆45g 朝食べた', 'ご飯大盛りと味噌汁'):
+        assert parse_food_input(text) == ([], [text])
+
+if __name__ == '__main__':
+    test_units_and_portions()
+    test_separators_and_unparsed()
+    test_serving_sizes_and_notes()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+献立の最適化（線形計画法）のテストスクリプト
+"""
+
+from planner import MealPlanner, PlanError
+
+NUTRIENTS = ['エネルギー', 'たんぱく質', 'ビタミンC', '食塩相当量']
+TARGETS = [2000, 60, 100, 7]
+FOODS = {
+    'ご飯': [156, 2.5, 0, 0],
+    '鶏むね肉': [120, 24, 0, 0.1],
+    'キウイ': [50, 1, 70, 0],
+    'サラダ油': [900, 0, 0, 0],
+    '梅干し': [30, 0.7, 0, 18],
+}
+
+def test_plan():
+    """全栄養素が範囲に収まる献立を求め、同じ条件の結果はキャッシュから返す"""
+    planner = MealPlanner(FOODS, NUTRIENTS, TARGETS, max_food_grams=600, max_food_energy=1000)
+    (foods, totals, deviation), cached = planner.plan()
+    print(f"献立: {foods}（偏差 {deviation:.4f}）")
+    assert not cached
+    assert deviation < 1e-6
+    assert 1800 - 1e-6 <= totals[0] <= 2200 + 1e-6
+    assert totals[1] >= 60 - 1e-6 and totals[2] >= 100 - 1e-6 and totals[3] <= 7 + 1e-6
+    assert all(0 < weight <= 600 for _name, weight in foods)
+
+    result, cached = planner.plan()
+    assert cached and result[0] == foods
+
+    # 10g単位
+    (foods, totals, deviation), _ = planner.plan(step=10)
+    assert all(weight % 10 == 0 for _name, weight in foods)
+
+def test_restricted():
+    """使える食品を限ると、範囲に収まらない分が偏差になる"""
+    planner = MealPlanner(FOODS, NUTRIENTS, TARGETS)
+    (foods, _totals, deviation), _ = planner.plan(['ご飯', '鶏むね肉', '存在しない食品'])
+    assert {name for name, _weight in foods} <= {'ご飯', '鶏むね肉'}
+    # ビタミンCは摂れない
+    assert deviation >= 1.0
+    try:
+        planner.plan(['存在しない食品'])
+        assert False, 'PlanErrorになるはず'
+    except PlanError:
+        pass
+
+if __name__ == '__main__':
+    test_plan()
+    test_restricted()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+リクエスト単位のプロファイリング（X-Profile、/api/admin/profiling、/api/admin/profiles）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+import marshal
+
+from werkzeug.security import generate_password_hash
+
+import app
+from testutil import open_client
+
+def test_header():
+    """管理ユーザーが X-Profile: 1 を付けたリクエストだけを計測する"""
+    with open_client() as client:
+        assert 'X-Profile-Id' not in client.get('/api/persons').headers
+        response = client.get('/api/persons', headers={'X-Profile': '1'})
+        profile_id = int(response.headers['X-Profile-Id'])
+
+        profiles = client.get('/api/admin/profiles').get_json()['profiles']
+        assert profiles[0]['id'] == profile_id and profiles[0]['path'] == '/api/persons'
+        assert 'data' not in profiles[0]
+
+        text = client.get(f'/api/admin/profiles/{profile_id}?limit=5')
+        assert text.status_code == 200 and 'function calls' in text.get_data(as_text=True)
+        raw = client.get(f'/api/admin/profiles/{profile_id}?format=pstats')
+        assert raw.mimetype == 'application/octet-stream' and marshal.loads(raw.get_data())
+        assert client.get(f'/api/admin/profiles/{profile_id}?sort=nope').status_code == 400
+        assert client.get('/api/admin/profiles/0').status_code == 404
+
+def test_toggle():
+    """トグルを有効にした間は全リクエストを計測し、管理ユーザー以外は操作できない"""
+    with open_client() as client:
+        try:
+            assert client.post('/api/admin/profiling', json={'enabled': True}).get_json()['enabled']
+            assert 'X-Profile-Id' in client.get('/api/persons').headers
+            # 管理APIそのものは計測しない
+            assert 'X-Profile-Id' not in client.get('/api/admin/profiling').headers
+            assert not client.post('/api/admin/profiling', json={'enabled': False}).get_json()['enabled']
+            assert 'X-Profile-Id' not in client.get('/api/persons').headers
+
+            app.STORAGE.create_user('family', generate_password_hash('secret'))
+            client.post('/api/login', json={'username': 'family', 'password': 'secret'})
+            assert client.post('/api/admin/profiling', json={'enabled': True}).status_code == 403
+            assert 'X-Profile-Id' not in client.get('/api/persons', headers={'X-Profile': '1'}).headers
+            client.post('/api/logout')
+            assert client.get('/api/admin/profiles').status_code == 401
+        finally:
+            app._profiling_enabled = False
+
+if __name__ == '__main__':
+    test_header()
+    test_toggle()
+    print("\n✅ 全てのテスト成功!")
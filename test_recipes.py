@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+料理（food_recipes.json）のテストスクリプト
+
+小さな食品データのスナップショットで実行します（AI APIなし）。
+"""
+
+import app
+
+FOODS = [
+    {'食品名': 'こめ　［水稲めし］　精白米　うるち米', 'エネルギー': '156', 'たんぱく質': '2.5', '食塩相当量': '0'},
+    {'食品名': '＜調味料類＞　（ルウ類）　カレールウ', 'エネルギー': '474', 'たんぱく質': '6.5', '食塩相当量': '10.6'},
+    {'食品名': '＜調味料類＞　（みそ類）　米みそ　淡色辛みそ', 'エネルギー': '182', 'たんぱく質': '12.5', '食塩相当量': '12.4'},
+]
+RECIPES = {
+    'カレーライス': {'ingredients': {'こめ　［水稲めし］　精白米　うるち米': 200, 'ルウ': 20}, 'weight': 400},
+    '味噌汁': {'ingredients': {'＜調味料類＞　（みそ類）　米みそ　淡色辛みそ': 12}, 'weight': 150,
+              'aliases': ['みそ汁']},
+    # 先に定義した料理を材料に使える
+    'カレーライス大盛り': {'ingredients': {'カレーライス': 600}},
+    '謎の料理': {'ingredients': {'存在しない食品': 10}},
+    'こめ　［水稲めし］　精白米　うるち米': {'ingredients': {'ルウ': 10}},
+}
+
+def open_data():
+    return app.FoodData(FOODS, {'ルウ': '＜調味料類＞　（ルウ類）　カレールウ'}, version='test', recipes=RECIPES)
+
+def test_expand():
+    """料理は材料の合計を出来上がりの重さの100gあたりにした食品になる"""
+    data = open_data()
+    assert data.recipe_weights == {'カレーライス': 400, '味噌汁': 150, 'カレーライス大盛り': 600}
+    assert len(data.recipe_errors) == 2
+
+    energy, protein = data.nutrient_vectors['カレーライス'][:2]
+    assert abs(energy - (156 * 2 + 474 * 0.2) / 4) < 1e-9
+    assert abs(protein - (2.5 * 2 + 6.5 * 0.2) / 4) < 1e-9
+    assert data.nutrient_vectors['カレーライス大盛り'] == data.nutrient_vectors['カレーライス']
+    assert data.by_name['カレーライス']['材料'] == {'こめ　［水稲めし］　精白米　うるち米': 200,
+                                                  '＜調味料類＞　（ルウ類）　カレールウ': 20}
+
+def test_match():
+    """料理は他の食品と同じ索引で照合・補完される"""
+    data = open_data()
+    assert app.fuzzy_match_food_with_level('カレーライス', data.foods, data=data) == ('カレーライス', 1)
+    assert app.fuzzy_match_food_with_level('みそ汁', data.foods, data=data) == ('味噌汁', 1)
+    assert app.fuzzy_match_food_with_level('かれーらいす', data.foods, data=data) == ('カレーライス', 2)
+    assert 'カレーライス' in data.search('カレー')
+
+def test_serving_units():
+    """「1皿」「1人前」は出来上がりの重さ（1人前）で換算する"""
+    original = app.FOOD_DATA
+    try:
+        app.FOOD_DATA = open_data()
+        items, unparsed = app.parse_food_input('カレーライス1皿、みそ汁半人前、ご飯1杯')
+        assert unparsed == []
+        assert [item['weight'] for item in items] == [400.0, 75.0, 150.0]
+
+        matched_items, total, error = app.calculate_meal_items(items[:1], use_ai=False)
+        assert error is None
+        assert matched_items[0]['matched_name'] == 'カレーライス'
+        assert abs(total[0] - (156 * 2 + 474 * 0.2)) < 1e-6
+
+        # 料理でない食品は「皿」で換算できない
+        assert app.parse_food_input('ルウ1皿')[1] == ['ルウ1皿']
+    finally:
+        app.FOOD_DATA = original
+
+def test_recipe_file():
+    """同梱の food_recipes.json の料理は全て展開できる"""
+    data = app.FoodData.load()
+    assert data.recipe_errors == []
+    assert {'カレーライス', '味噌汁'} <= set(data.recipe_weights)
+
+if __name__ == '__main__':
+    test_expand()
+    test_match()
+    test_serving_units()
+    test_recipe_file()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+不足栄養素を補う食品の提案のテストスクリプト
+"""
+
+from recommend import NutrientRecommender
+
+NUTRIENTS = ['エネルギー', 'たんぱく質', 'ビタミンC', '食塩相当量']
+TARGETS = [2000, 60, 100, 7]
+FOODS = {
+    '鶏むね肉': [120, 24, 0, 0.1],
+    'キウイ': [50, 1, 70, 0],
+    'ハム': [200, 16, 25, 2.5],
+    'サラダ油': [900, 0, 0, 0],
+    'アセロラ粉末': [400, 1, 1700, 0],
+}
+
+def test_recommend():
+    """不足している栄養素を埋める食品が上位になる"""
+    recommender = NutrientRecommender(FOODS, NUTRIENTS, TARGETS)
+    assert list(recommender.deficits([2100, 60, 20, 3])) == [0, 0, 80, 4]
+
+    # ビタミンCだけが不足
+    results = recommender.recommend([1500, 60, 20, 3], k=3)
+    print([(name, weight, round(score, 3)) for name, weight, score, _nutrients in results])
+    assert results[0][0] == 'キウイ'
+    # 1回分は100gまで、エネルギー250kcalまで
+    assert recommender.portions[list(FOODS).index('サラダ油')] == 250 / 900 * 100
+    # 少量で大きく摂りすぎる食品は下がる
+    assert [name for name, *_ in results] == ['キウイ', 'ハム', 'アセロラ粉末']
+
+    # たんぱく質も不足: 食塩の多いハムより鶏むね肉
+    names = [name for name, *_ in recommender.recommend([1500, 20, 20, 6.5], k=5)]
+    assert names.index('鶏むね肉') < names.index('ハム')
+
+    # 不足がなければ提案しない
+    assert recommender.recommend(TARGETS) == []
+
+if __name__ == '__main__':
+    test_recommend()
+    print("\n✅ 全てのテスト成功!")
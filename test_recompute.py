@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+保存済みの食事の栄養素の再計算（recompute_nutrients.py）のテストスクリプト
+
+SQLiteのメモリ上DBと小さな食品データで実行します。
+"""
+
+import os
+import tempfile
+
+from recompute_nutrients import recompute
+from storage import NUTRIENT_COLUMNS, MealRepository, SQLiteBackend
+
+NUM_NUTRIENTS = len(NUTRIENT_COLUMNS)
+# 100gあたりの値（全栄養素が同じ値）
+FOOD_VECTORS = {'納豆': [2.0] * NUM_NUTRIENTS, 'ご飯': [1.0] * NUM_NUTRIENTS}
+
+def open_storage(num_meals=10):
+    """食事ごとに納豆50g・ご飯100gを記録し、保存済みの合計は0にしておく"""
+    storage = MealRepository(SQLiteBackend(':memory:'))
+    storage.init_schema('admin', lambda: 'hash')
+    person_id = storage.get_person_id(1, '太郎', create=True)
+    items = [{'input_name': '納豆', 'matched_name': '納豆', 'weight': 50.0},
+             {'input_name': 'ご飯', 'matched_name': 'ご飯', 'weight': 100.0}]
+    zero = dict.fromkeys(NUTRIENT_COLUMNS, 0.0)
+    meal_ids = [storage.create_meal(person_id, '2026-01-01', '12:00', '納豆50g、ご飯100g', items, zero)
+                for _ in range(num_meals)]
+    return storage, person_id, meal_ids
+
+def totals(storage, meal_id):
+    return set(storage.load_meal_items(meal_id)[1].values())
+
+def test_recompute():
+    """変わった食事だけを書き換え、2回目は何も変わらない"""
+    for workers in (1, 2):
+        storage, person_id, meal_ids = open_storage()
+        # 1件は現在の食品データに無い食品、1件は既に正しい値
+        storage.create_meal(person_id, '2026-01-02', '08:00', '謎の食品', [
+            {'input_name': '謎の食品', 'matched_name': '謎の食品', 'weight': 10.0}], dict.fromkeys(NUTRIENT_COLUMNS, 5.0))
+        storage.update_meal_nutrients([(meal_ids[0], *[2.0] * NUM_NUTRIENTS)], {person_id})
+        version = storage.person_version(person_id)
+
+        stats = recompute(storage, FOOD_VECTORS, 'v1', chunk_size=3, workers=workers, checkpoint_path=None)
+        assert stats == {'processed': 11, 'changed': 9, 'skipped': 1, 'resumed': False}, stats
+        assert all(totals(storage, meal_id) == {2.0} for meal_id in meal_ids)
+        assert storage.person_version(person_id) > version
+
+        again = recompute(storage, FOOD_VECTORS, 'v1', workers=workers, checkpoint_path=None)
+        assert again['changed'] == 0
+
+def test_dry_run():
+    storage, _person_id, meal_ids = open_storage()
+    stats = recompute(storage, FOOD_VECTORS, 'v1', workers=1, dry_run=True)
+    assert stats['changed'] == len(meal_ids)
+    assert totals(storage, meal_ids[0]) == {0.0}
+
+def test_resume():
+    """中断してもチェックポイントから続きを処理し、食品データの版が変われば最初からやり直す"""
+    storage, _person_id, meal_ids = open_storage()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        checkpoint_path = os.path.join(tmp_dir, 'checkpoint.json')
+
+        def interrupt(processed, total, changed):
+            if processed >= 4:
+                raise KeyboardInterrupt
+
+        try:
+            recompute(storage, FOOD_VECTORS, 'v1', chunk_size=2, workers=1,
+                      checkpoint_path=checkpoint_path, progress=interrupt)
+        except KeyboardInterrupt:
+            pass
+        assert os.path.exists(checkpoint_path)
+        assert totals(storage, meal_ids[3]) == {2.0} and totals(storage, meal_ids[4]) == {0.0}
+
+        seen = []
+        stats = recompute(storage, FOOD_VECTORS, 'v1', chunk_size=2, workers=1, checkpoint_path=checkpoint_path,
+                          progress=lambda processed, total, changed: seen.append((processed, total)))
+        assert stats == {'processed': 10, 'changed': 10, 'skipped': 0, 'resumed': True}, stats
+        assert seen[0] == (6, 10)
+        assert all(totals(storage, meal_id) == {2.0} for meal_id in meal_ids)
+        assert not os.path.exists(checkpoint_path)
+
+        # 別の版のチェックポイントは使わない
+        try:
+            recompute(storage, FOOD_VECTORS, 'v1', chunk_size=2, workers=1,
+                      checkpoint_path=checkpoint_path, progress=interrupt)
+        except KeyboardInterrupt:
+            pass
+        stats = recompute(storage, FOOD_VECTORS, 'v2', workers=1, checkpoint_path=checkpoint_path)
+        assert not stats['resumed'] and stats['processed'] == 10
+
+if __name__ == '__main__':
+    test_recompute()
+    test_dry_run()
+    test_resume()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+ストレージ（MealRepository）のテストスクリプト
+
+SQLiteのメモリ上DBで実行します。TEST_DATABASE_URL=postgresql://... を
+指定すると、同じテストをPostgreSQLでも実行します（psycopg2が必要）。
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+
+from storage import (NUTRIENT_COLUMNS, PSYCOPG2_AVAILABLE, ROLLUP_PERIODS, MealRepository, SQLiteBackend,
+                     open_backend)
+
+ITEMS = [
+    {'input_name': '納豆', 'matched_name': '糸引き納豆', 'weight': 45.0},
+    {'input_name': 'ご飯', 'matched_name': 'こめ［水稲めし］　精白米　うるち米', 'weight': 150.0},
+]
+NUTRIENTS = {jp_name: float(index) for index, jp_name in enumerate(NUTRIENT_COLUMNS)}
+
+def open_repositories():
+    repositories = [MealRepository(SQLiteBackend(':memory:'))]
+    url = os.environ.get('TEST_DATABASE_URL')
+    if url and PSYCOPG2_AVAILABLE:
+        repository = MealRepository(open_backend(url))
+        with repository.backend.connection() as conn:
+            for table in ('meal_templates', 'nutrient_rollups', 'meal_nutrients', 'meal_items', 'foods', 'meals',
+                          'persons', 'users'):
+                conn.cursor().execute(f'DROP TABLE IF EXISTS {table}')
+        repositories.append(repository)
+    for repository in repositories:
+        repository.init_schema('admin', lambda: 'hash')
+    return repositories
+
+def check_users(storage):
+    assert [row[1] for row in storage.list_users()] == ['admin']
+    user_id = storage.create_user('suzuki', 'hash2')
+    assert storage.find_user('suzuki') == (user_id, 'hash2', 0)
+    assert storage.set_password('suzuki', 'hash3')
+    assert not storage.set_password('nobody', 'hash3')
+    assert storage.find_user('nobody') is None
+    return user_id
+
+def check_meals(storage, other_user_id):
+    person_id = storage.get_person_id(1, '太郎', create=True)
+    assert storage.get_person_id(1, '太郎', create=True) == person_id
+    assert storage.get_person_id(other_user_id, '太郎') is None
+    version = storage.person_version(person_id)
+
+    meal_id = storage.create_meal(person_id, '2026-01-01', '12:00', '納豆45g、ご飯1杯', ITEMS, NUTRIENTS)
+    assert storage.person_version(person_id) == version + 1
+    assert storage.list_person_names(1) == ['太郎']
+    assert storage.list_person_names(other_user_id) == []
+
+    # 他のユーザーからは見えない
+    assert storage.get_owned_meal(1, meal_id) == (person_id, '太郎', '2026-01-01', '12:00', '納豆45g、ご飯1杯')
+    assert storage.get_owned_meal(other_user_id, meal_id) is None
+
+    items, nutrients = storage.load_meal_items(meal_id)
+    assert items == ITEMS
+    assert nutrients == NUTRIENTS
+
+    assert storage.logged_food_names(person_id) == sorted(item['matched_name'] for item in ITEMS)
+    assert storage.logged_food_names(person_id + 1) == []
+
+    rows = storage.meal_nutrient_rows(person_id, '2026-01-01')
+    assert len(rows) == 1 and list(rows[0][3:]) == list(NUTRIENTS.values())
+    assert storage.meal_history(person_id, '2026-01-02') == []
+
+    copy_id = storage.copy_meal(meal_id, person_id, '2026-01-02', '08:00')
+    assert storage.load_meal_items(copy_id) == (ITEMS, NUTRIENTS)
+    assert storage.recent_meals(person_id, 10) == [(copy_id, '納豆45g、ご飯1杯', 2, '2026-01-02')]
+
+    storage.replace_meal(meal_id, person_id, person_id, '2026-01-03', '19:00', '納豆45g', ITEMS[:1], NUTRIENTS)
+    assert storage.get_owned_meal(1, meal_id)[2:] == ('2026-01-03', '19:00', '納豆45g')
+    assert storage.load_meal_items(meal_id)[0] == ITEMS[:1]
+
+    # 再計算用の読み込み・一括書き込み
+    assert storage.count_meals() == 2 and storage.count_meals(meal_id) == 1
+    chunk = storage.meal_chunk(0, 10)
+    assert [meal[:3] for meal in chunk] == [
+        (meal_id, person_id, [(ITEMS[0]['matched_name'], ITEMS[0]['weight'])]),
+        (copy_id, person_id, [(item['matched_name'], item['weight']) for item in ITEMS]),
+    ]
+    assert chunk[0][3] == tuple(NUTRIENTS.values())
+    assert [meal[0] for meal in storage.meal_chunk(meal_id, 10)] == [copy_id]
+    version = storage.person_version(person_id)
+    storage.update_meal_nutrients([(copy_id, *[1.0] * len(NUTRIENT_COLUMNS))], {person_id})
+    assert storage.person_version(person_id) == version + 1
+    assert set(storage.load_meal_items(copy_id)[1].values()) == {1.0}
+
+    storage.delete_meal(copy_id, person_id)
+    assert storage.load_meal_items(copy_id) == (None, None)
+    assert [row[0] for row in storage.meal_history(person_id, '2026-01-01')] == [meal_id]
+    return person_id
+
+def check_templates(storage, person_id, other_user_id):
+    template_id = storage.create_template(person_id, '朝食', '納豆45g', '[]', '{"エネルギー": 100}')
+    assert storage.list_templates(person_id) == [(template_id, '朝食', '納豆45g', '{"エネルギー": 100}')]
+    assert storage.get_owned_template(1, template_id) == (person_id, '納豆45g', '[]', '{"エネルギー": 100}')
+    assert storage.get_owned_template(other_user_id, template_id) is None
+    storage.delete_template(template_id, person_id)
+    assert storage.list_templates(person_id) == []
+
+def test_repository():
+    """どのバックエンドでも同じ結果になること"""
+    for storage in open_repositories():
+        print(f"バックエンド: {storage.backend.name}")
+        other_user_id = check_users(storage)
+        person_id = check_meals(storage, other_user_id)
+        check_templates(storage, person_id, other_user_id)
+        storage.backend.close()
+
+def test_rollback():
+    """例外が起きたトランザクションは書き込まれない"""
+    storage = MealRepository(SQLiteBackend(':memory:'))
+    storage.init_schema('admin', lambda: 'hash')
+    person_id = storage.get_person_id(1, '太郎', create=True)
+    try:
+        storage.create_meal(person_id, '2026-01-01', '12:00', '納豆', ITEMS, {})
+    except KeyError:
+        pass
+    assert storage.meal_history(person_id, '2026-01-01') == []
+    assert storage.person_version(person_id) == 0
+
+def test_food_contributions():
+    """食事項目は食品IDで集計し、foods テーブルにない食品は後から同期した時点で埋まる"""
+    storage = MealRepository(SQLiteBackend(':memory:'))
+    storage.init_schema('admin', lambda: 'hash')
+    storage.sync_foods({ITEMS[0]['matched_name']: [2.0] * len(NUTRIENT_COLUMNS)})
+    person_id = storage.get_person_id(1, '太郎', create=True)
+    meal_id = storage.create_meal(person_id, '2026-01-01', '12:00', '納豆45g、ご飯1杯', ITEMS, NUTRIENTS)
+    storage.copy_meal(meal_id, person_id, '2026-01-02', '08:00')
+
+    assert storage.food_contributions(person_id, '2026-01-01') == [
+        (ITEMS[0]['matched_name'], 90.0, *[1.8] * len(NUTRIENT_COLUMNS))]
+    assert storage.food_contributions(person_id, '2026-01-03') == []
+
+    # ご飯を追加し、納豆の値を修正する（食品IDは変わらない）
+    assert storage.sync_foods({ITEMS[0]['matched_name']: [1.0] * len(NUTRIENT_COLUMNS),
+                               ITEMS[1]['matched_name']: [0.5] * len(NUTRIENT_COLUMNS)}) == 2
+    rows = sorted(storage.food_contributions(person_id, '2026-01-01'))
+    assert [row[:3] for row in rows] == [(ITEMS[1]['matched_name'], 300.0, 1.5),
+                                         (ITEMS[0]['matched_name'], 90.0, 0.9)]
+
+def test_rollups():
+    """日・週・月の集計は食事の追加・修正・削除・再計算と同じ結果になり、集計の無いDBでは作り直される"""
+    storage = MealRepository(SQLiteBackend(':memory:'))
+    storage.init_schema('admin', lambda: 'hash')
+    person_id = storage.get_person_id(1, '太郎', create=True)
+    one = {jp_name: 1.0 for jp_name in NUTRIENT_COLUMNS}
+    # 2026-01-04 は日曜日、2026-01-05 は月曜日
+    first = storage.create_meal(person_id, '2026-01-04', '12:00', 'a', ITEMS, one)
+    storage.create_meal(person_id, '2026-01-04', '19:00', 'b', ITEMS, one)
+    moved = storage.create_meal(person_id, '2026-01-05', '08:00', 'c', ITEMS, one)
+    storage.copy_meal(first, person_id, '2026-02-01', '08:00')
+
+    def energy(period):
+        return [(row[0], row[1], row[2], row[3]) for row in storage.rollups(person_id, period, '2025-01-01', '2027-01-01')]
+
+    assert energy('day') == [('2026-01-04', 1, 2, 2.0), ('2026-01-05', 1, 1, 1.0), ('2026-02-01', 1, 1, 1.0)]
+    assert energy('week') == [('2025-12-29', 1, 2, 2.0), ('2026-01-05', 1, 1, 1.0), ('2026-01-26', 1, 1, 1.0)]
+    assert energy('month') == [('2026-01-01', 2, 3, 3.0), ('2026-02-01', 1, 1, 1.0)]
+    # 日ごとの合計（2.0, 1.0）の p10 / p50 / p90
+    assert json.loads(storage.rollups(person_id, 'month', '2026-01-01', '2026-01-02')[0][-1])[0] == [1.1, 1.5, 1.9]
+
+    storage.replace_meal(moved, person_id, person_id, '2026-01-04', '20:00', 'c', ITEMS, one)
+    storage.delete_meal(first, person_id)
+    storage.update_meal_nutrients([(moved, *[3.0] * len(NUTRIENT_COLUMNS))], {person_id})
+    assert energy('day') == [('2026-01-04', 1, 2, 4.0), ('2026-02-01', 1, 1, 1.0)]
+    assert energy('week') == [('2025-12-29', 1, 2, 4.0), ('2026-01-26', 1, 1, 1.0)]
+    assert energy('month') == [('2026-01-01', 1, 2, 4.0), ('2026-02-01', 1, 1, 1.0)]
+
+    expected = {period: storage.rollups(person_id, period, '2025-01-01', '2027-01-01') for period in ROLLUP_PERIODS}
+    with storage.backend.connection() as conn:
+        conn.cursor().execute('DELETE FROM nutrient_rollups')
+    storage.init_schema('admin', lambda: 'hash')
+    for period in ROLLUP_PERIODS:
+        assert storage.rollups(person_id, period, '2025-01-01', '2027-01-01') == expected[period]
+
+def test_migrate_food_id():
+    """food_id の無い旧形式の meal_items に列を追加する"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('''CREATE TABLE meal_items (id INTEGER PRIMARY KEY AUTOINCREMENT, meal_id INTEGER NOT NULL,
+                        food_name TEXT NOT NULL, weight REAL NOT NULL, matched_food_name TEXT NOT NULL)''')
+        conn.execute("INSERT INTO meal_items (meal_id, food_name, weight, matched_food_name) VALUES (1, '納豆', 45, '糸引き納豆')")
+        conn.commit()
+        conn.close()
+
+        storage = MealRepository(SQLiteBackend(path))
+        storage.init_schema('admin', lambda: 'hash')
+        assert storage.sync_foods({'糸引き納豆': [1.0] * len(NUTRIENT_COLUMNS)}) == 1
+        assert storage.sync_foods({'糸引き納豆': [1.0] * len(NUTRIENT_COLUMNS)}) == 0
+
+def test_migrate_legacy_schema():
+    """person_name 列の旧形式のDBを開くと、人物は管理ユーザーの下に移り、集計と food_id も作られる"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'legacy.db')
+        conn = sqlite3.connect(path)
+        # 複数ユーザー対応より前の init_db が作っていたテーブル
+        conn.execute('''CREATE TABLE meals (id INTEGER PRIMARY KEY AUTOINCREMENT, person_name TEXT NOT NULL,
+                        meal_date DATE NOT NULL, meal_time TIME NOT NULL, raw_input TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        conn.execute('''CREATE TABLE meal_items (id INTEGER PRIMARY KEY AUTOINCREMENT, meal_id INTEGER NOT NULL,
+                        food_name TEXT NOT NULL, weight REAL NOT NULL, matched_food_name TEXT NOT NULL,
+                        FOREIGN KEY (meal_id) REFERENCES meals (id))''')
+        conn.execute(f'''CREATE TABLE meal_nutrients (meal_id INTEGER PRIMARY KEY,
+                         {', '.join(column + ' REAL' for column in NUTRIENT_COLUMNS.values())},
+                         FOREIGN KEY (meal_id) REFERENCES meals (id))''')
+        for meal_id, person_name, meal_date in ((1, '太郎', '2026-01-04'), (2, '太郎', '2026-01-04'),
+                                                (3, '花子', '2026-01-05')):
+            conn.execute('INSERT INTO meals (id, person_name, meal_date, meal_time, raw_input) VALUES (?, ?, ?, ?, ?)',
+                         (meal_id, person_name, meal_date, '12:00', '納豆45g'))
+            conn.execute("INSERT INTO meal_items (meal_id, food_name, weight, matched_food_name) "
+                         "VALUES (?, '納豆', 45, '糸引き納豆')", (meal_id,))
+            conn.execute(f'INSERT INTO meal_nutrients VALUES (?, {", ".join("?" * len(NUTRIENT_COLUMNS))})',
+                         (meal_id, *[float(meal_id)] * len(NUTRIENT_COLUMNS)))
+        conn.commit()
+        conn.close()
+
+        storage = MealRepository(SQLiteBackend(path))
+        storage.init_schema('admin', lambda: 'hash')
+        storage.init_schema('admin', lambda: 'hash')
+        assert [row[1:3] for row in storage.list_users()] == [('admin', 1)]
+        assert storage.list_person_names(1) == ['太郎', '花子']
+        taro = storage.get_person_id(1, '太郎')
+        assert storage.get_owned_meal(1, 2) == (taro, '太郎', '2026-01-04', '12:00', '納豆45g')
+
+        other_user_id = storage.create_user('suzuki', 'hash2')
+        assert storage.list_person_names(other_user_id) == []
+        assert storage.get_owned_meal(other_user_id, 1) is None
+
+        rollups = storage.rollups(taro, 'day', '2026-01-01', '2026-02-01')
+        assert [(row[0], row[2], row[3]) for row in rollups] == [('2026-01-04', 2, 3.0)]
+        hanako = storage.get_person_id(1, '花子')
+        assert [row[3] for row in storage.rollups(hanako, 'month', '2026-01-01', '2026-02-01')] == [3.0]
+
+        assert storage.sync_foods({'糸引き納豆': [1.0] * len(NUTRIENT_COLUMNS)}) == 3
+        with storage.backend.connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT COUNT(*) FROM meal_items WHERE food_id IS NULL')
+            assert c.fetchone()[0] == 0
+
+if __name__ == '__main__':
+    test_repository()
+    test_rollback()
+    test_food_contributions()
+    test_rollups()
+    test_migrate_food_id()
+    test_migrate_legacy_schema()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+ライブ更新（Server-Sent Events）のテストスクリプト
+"""
+
+import json
+from datetime import datetime
+
+import app
+from testutil import open_client
+
+def test_meal_events():
+    """購読中のストリームに食事の行と日ごとの増減が届き、切断で購読が外れる"""
+    app.STREAM_KEEPALIVE = 0.05
+    person_id = -1
+    assert not app.has_stream_subscribers(person_id)
+
+    events = app.stream_person_events(person_id)
+    assert next(events) == 'retry: 3000\n\n'
+    assert app.has_stream_subscribers(person_id)
+    assert next(events) == ': keepalive\n\n'
+
+    meal = {'id': 1, 'meal_date': '2026-01-02', 'meal_time': '08:00', 'raw_input': '納豆45g'}
+    app.publish_meal_change(person_id, 'updated', meal,
+                            removed=('2026-01-01', {'エネルギー': 100.0}),
+                            added=('2026-01-02', {'エネルギー': 80.0}))
+    name, data = next(events).strip().split('\n')
+    change = json.loads(data[len('data: '):])
+    print(f"{name}: {change['action']} {change['days'].keys()}")
+
+    assert name == 'event: meal'
+    assert change['meal'] == meal
+    assert change['days']['2026-01-01']['meals'] == -1
+    assert change['days']['2026-01-01']['nutrients']['エネルギー'] == -100.0
+    assert change['days']['2026-01-02']['meals'] == 1
+    assert change['days']['2026-01-02']['nutrients']['エネルギー'] == 80.0
+
+    events.close()
+    assert not app.has_stream_subscribers(person_id)
+
+def test_unknown_person():
+    """記録のない人物の購読は404で、人物を作らない"""
+    with open_client() as client:
+        assert client.get('/api/stream/花子').status_code == 404
+        assert client.get('/api/stream/花子').status_code == 404
+        assert app.STORAGE.get_person_id(1, '花子') is None
+
+        client.post('/api/calculate', json={'person_name': '花子', 'meal_date': datetime.now().strftime('%Y-%m-%d'),
+                                            'meal_time': '12:00', 'food_input': '納豆45g'})
+        response = client.get('/api/stream/花子')
+        assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+        response.close()
+
+if __name__ == '__main__':
+    test_meal_events()
+    test_unknown_person()
+    print("\n✅ 全てのテスト成功!")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+食事テンプレート・最近の食事・クイック記録（/api/templates、/api/meal-shortcuts、/api/quick-log）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import datetime
+
+import app
+from testutil import open_client
+
+TODAY = datetime.now().strftime('%Y-%m-%d')
+
+def record(client, food_input, meal_time='12:00'):
+    response = client.post('/api/calculate', json={
+        'person_name': '太郎', 'meal_date': TODAY, 'meal_time': meal_time, 'food_input': food_input})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def history(client):
+    return client.get('/api/meal-history/太郎').get_json()['meals']
+
+def test_quick_log():
+    """テンプレート・最近の食事から、照合し直さずに同じ栄養素の食事を記録する"""
+    with open_client() as client:
+        meal = record(client, '納豆45g、ご飯150g')
+        energy = meal['total_nutrients']['エネルギー']
+
+        response = client.post('/api/templates', json={'person_name': '太郎', 'name': '朝ごはん',
+                                                       'meal_id': meal['meal_id']})
+        assert response.status_code == 200
+        template_id = response.get_json()['template_id']
+
+        shortcuts = client.get('/api/meal-shortcuts/太郎').get_json()
+        assert shortcuts['templates'] == [{'id': template_id, 'name': '朝ごはん',
+                                           'raw_input': '納豆45g、ご飯150g', 'energy': round(energy, 1)}]
+        assert shortcuts['recent'][0]['meal_id'] == meal['meal_id']
+
+        response = client.post('/api/quick-log', json={'person_name': '太郎', 'meal_date': TODAY,
+                                                       'meal_time': '19:00', 'template_id': template_id})
+        assert response.status_code == 200
+        from_template = response.get_json()['meal_id']
+        response = client.post('/api/quick-log', json={'person_name': '太郎', 'meal_date': TODAY,
+                                                       'meal_time': '21:00', 'meal_id': meal['meal_id']})
+        from_meal = response.get_json()['meal_id']
+
+        assert {row['id'] for row in history(client)} == {meal['meal_id'], from_template, from_meal}
+        original = app.STORAGE.load_meal_items(meal['meal_id'])
+        for meal_id in (from_template, from_meal):
+            assert client.get(f'/api/meal/{meal_id}').get_json()['meal']['raw_input'] == '納豆45g、ご飯150g'
+            assert app.STORAGE.load_meal_items(meal_id) == original
+
+        # 同じ入力は最近の食事で1件にまとまる
+        recent = client.get('/api/meal-shortcuts/太郎').get_json()['recent']
+        assert len(recent) == 1 and recent[0]['count'] == 3 and recent[0]['meal_id'] == from_meal
+
+def test_errors():
+    """項目の不足は400、存在しないテンプレートや食事は404"""
+    with open_client() as client:
+        meal = record(client, '納豆45g')
+        assert client.post('/api/templates', json={'person_name': '太郎', 'name': ''}).status_code == 400
+        assert client.post('/api/templates', json={'person_name': '太郎', 'name': 'x',
+                                                   'meal_id': 999}).status_code == 404
+        assert client.post('/api/quick-log', json={'person_name': '太郎', 'meal_date': TODAY,
+                                                   'meal_time': '12:00'}).status_code == 400
+        assert client.post('/api/quick-log', json={'person_name': '太郎', 'meal_date': TODAY, 'meal_time': '12:00',
+                                                   'template_id': 999}).status_code == 404
+
+        template_id = client.post('/api/templates', json={'person_name': '太郎', 'name': 'x',
+                                                          'meal_id': meal['meal_id']}).get_json()['template_id']
+        assert client.delete(f'/api/templates/{template_id}').status_code == 200
+        assert client.delete(f'/api/templates/{template_id}').status_code == 404
+        assert client.get('/api/meal-shortcuts/太郎').get_json()['templates'] == []
+
+if __name__ == '__main__':
+    test_quick_log()
+    test_errors()
+    print("\n✅ 全てのテスト成功!")
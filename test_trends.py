@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+栄養素の推移（/api/trends）のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import date
+
+import app
+from storage import NUTRIENT_COLUMNS
+from testutil import open_client
+
+ITEMS = [{'input_name': '納豆', 'matched_name': '糸引き納豆', 'weight': 45.0}]
+
+def record(person_id, meal_date, energy):
+    nutrients = {jp_name: 0.0 for jp_name in NUTRIENT_COLUMNS}
+    nutrients['エネルギー'] = energy
+    app.STORAGE.create_meal(person_id, meal_date, '12:00', '納豆', ITEMS, nutrients)
+
+def test_granularity():
+    """区間の数が points 以下になる集計の期間を選ぶ"""
+    assert app.trend_granularity(date(2026, 1, 1), date(2026, 1, 31), 31) == ('day', 1)
+    assert app.trend_granularity(date(2026, 1, 1), date(2026, 12, 31), 120) == ('week', 1)
+    assert app.trend_granularity(date(2026, 1, 1), date(2026, 12, 31), 12) == ('month', 1)
+    assert app.trend_granularity(date(2000, 1, 1), date(2026, 12, 31), 120) == ('month', 3)
+
+    buckets = app.trend_buckets('month', 3, date(2026, 1, 15), date(2026, 12, 31), 1)
+    assert [bucket[0] for bucket in buckets] == [date(2025, 10, 1), date(2026, 1, 1), date(2026, 4, 1),
+                                                 date(2026, 7, 1), date(2026, 10, 1)]
+
+def test_daily_series():
+    """日ごとの平均と、前の日を含む移動平均"""
+    with open_client() as client:
+        person_id = app.STORAGE.get_person_id(1, '太郎', create=True)
+        record(person_id, '2026-01-01', 100)
+        record(person_id, '2026-01-02', 200)
+        record(person_id, '2026-01-02', 100)
+        record(person_id, '2026-01-04', 600)
+
+        data = client.get('/api/trends/太郎?from=2026-01-02&to=2026-01-04&window=2&nutrients=エネルギー').get_json()
+        assert data['period'] == 'day'
+        assert [bucket['meal_count'] for bucket in data['buckets']] == [2, 0, 1]
+        energy = data['series']['エネルギー']
+        assert energy['average'] == [300.0, None, 600.0]
+        assert energy['rolling_average'] == [200.0, 300.0, 600.0]
+        assert list(data['series']) == ['エネルギー']
+
+def test_downsampled_series():
+    """長い期間は週・月の集計にまとめ、区間の数は points 以下になる"""
+    with open_client() as client:
+        person_id = app.STORAGE.get_person_id(1, '花子', create=True)
+        for month in range(1, 13):
+            for day, energy in ((1, 1000), (2, 2000), (3, 3000)):
+                record(person_id, f'2025-{month:02d}-{day:02d}', energy)
+
+        data = client.get('/api/trends/花子?from=2025-01-01&to=2025-12-31&points=12&window=1'
+                          '&nutrients=エネルギー').get_json()
+        assert data['period'] == 'month' and len(data['buckets']) == 12
+        energy = data['series']['エネルギー']
+        assert energy['average'] == [2000.0] * 12
+        assert energy['p10'] == [1200.0] * 12 and energy['p50'] == [2000.0] * 12
+
+        data = client.get('/api/trends/花子?from=2025-01-01&to=2025-12-31&points=4').get_json()
+        assert data['bucket_size'] == 3 and len(data['buckets']) == 4
+        assert [bucket['days'] for bucket in data['buckets']] == [9] * 4
+        assert set(data['series']) == set(app.NUTRIENT_NAMES)
+
+        data = client.get('/api/trends/花子?from=2025-01-01&to=2025-12-31&points=100').get_json()
+        assert data['period'] == 'week' and len(data['buckets']) <= 100
+
+def test_errors():
+    with open_client() as client:
+        person_id = app.STORAGE.get_person_id(1, '太郎', create=True)
+        record(person_id, '2026-01-01', 100)
+        assert client.get('/api/trends/太郎?from=2026-01-01&to=2026-01-31&nutrients=糖質').status_code == 400
+        assert client.get('/api/trends/太郎?from=2026-02-01&to=2026-01-01').status_code == 400
+        assert client.get('/api/trends/太郎?from=2026/01/01').status_code == 400
+        assert client.get('/api/trends/太郎?from=2024-01-01&to=2024-12-31').status_code == 404
+        assert client.get('/api/trends/いない人').status_code == 404
+
+if __name__ == '__main__':
+    test_granularity()
+    test_daily_series()
+    test_downsampled_series()
+    test_errors()
+    print("\n✅ 全てのテスト成功!")
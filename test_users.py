@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+複数ユーザー（世帯）のデータの分離のテストスクリプト
+
+SQLiteのメモリ上DBを使い、AI APIなしで実行できます。
+"""
+
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+import app
+from testutil import open_client
+
+TODAY = datetime.now().strftime('%Y-%m-%d')
+
+def record(client, person_name, food_input):
+    response = client.post('/api/calculate', json={
+        'person_name': person_name, 'meal_date': TODAY, 'meal_time': '12:00', 'food_input': food_input})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['meal_id']
+
+def login(client, username, password):
+    assert client.post('/api/login', json={'username': username, 'password': password}).status_code == 200
+
+def test_isolation():
+    """他のユーザーの食事・人物・テンプレート・ジョブ・ライブ更新は見えず、変更もできない"""
+    with open_client() as client:
+        meal_id = record(client, '太郎', '納豆45g')
+        template_id = client.post('/api/templates', json={'person_name': '太郎', 'name': '朝',
+                                                          'meal_id': meal_id}).get_json()['template_id']
+        job_id = app.JOB_QUEUE.enqueue('record_meal', {'person_id': app.STORAGE.get_person_id(1, '太郎'),
+                                                       'meal_date': TODAY, 'meal_time': '19:00',
+                                                       'food_input': 'ご飯150g'}, user_id=1)
+
+        app.STORAGE.create_user('family', generate_password_hash('secret'))
+        login(client, 'family', 'secret')
+        assert client.get('/api/persons').get_json()['persons'] == []
+        assert client.get('/api/meal-history/太郎').get_json()['meals'] == []
+        assert client.get('/api/weekly-summary/太郎').status_code == 404
+        assert client.get('/api/stream/太郎').status_code == 404
+        assert client.get(f'/api/jobs/{job_id}').status_code == 404
+
+        assert client.get(f'/api/meal/{meal_id}').status_code == 404
+        assert client.put(f'/api/meal/{meal_id}', json={'person_name': '太郎', 'meal_date': TODAY,
+                                                        'meal_time': '08:00', 'food_input': 'ご飯150g'}).status_code == 404
+        assert client.delete(f'/api/meal/{meal_id}').status_code == 404
+        assert client.delete(f'/api/templates/{template_id}').status_code == 404
+        for source in ({'meal_id': meal_id}, {'template_id': template_id}):
+            response = client.post('/api/quick-log', json={'person_name': '太郎', 'meal_date': TODAY,
+                                                           'meal_time': '08:00', **source})
+            assert response.status_code == 404
+        assert client.get('/api/admin/maintenance').status_code == 403
+
+        # 同じ名前の人物でも別の人物として記録される
+        record(client, '太郎', 'ご飯150g')
+        assert len(client.get('/api/meal-history/太郎').get_json()['meals']) == 1
+
+        login(client, app.DEFAULT_USERNAME, app.APP_PASSWORD)
+        meals = client.get('/api/meal-history/太郎').get_json()['meals']
+        assert [(meal['id'], meal['raw_input']) for meal in meals] == [(meal_id, '納豆45g')]
+        assert client.get('/api/meal-shortcuts/太郎').get_json()['templates'][0]['id'] == template_id
+        assert client.get(f'/api/jobs/{job_id}').get_json()['status'] == 'pending'
+
+if __name__ == '__main__':
+    test_isolation()
+    print("\n✅ 全てのテスト成功!")
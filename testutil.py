@@ -0,0 +1,33 @@
+"""
+テストスクリプトで共用するアプリのテストクライアント
+
+メモリ上のSQLiteに差し替えたアプリにログイン済みのクライアントを作り、終わったら元のストレージに戻して
+人物ID・レスポンスのキャッシュを空にする（テストの実行順で結果が変わらないように）。
+"""
+
+import contextlib
+
+import app
+from storage import MealRepository, SQLiteBackend
+
+def clear_caches():
+    with app._cache_lock:
+        app._response_cache.clear()
+    app._person_ids.clear()
+
+@contextlib.contextmanager
+def open_client(login=True):
+    """ログイン済み（login=False なら未ログイン）のテストクライアントを返す"""
+    original = (app.STORAGE, app.JOB_QUEUE.storage)
+    try:
+        app.STORAGE = MealRepository(SQLiteBackend(':memory:'))
+        app.JOB_QUEUE.storage = app.STORAGE
+        clear_caches()
+        app.init_db()
+        client = app.app.test_client()
+        if login:
+            client.post('/api/login', json={'password': app.APP_PASSWORD})
+        yield client
+    finally:
+        app.STORAGE, app.JOB_QUEUE.storage = original
+        clear_caches()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+バックグラウンドジョブのワーカー
+
+アプリと同じ保存先（NUTRITION_DB / DATABASE_URL）の jobs テーブルから
+ジョブを取り出して実行します。ASYNC_MATCHING=1 のときにAIマッチングが必要な食事は
+ここで照合・記録されます。
+
+使い方:
+    python worker.py                # JOB_WORKERS（既定: 2）個のワーカーで実行
+    python worker.py --workers 4
+    python worker.py --once         # 待ちジョブを全て実行して終了
+"""
+
+import argparse
+import logging
+import signal
+import threading
+
+from app import JOB_QUEUE, JOB_WORKERS
+
+def main():
+    parser = argparse.ArgumentParser(description='バックグラウンドジョブのワーカー')
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS or 2, help='ワーカースレッドの数')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='待ちジョブを確認する間隔（秒）')
+    parser.add_argument('--once', action='store_true', help='待ちジョブを全て実行して終了')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(message)s')
+
+    if args.once:
+        print(f"✓ {JOB_QUEUE.run_pending()}件のジョブを実行しました")
+        return
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    JOB_QUEUE.start(args.workers, args.poll_interval)
+    print(f"ワーカー{args.workers}個で待機中（Ctrl+Cで終了）")
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    JOB_QUEUE.stop()
+
+if __name__ == '__main__':
+    main()